@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import requests.exceptions
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request, while upstream is considered down.
+    Is a requests' ConnectionError, so all code handling network errors
+    handles it too, without waiting for connect or read timeout.
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker for one upstream.
+    - closed: requests are sent, consecutive failures are counted;
+    - open: after failure_threshold failures in a row, requests are not sent
+      for reset_timeout seconds;
+    - half-open: after that, one probe request is let through; its success
+      closes the circuit, failure opens it again for reset_timeout.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        :param name: upstream name, only for information
+        :param failure_threshold: open circuit after this number of consecutive failures; 0 disables breaker
+        :param reset_timeout: seconds to wait in open state before probing upstream again
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_time = 0
+        self._probe_in_flight = False
+        self._num_rejected = 0
+        self._num_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if (self._state == self.OPEN) and (time.monotonic() - self._opened_time >= self.reset_timeout):
+                return self.HALF_OPEN
+            return self._state
+
+    def is_open(self) -> bool:
+        """
+        :return: True if requests to upstream are being rejected now
+        """
+        return self.state == self.OPEN
+
+    def allow(self) -> bool:
+        """
+        Call before sending request. If True is returned, result must be
+        reported with record_success() or record_failure()
+        :return: True if request can be sent
+        """
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if (self._state == self.OPEN) and (time.monotonic() - self._opened_time >= self.reset_timeout):
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if (self._state == self.HALF_OPEN) and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._num_rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """
+        Call instead of record_success() / record_failure(), when request
+        result says nothing about upstream health (like caller's own deadline)
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if (self._state == self.HALF_OPEN) or (self._failures >= self.failure_threshold):
+                if self._state != self.OPEN:
+                    self._num_opened += 1
+                self._state = self.OPEN
+                self._opened_time = time.monotonic()
+
+    def info(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'times_opened': self._num_opened,
+                'rejected': self._num_rejected
+            }
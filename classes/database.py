@@ -1,10 +1,24 @@
 # -*- coding: utf-8 -*-
 from enum import IntEnum
-import json
+import logging
+import os
+import pathlib
 import sqlite3
 import threading
+import time
+
+import cherrypy
 
 from . import sitecfg
+from .db_snapshot import StaticDataSnapshot, load_snapshot
+from .route_graph import JumpGraph, load_jump_graph
+from .type_index import TypeIndex, load_type_index
+from .hub_routes import HUB_ROUTES_FILENAME, HubRoutesTable, build_hub_routes
+
+
+# returned by SiteDb.find_route_cache() instead of route, when the shortest
+# route with required security exists, but is longer than max_jumps
+ROUTE_TOO_LONG = 'too long'
 
 
 # WH class value constants
@@ -75,6 +89,14 @@ def safe_float(v) -> float:
     return float(v)
 
 
+def _chunks(values, chunk_size: int) -> list:
+    """
+    Split iterable of IDs into list of tuples of at most chunk_size unique elements
+    """
+    values = list(dict.fromkeys(values))  # unique, keeping order
+    return [tuple(values[i:i + chunk_size]) for i in range(0, len(values), chunk_size)]
+
+
 def get_ss_security_color(security_level: float) -> str:
     sec_color = '#ff0000'
     sec_colors = dict()
@@ -114,71 +136,253 @@ def get_ss_security_color(security_level: float) -> str:
     return sec_color
 
 
+class SiteDbConnectionPool:
+    """
+    Gives every worker thread its own read-only connection to the EVE DB,
+    so that concurrent requests do not serialize on a single shared
+    sqlite3 connection. Readers are opened in URI mode as immutable
+    (no locking, no change detection) with memory-mapped I/O enabled.
+    Rare writes go through a separate connection guarded by a lock;
+    after each write all reader connections are reopened lazily,
+    because immutable readers would not notice the change otherwise.
+    The same happens when db_version() sees that DB file was replaced
+    or modified by another process.
+    """
+
+    def __init__(self, db_filename: str, mmap_size: int = 0):
+        self._db_filename = db_filename
+        self._mmap_size = mmap_size
+        self._local = threading.local()
+        self._generation = 0  # incremented after every write or external DB file change
+        self._file_stat = None  # (inode, mtime, size) of DB file, seen by db_version()
+        self._stat_lock = threading.Lock()
+        self._write_conn = None
+        self._write_lock = threading.Lock()
+
+    def _reader_uri(self) -> str:
+        # 'file:///home/whdbx/db/eve.db?mode=ro&immutable=1'
+        uri = pathlib.Path(self._db_filename).resolve().as_uri()
+        return uri + '?mode=ro&immutable=1'
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        :return: read-only connection owned by the calling thread
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            if self._local.generation == self._generation:
+                return conn
+            # DB was modified by writer, reopen
+            conn.close()
+        generation = self._generation
+        conn = sqlite3.connect(self._reader_uri(), uri=True)
+        if self._mmap_size > 0:
+            conn.execute('PRAGMA mmap_size = {}'.format(int(self._mmap_size)))
+        self._local.conn = conn
+        self._local.generation = generation
+        return conn
+
+    def _writer(self) -> sqlite3.Connection:
+        # must be called with _write_lock held
+        if self._write_conn is None:
+            self._write_conn = sqlite3.connect(self._db_filename, check_same_thread=False)
+        return self._write_conn
+
+    def execute_write(self, query: str, params: tuple = ()) -> None:
+        """
+        Execute a modifying query on a separate read-write connection and commit
+        :param query: SQL query text
+        :param params: query parameters
+        :return: None
+        """
+        self.execute_write_batch([(query, params)])
+
+    def execute_write_batch(self, statements: list) -> None:
+        """
+        Execute several modifying queries in a single transaction
+        :param statements: list of tuples (query, params)
+        :return: None
+        """
+        with self._write_lock:
+            conn = self._writer()
+            cursor = conn.cursor()
+            try:
+                for query, params in statements:
+                    cursor.execute(query, params)
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+                # make all threads reopen their immutable readers
+                self._bump_generation()
+
+    def execute_write_script(self, script: str) -> None:
+        """
+        Execute SQL script (several statements separated by ';') on read-write connection
+        :param script: SQL script text
+        :return: None
+        """
+        with self._write_lock:
+            try:
+                self._writer().executescript(script)
+            finally:
+                self._bump_generation()
+
+    def _bump_generation(self) -> None:
+        with self._stat_lock:
+            self._generation += 1
+
+    def db_version(self) -> tuple:
+        """
+        Check if DB file was modified; if so, readers opened before are reopened
+        on next use, so that they do not return old data
+        :return: a value that changes whenever DB file is modified
+        """
+        st = os.stat(self._db_filename)
+        file_stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._stat_lock:
+            if file_stat != self._file_stat:
+                if self._file_stat is not None:
+                    self._generation += 1
+                self._file_stat = file_stat
+            return st.st_mtime_ns, st.st_size, self._generation
+
+
 class SiteDb:
+    # how often to check if DB file was changed and static data snapshot should be reloaded
+    SNAPSHOT_CHECK_INTERVAL = 10  # seconds
+    # max number of parameters in a single "WHERE ... IN (?, ?, ...)", SQLite limit is 999
+    SQL_IN_CHUNK_SIZE = 500
+    # DB patch script, executed at startup if system_statics table is missing
+    SYSTEM_STATICS_SQL = str(pathlib.Path(__file__).resolve().parent.parent / 'db' / 'sqlite_sql' / 'system_statics.sql')
+
     def __init__(self, siteconfig: sitecfg.SiteConfig):
-        self._conn = sqlite3.connect(siteconfig.EVEDB, check_same_thread=False)
-        # vars for route finding
-        self._jumps_cache = dict()  # db cache
-        self._jumps_max_jumps = 0
-        self._jumps_min_route_len = 9999
+        self._pool = SiteDbConnectionPool(siteconfig.EVEDB, siteconfig.EVEDB_MMAP_SIZE)
+        # in-memory copy of static WH tables
+        self._snapshot = None
+        self._snapshot_checked_time = 0.0
+        self._snapshot_lock = threading.Lock()
+        # stargate jumps graph for route finding, loaded on first use
+        self._jump_graph = None
+        # precomputed routes to trade hubs, in ROUTES_CACHE_DIR
+        self._hub_routes = None
+        self._hub_routes_version = None
+        self._hub_routes_failed_version = None  # do not rebuild table on every call, if it fails
+        self._hub_routes_lock = threading.Lock()
         self._routes_cache_dir = siteconfig.ROUTES_CACHE_DIR
-        self._write_lock = threading.Lock()
+        # preloaded invTypes index for find_typeid(): 'off', 'lazy' or 'startup'
+        self._type_index = None
+        self._type_index_mode = siteconfig.EVEDB_TYPE_INDEX
+        # load static data at startup
+        self._ensure_system_statics()
+        self.static_data()
+        if self._type_index_mode == 'startup':
+            self.type_index()
+
+    def connection_handle(self) -> sqlite3.Connection:
+        return self._pool.reader()
 
-    def connection_handle(self):
-        return self._conn
+    def static_data(self) -> StaticDataSnapshot:
+        """
+        Get snapshot of static WH tables, (re)loading it if DB file has changed
+        :return: current static data snapshot
+        """
+        snap = self._snapshot
+        tm_now = time.monotonic()
+        if (snap is not None) and (tm_now - self._snapshot_checked_time < self.SNAPSHOT_CHECK_INTERVAL):
+            return snap
+        with self._snapshot_lock:
+            snap = self._snapshot
+            version = self._pool.db_version()
+            if (snap is None) or (snap.version != version):
+                snap = load_snapshot(self._pool.reader(), version)
+                self._snapshot = snap
+            self._snapshot_checked_time = tm_now
+        return snap
 
     def query_hole_info(self, hole: str) -> tuple:
-        cur = self._conn.cursor()
-        q = 'SELECT in_class, maxStableTime, maxStableMass, ' \
-            '       maxJumpMass, massRegeneration ' \
-            ' FROM wormholeclassifications WHERE hole = ?'
-        cur.execute(q, (hole,))
-        row = cur.fetchone()
-        cur.close()
-        return row
+        # id, hole, in_class, maxStableTime, maxStableMass, massRegeneration, maxJumpMass
+        row = self.static_data().holes.get(hole)
+        if row is None:
+            return None
+        # in_class, maxStableTime, maxStableMass, maxJumpMass, massRegeneration
+        return row[2], row[3], row[4], row[6], row[5]
 
     def query_effect_info(self, effect_id: int, effect_class: int) -> list:
-        query = 'SELECT effect, icon, c{0} ' \
-                'FROM effects_new WHERE id_type = ?'.format(effect_class)
-        cursor = self._conn.cursor()
-        cursor.execute(query, (effect_id,))
         effects = list()
-        for row in cursor:
-            effects.append(row)
-        cursor.close()
+        if (effect_class < 1) or (effect_class > 6):
+            return effects
+        # id, id_type, hole, effect, icon, c1, c2, c3, c4, c5, c6
+        for row in self.static_data().effects_by_type.get(effect_id, tuple()):
+            effects.append((row[3], row[4], row[4 + effect_class]))
         return effects
 
     def query_wormholesystem(self, ssys_id: int) -> tuple:
         select_wh_query = (
             'SELECT class, star, planet, moon, effect, static_1, static_2 '
             'FROM wormholesystems WHERE solarsystemid = ?')
-        cursor = self._conn.cursor()
+        cursor = self._pool.reader().cursor()
         cursor.execute(select_wh_query, (ssys_id, ))
         row = cursor.fetchone()
         return row
 
     def query_wormholesystem_new(self, ssys_id: int) -> tuple:
-        select_wh_query_new = (
-            'SELECT class, star, planets, moons, effect, statics '
-            'FROM wormholesystems_new WHERE solarsystemid = ?')
-        cursor = self._conn.cursor()
-        cursor.execute(select_wh_query_new, (ssys_id, ))
-        row = cursor.fetchone()
-        return row
+        # class, star, planets, moons, effect, statics
+        return self.static_data().wormholesystems.get(ssys_id)
+
+    def query_wormholesystems_new(self, ssys_ids) -> dict:
+        """
+        Bulk version of query_wormholesystem_new()
+        :param ssys_ids: iterable of solarsystem IDs
+        :return: dict solarsystem ID => (class, star, planets, moons, effect, statics); k-space IDs are missing
+        """
+        wormholesystems = self.static_data().wormholesystems
+        ret = dict()
+        for ssys_id in ssys_ids:
+            row = wormholesystems.get(ssys_id)
+            if row is not None:
+                ret[ssys_id] = row
+        return ret
+
+    def _ensure_system_statics(self) -> None:
+        """
+        Create normalized system_statics table, if DB was not patched with system_statics.sql
+        """
+        cur = self._pool.reader().cursor()
+        cur.execute('SELECT name FROM sqlite_master WHERE type=\'table\' AND name=\'system_statics\'')
+        row = cur.fetchone()
+        cur.close()
+        if row is not None:
+            return
+        try:
+            with open(self.SYSTEM_STATICS_SQL, 'rt', encoding='utf-8') as f:
+                self._pool.execute_write_script(f.read())
+        except (OSError, sqlite3.Error) as e:
+            # static data snapshot then splits statics strings itself
+            cherrypy.log('Failed to create system_statics table: {0}'.format(str(e)),
+                         'SiteDb', logging.ERROR, traceback=True)
 
     def set_wormholesystem_statics(self, ssys_id: int, statics_str: str):
-        select_wh_query_new = (
+        update_wh_query_new = (
             'UPDATE wormholesystems_new SET statics = ? '
             ' WHERE solarsystemid = ?')
-        # get write lock
-        self._write_lock.acquire()
-        #
-        cursor = self._conn.cursor()
-        cursor.execute(select_wh_query_new, (statics_str, ssys_id))
-        self._conn.commit()
-        cursor.close()
-        # release lock
-        self._write_lock.release()
+        statements = [
+            (update_wh_query_new, (statics_str, ssys_id)),
+            ('DELETE FROM system_statics WHERE solarsystemid = ?', (ssys_id, ))
+        ]
+        # keep normalized statics in sync
+        for hole in statics_str.split(','):
+            hole = hole.strip()
+            if hole != '':
+                hole_info = self.query_hole_info(hole)
+                in_class = hole_info[0] if hole_info is not None else None
+                statements.append(('INSERT OR IGNORE INTO system_statics (solarsystemid, hole, in_class) '
+                                   ' VALUES (?, ?, ?)', (ssys_id, hole, in_class)))
+        self._pool.execute_write_batch(statements)
+        # force static data reload on next access
+        self._snapshot_checked_time = 0.0
 
     def query_solarsystem(self, ssys_id: int) -> tuple:
         ccp_q = (
@@ -188,7 +392,7 @@ class SiteDb:
             ' JOIN mapdenormalize mr ON mr.itemID = ss.regionID '
             ' JOIN mapdenormalize mc ON mc.itemID = ss.constellationID '
             'WHERE ss.solarsystemid = ?')
-        cursor = self._conn.cursor()
+        cursor = self._pool.reader().cursor()
         cursor.execute(ccp_q, (ssys_id, ))
         row = cursor.fetchone()
         return row
@@ -207,7 +411,7 @@ class SiteDb:
             'JOIN mapDenormalize md ON md.solarSystemID=ss.solarSystemID ' \
             'JOIN invTypes it ON (it.typeID=md.typeID AND it.groupID=7) ' \
             'WHERE ss.solarSystemID=?'
-        cursor = self._conn.cursor()
+        cursor = self._pool.reader().cursor()
         if cursor.execute(q, (ssid, )):
             for row in cursor.fetchall():
                 t = (row[5], row[6])  # ('J165806 I', 'Planet (Lava)')
@@ -216,23 +420,18 @@ class SiteDb:
 
     def select_all_sleepers(self) -> list:
         ret = list()
-        q = 'SELECT id,name FROM sleepers ORDER BY id'
-        cur = self._conn.cursor()
-        cur.execute(q)
-        for row in cur:
+        sleepers = self.static_data().sleepers
+        for sleeper_id in sorted(sleepers.keys()):
             s = dict()
-            s['id'] = int(row[0])
-            s['name'] = row[1]
-            s['icon'] = str(row[1]).lower() + '.png'
+            s['id'] = sleeper_id
+            s['name'] = sleepers[sleeper_id]['name']
+            s['icon'] = s['name'].lower() + '.png'
             ret.append(s)
         return ret
 
     def select_all_effects(self) -> list:
         ret = list()
-        q = 'SELECT id,id_type,hole,effect,icon,c1,c2,c3,c4,c5,c6 FROM effects_new ORDER BY id'
-        cur = self._conn.cursor()
-        cur.execute(q)
-        for row in cur:
+        for row in self.static_data().effects:
             s = dict()
             s['id'] = int(row[0])
             s['id_type'] = int(row[1])
@@ -249,236 +448,87 @@ class SiteDb:
         return ret
 
     def query_sleeper_by_id(self, sleeper_id: int) -> dict:
-        sleeper_query = (
-            'SELECT id, typeid, wh_class, icon, name,'    # 0..4
-            ' signature, maxspeed, orbit, optimal, '      # 5..8
-            ' shield, armor, hull, '                        # 9..11
-            ' shield_res_em, shield_res_therm, shield_res_kin, shield_res_exp, '  # 12..15
-            ' armor_res_em, armor_res_therm, armor_res_kin, armor_res_exp, '      # 16..19
-            ' dps_em, dps_therm, dps_kin, dps_exp,'       # 20..23
-            ' loot_acd, loot_nna, loot_sdl, loot_sdai, '  # 24..27
-            ' ability, '                                      # 28
-            ' neut_range, neut_amount, neut_duration, '   # 29..31
-            ' dis_range, dis_strength, '                   # 32, 33
-            ' web_range, web_strength, '                  # 34, 35
-            ' rr_range, rr_amount, rr_duration, '       # 36..38
-            ' extra_comment '                            # 39
-            'FROM sleepers WHERE id = ?')
-        cursor = self._conn.cursor()
-        cursor.execute(sleeper_query, (sleeper_id,))
-        row = cursor.fetchone()
-        if row is None:
+        sl = self.static_data().sleepers.get(sleeper_id)
+        if sl is None:
             return None
-        ret = {
-            'id': int(row[0]),
-            'typeid': int(row[1]),
-            'wh_class': str(row[2]),
-            'icon': str(row[3]),
-            'name': str(row[4]),
-            'signature': int(row[5]),
-            'maxspeed': int(row[6]),
-            'orbit': int(row[7]),
-            'optimal': int(row[8]),
-            'shield': int(row[9]),
-            'armor': int(row[10]),
-            'hull': int(row[11]),
-            'shield_res_em': int(row[12]),
-            'shield_res_therm': int(row[13]),
-            'shield_res_kin': int(row[14]),
-            'shield_res_exp': int(row[15]),
-            'armor_res_em': int(row[16]),
-            'armor_res_therm': int(row[17]),
-            'armor_res_kin': int(row[18]),
-            'armor_res_exp': int(row[19]),
-            'dps_em': int(row[20]),
-            'dps_therm': int(row[21]),
-            'dps_kin': int(row[22]),
-            'dps_exp': int(row[23]),
-            'loot_acd': int(row[24]),
-            'loot_nna': int(row[25]),
-            'loot_sdl': int(row[26]),
-            'loot_sdai': int(row[27]),
-            'ability': row[28],  # may be None, let it be None, not 'None'
-            'neut_range': int(row[29]),
-            'neut_amount': int(row[30]),
-            'neut_duration': int(row[31]),
-            'dis_range': int(row[32]),
-            'dis_strength': int(row[33]),
-            'web_range': int(row[34]),
-            'web_strength': int(row[35]),
-            'rr_range': int(row[36]),
-            'rr_amount': int(row[37]),
-            'rr_duration': int(row[38]),
-            'extra_comment': str(row[39])
-        }
-        return ret
+        # return a copy, callers are free to modify it
+        return dict(sl)
 
     def query_sleeper_by_class(self, class_str: str) -> list:
         ret = []
-        sleeper_query = (
-            'SELECT id, typeid, wh_class, icon, name FROM sleepers WHERE wh_class = ?')
-        cur = self._conn.cursor()
-        cur.execute(sleeper_query, (class_str,))
-        for row in cur:
+        snap = self.static_data()
+        for sleeper_id in snap.sleepers_by_class.get(class_str, tuple()):
+            row = snap.sleepers[sleeper_id]
             sl = {
-                'id': int(row[0]),
-                'typeid': int(row[1]),
-                'wh_class_str': str(row[2]),
-                'icon': str(row[3]),
-                'name': str(row[4])
+                'id': row['id'],
+                'typeid': row['typeid'],
+                'wh_class_str': row['wh_class'],
+                'icon': row['icon'],
+                'name': row['name']
             }
             ret.append(sl)
         return ret
 
     def postprocess_signatures_calc_max_dps(self, sigs_list: list) -> None:
-        # for each signature, get all waves
-        #  for each wave, parse sleepers line
-        #   for each sleeper get is dps
-        #   sum all sleepers dps in this wave
-        #   remember maximum wave dps
+        # max wave dps of each signature is precomputed in static data snapshot
+        signature_max_dps = self.static_data().signature_max_dps
         for sig in sigs_list:
-            max_dps = 0
-            waves = self.query_signature_waves(sig['id'])
-            for wave in waves:
-                total_wave_dps = 0
-                is_capital = int(wave[2])
-                if is_capital:  # skip capital waves
-                    continue
-                sleepers_str = str(wave[3])
-                # parse sleepers str
-                sl_defs = sleepers_str.split(',')
-                for sl_def in sl_defs:
-                    #  'sleeper_id:count:abilities' or 'sleeper_id:count'
-                    sl_def = sl_def.strip()
-                    sl_def_list = sl_def.split(':')
-                    sl_id = int(sl_def_list[0])
-                    if sl_id > 0:
-                        sl_count = int(sl_def_list[1])
-                        # we have sleeper ID and its count
-                        sl_info = self.query_sleeper_by_id(sl_id)
-                        if sl_info is not None:
-                            sleeper_dps = sl_info['dps_em'] + sl_info['dps_therm'] \
-                                          + sl_info['dps_kin'] + sl_info['dps_exp']
-                            total_wave_dps += sleeper_dps * sl_count
-                if total_wave_dps > max_dps:
-                    max_dps = total_wave_dps
-            sig['max_dps'] = max_dps
+            sig['max_dps'] = signature_max_dps.get(sig['id'], 0)
+
+    @staticmethod
+    def _signature_row_to_dict(row: tuple) -> dict:
+        sig = dict()
+        sig['id'] = int(row[0])
+        sig['wh_class'] = int(row[1])
+        sig['sig_type'] = row[2]
+        sig['sig_name'] = row[3]
+        sig['max_dps'] = 0
+        return sig
+
+    def _signatures_list(self, sig_ids: tuple) -> list:
+        signatures = self.static_data().signatures
+        return [self._signature_row_to_dict(signatures[sig_id]) for sig_id in sig_ids]
 
     def query_signatures_for_class(self, wh_class: int, calc_max_dps: bool = False) -> list:
-        ret = []
-        q = 'SELECT id,wh_class,sig_type,sig_name FROM signatures WHERE wh_class = ?'
-        cur = self._conn.cursor()
-        cur.execute(q, (wh_class,))
-        for row in cur:
-            sig = dict()
-            sig['id'] = int(row[0])
-            sig['wh_class'] = int(row[1])
-            sig['sig_type'] = row[2]
-            sig['sig_name'] = row[3]
-            sig['max_dps'] = 0
-            ret.append(sig)
-        cur.close()
+        by_class = self.static_data().signatures_by_class
+        ret = self._signatures_list(by_class.get(wh_class, tuple()))
         # don't forget about shattered!
         if (wh_class >= -6) and (wh_class <= -1):
             qwhcl = (-1) * wh_class
-            cur = self._conn.cursor()
-            cur.execute(q, (qwhcl,))
-            for row in cur:
-                sig = dict()
-                sig['id'] = int(row[0])
-                sig['wh_class'] = int(row[1])
-                sig['sig_type'] = row[2]
-                sig['sig_name'] = row[3]
-                sig['max_dps'] = 0
-                ret.append(sig)
-            cur.close()
-        # thera also has class 3/4 sigs
-        # if wh_class == self.THERA_WH_CLASS:
-        #    q34 = 'SELECT id,wh_class,sig_type,sig_name FROM signatures WHERE wh_class=3 OR wh_class=4'
-        #    cur = self._conn.cursor()
-        #    cur.execute(q34)
-        #    for row in cur:
-        #        sig = dict()
-        #        sig['id'] = int(row[0])
-        #        sig['wh_class'] = int(row[1])
-        #        sig['sig_type'] = row[2]
-        #        sig['sig_name'] = row[3]
-        #        ret.append(sig)
-        #    cur.close()
-        # ^^ do not do it - too many lines there
+            ret.extend(self._signatures_list(by_class.get(qwhcl, tuple())))
+        # thera also has class 3/4 sigs, but do not list them - too many lines there
         #
         # frig WHs contain class 1-3 anomalies
         if wh_class == WHClass.FRIG_WH_CLASS:
-            q_frig = 'SELECT id,wh_class,sig_type,sig_name FROM signatures WHERE wh_class=3'
-            cur = self._conn.cursor()
-            cur.execute(q_frig)
-            for row in cur:
-                sig = dict()
-                sig['id'] = int(row[0])
-                sig['wh_class'] = int(row[1])
-                sig['sig_type'] = row[2]
-                sig['sig_name'] = row[3]
-                sig['max_dps'] = 0
-                ret.append(sig)
-            cur.close()
+            ret.extend(self._signatures_list(by_class.get(3, tuple())))
         if calc_max_dps:
             self.postprocess_signatures_calc_max_dps(ret)
         return ret
 
     def query_gas_signatures(self, calc_max_dps: bool = False) -> list:
-        ret = []
-        q = 'SELECT id,wh_class,sig_type,sig_name FROM signatures WHERE sig_type = ?'
-        cur = self._conn.cursor()
-        cur.execute(q, ('gas',))
-        for row in cur:
-            sig = dict()
-            sig['id'] = int(row[0])
-            sig['wh_class'] = int(row[1])
-            sig['sig_type'] = row[2]
-            sig['sig_name'] = row[3]
-            sig['max_dps'] = 0
-            ret.append(sig)
+        ret = self._signatures_list(self.static_data().signatures_by_type.get('gas', tuple()))
         if calc_max_dps:
             self.postprocess_signatures_calc_max_dps(ret)
         return ret
 
     def query_ore_signatures(self, calc_max_dps: bool = False) -> list:
-        ret = []
-        q = 'SELECT id,wh_class,sig_type,sig_name FROM signatures WHERE sig_type = ?'
-        cur = self._conn.cursor()
-        cur.execute(q, ('ore',))
-        for row in cur:
-            sig = dict()
-            sig['id'] = int(row[0])
-            sig['wh_class'] = int(row[1])
-            sig['sig_type'] = row[2]
-            sig['sig_name'] = row[3]
-            sig['max_dps'] = 0
-            ret.append(sig)
+        ret = self._signatures_list(self.static_data().signatures_by_type.get('ore', tuple()))
         if calc_max_dps:
             self.postprocess_signatures_calc_max_dps(ret)
         return ret
 
     def query_signature(self, sig_id: int) -> tuple:
-        sig_query = 'SELECT id,wh_class,sig_type,sig_name FROM signatures WHERE id = ?'
-        cur = self._conn.cursor()
-        cur.execute(sig_query, (sig_id,))
-        row = cur.fetchone()
-        return row
+        # id, wh_class, sig_type, sig_name
+        return self.static_data().signatures.get(sig_id)
 
     def query_signature_waves(self, sig_id: int) -> list:
-        ret = []
-        sig_waves_query = 'SELECT sig_id,wave_id,is_capital,sleepers FROM signature_waves WHERE sig_id = ?'
-        cur = self._conn.cursor()
-        cur.execute(sig_waves_query, (sig_id,))
-        for row in cur:
-            ret.append(row)
-        return ret
+        # [(sig_id, wave_id, is_capital, sleepers), ...]
+        return list(self.static_data().signature_waves.get(sig_id, tuple()))
 
     def query_signature_oregas(self, sig_id: int) -> list:
         ret = list()
         sig_oregas_query = 'SELECT sig_id, oregas FROM signature_oregas WHERE sig_id = ?'
-        cur = self._conn.cursor()
+        cur = self._pool.reader().cursor()
         cur.execute(sig_oregas_query, (sig_id,))
         row = cur.fetchone()
         if row:
@@ -499,178 +549,123 @@ class SiteDb:
         # ret will be like: [{'type': 'c50', 'cnt': 3000}, {'type': 'c60', 'cnt': 1500}]
         return ret
 
-    def jumps_from_system(self, from_ss: int) -> dict:
-        if self._jumps_cache:
-            if from_ss in self._jumps_cache:
-                return self._jumps_cache[from_ss]
+    def jump_graph(self) -> JumpGraph:
+        """
+        Get stargate jumps graph, (re)loading it together with static data snapshot
+        :return: current jumps graph
+        """
+        version = self.static_data().version
+        graph = self._jump_graph
+        if (graph is not None) and (graph.version == version):
+            return graph
+        with self._snapshot_lock:
+            graph = self._jump_graph
+            if (graph is None) or (graph.version != version):
+                graph = load_jump_graph(self._pool.reader(), version)
+                self._jump_graph = graph
+        return graph
+
+    def jumps_from_system(self, from_ss: int) -> list:
         ret = list()
-        cur = self._conn.cursor()
-        q = ('SELECT '
-             '  ssj.fromSolarSystemID, ssf.itemName, ssf.security,'
-             '  ssj.toSolarSystemID, sst.itemName, sst.security '
-             'FROM mapSolarSystemJumps ssj '
-             ' JOIN mapDenormalize ssf on ssf.itemID = ssj.fromSolarSystemID '
-             ' JOIN mapDenormalize sst on sst.itemID = ssj.toSolarSystemID '
-             'WHERE ssj.fromSolarSystemID=?')
-        cur.execute(q, (from_ss,))
-        for row in cur:
-            jump = dict()
-            jump['from_ssid'] = int(row[0])
-            jump['from_ssname'] = row[1]
-            jump['from_sssec'] = float(row[2])
-            jump['to_ssid'] = int(row[3])
-            jump['to_ssname'] = row[4]
-            jump['to_sssec'] = float(row[5])
-            ret.append(jump)
-        self._jumps_cache[from_ss] = ret
+        graph = self.jump_graph()
+        from_idx = graph.index_of(from_ss)
+        if from_idx < 0:
+            return ret
+        for to_idx in graph.neighbours(from_idx):
+            ret.append(graph.jump_dict(from_idx, to_idx))
         return ret
 
-    def _print_tab(self, recursion_limit: int, s: str=None):
-        tab = ''
-        for i in range(0, self._jumps_max_jumps - recursion_limit):
-            tab += ' '
-        # tab = '(' + str(recursion_limit) + ') '
-        print(tab, end='')
-        if s:
-            print(s)
-
     def _str_route(self, route: list) -> str:
         ret = ''
         for j in route:
             ret += j['to_ssname'] + ' - '
         return ret
 
-    def _find_route_dive(self, cur_jump: dict, target_ss: int,
-                         recursion_limit: int, visited_systems: list, sec_min: float) -> list:
-        # check recursion limit
-        recursion_limit -= 1
-        if recursion_limit <= 0:
-            # self.print_tab(recursion_limit, 'dive: STOP: hit recursion limit while jumping to {0}!'.
-            #               format(cur_jump['to_ssname']))
-            return None
-        # if cur_jump['to_ssid'] in visited_systems:
-        #    self.print_tab(recursion_limit, 'dive: ERROR: next system ({0}) is already visited!'.
-        #                   format(cur_jump['to_ssname']))
-        #    return None
-        jumps_done = self._jumps_max_jumps - recursion_limit
-        if jumps_done > self._jumps_min_route_len:
-            # self.print_tab(recursion_limit, 'dive: this route is longer than the previous ({0} > {1}); return None'.
-            #               format(jumps_done, self._jumps_min_route_len))
-            return None
-        # routes
-        sub_routes = list()
-        # make jumps
-        # self.print_tab(recursion_limit, 'dive: JUMP into {0} {1}'.format(cur_jump['to_ssname'], cur_jump['to_ssid']))
-        # make internal copy of visited systems list up to this step
-        v_systems_copy = list(visited_systems)
-        jumps = self.jumps_from_system(cur_jump['to_ssid'])
-        for next_jump in jumps:
-            # found our target system?
-            if next_jump['to_ssid'] == target_ss:
-                v_systems_copy.append(next_jump['to_ssid'])
-                ret_route = list()
-                ret_route.append(next_jump)
-                ret_route.append(cur_jump)
-                # self.print_tab(recursion_limit, 'dive: TARGET [{0}] system from {1}! {2} jumps: [{3}]'.format(
-                #    next_jump['to_ssname'], cur_jump['to_ssname'], len(ret_route), self.str_route(ret_route)))
-                jumps_done += 1
-                if self._jumps_min_route_len > jumps_done:
-                    self._jumps_min_route_len = jumps_done
-                return ret_route
-            # nope :(
-            if next_jump['to_ssid'] not in v_systems_copy:
-                if next_jump['to_sssec'] >= sec_min:
-                    # RECURSION POWER
-                    v_systems_copy.append(next_jump['to_ssid'])
-                    route = self._find_route_dive(next_jump, target_ss,
-                                                  recursion_limit, v_systems_copy, sec_min)
-                    if route:
-                        route.append(cur_jump)
-                        sub_routes.append(route)
-                        # self.print_tab(recursion_limit, 'dive: storing successful target route in {0}'.
-                        #                format(cur_jump['to_ssname']))
-        # finished jumping from this system, compare routes
-        if len(sub_routes) <= 0:
-            # self.print_tab(recursion_limit, 'dive: DEADEND: no other jumps from {0} :('.
-            #                format(cur_jump['to_ssname']))
-            return None
-        min_route = sub_routes[0]
-        min_route_len = len(sub_routes[0])
-        for sub_route in sub_routes:
-            rlen = len(sub_route)
-            if rlen < min_route_len:
-                min_route_len = rlen
-                min_route = sub_route
-        # self.print_tab(recursion_limit, 'dive: finished jumping, returning from {0}: [{1}]'.
-        #                format(cur_jump['to_ssname'], self.str_route(min_route)))
-        return min_route
-
     def find_route(self, from_ss: int, target_ss: int, sec_min: float=0.5, max_jumps=25) -> list:
         # stupid, we are already in target ss
         if from_ss == target_ss:
             return list()  # empty list, 0 jumps route
-        #
-        self._jumps_max_jumps = max_jumps
-        self._jumps_min_route_len = 9999
-        routes = list()
-        v_systems = list()
-        v_systems.append(from_ss)
-        jumps = self.jumps_from_system(from_ss)
-        for next_jump in jumps:
-            if next_jump['to_sssec'] >= sec_min:
-                v_systems.append(next_jump['to_ssid'])
-                ret = self._find_route_dive(next_jump, target_ss, max_jumps, v_systems, sec_min)
-                if ret:
-                    ret.reverse()
-                    routes.append(ret)
-        if len(routes) > 0:
-            # print('find_route: found {0} routes:'.format(len(routes)))
-            min_route = routes[0]
-            min_route_len = len(routes[0])
-            for route in routes:
-                # print(' - route {0} jumps: {1}'.format(len(route), self._str_route(route)))
-                if len(route) < min_route_len:
-                    min_route = route
-                    min_route_len = len(route)
-            return min_route
-        return None
+        graph = self.jump_graph()
+        path = graph.shortest_path(from_ss, target_ss, sec_min, max_jumps)
+        if path is None:
+            return None
+        return graph.path_to_route(path)
 
-    def find_route_cache(self, from_ss: int, target_ss: int, sec_min: float=0.5,
-                         max_jumps: int=25, cache_dir: str=None) -> list:
-        ret = None
-        read_from_cache = False
-        if cache_dir is None:
-            cache_dir = self._routes_cache_dir
-        filename = cache_dir + '/' + str(from_ss) + '_' + str(target_ss) + \
-            '_' + str(max_jumps) + '_' + str(sec_min) + '.json'
-        try:
-            file = open(filename, 'rt')
-            txt = file.read()
-            file.close()
-            ret = json.loads(txt)
-            read_from_cache = True
-        except IOError as e:
-            ret = None
-            read_from_cache = False
-        if not read_from_cache:
-            ret = self.find_route(from_ss, target_ss, sec_min, max_jumps)
-            # if ret:  # save eveif route not found, try
+    def hub_routes(self) -> HubRoutesTable:
+        """
+        Get precomputed routes to trade hubs, (re)building them
+        if the file is missing or was built from another DB version
+        :return: memory-mapped hub routes table, or None if it cannot be built
+        """
+        graph = self.jump_graph()
+        table = self._hub_routes
+        if (table is not None) and (self._hub_routes_version == graph.version):
+            return table
+        with self._hub_routes_lock:
+            table = self._hub_routes
+            if (table is not None) and (self._hub_routes_version == graph.version):
+                return table
+            if self._hub_routes_failed_version == graph.version:
+                return None
+            filename = os.path.join(self._routes_cache_dir, HUB_ROUTES_FILENAME)
+            db_mtime_ns, db_size = graph.version[0], graph.version[1]
+            new_table = None
             try:
-                file = open(filename, 'wt')
-                file.write(json.dumps(ret))
-                file.close()
-            except IOError as e:
-                pass
-        return ret
+                new_table = HubRoutesTable(filename)
+                if (new_table.db_mtime_ns != db_mtime_ns) or (new_table.db_size != db_size) \
+                        or (not new_table.matches_graph(graph)):
+                    new_table.close()
+                    new_table = None
+            except FileNotFoundError:
+                new_table = None
+            except (OSError, ValueError) as e:
+                cherrypy.log('Invalid hub routes table {0}, rebuilding it: {1}'.format(filename, str(e)),
+                             'SiteDb', logging.WARNING)
+                new_table = None
+            if new_table is None:
+                try:
+                    build_hub_routes(graph, filename, db_mtime_ns, db_size)
+                    new_table = HubRoutesTable(filename)
+                except (OSError, ValueError) as e:
+                    # routes to trade hubs are searched in jumps graph then, much slower
+                    cherrypy.log('Failed to build hub routes table {0}: {1}'.format(filename, str(e)),
+                                 'SiteDb', logging.ERROR, traceback=True)
+                    self._hub_routes_failed_version = graph.version
+                    return None
+            # old table is not closed, some other thread may be walking it now
+            self._hub_routes = new_table
+            self._hub_routes_version = graph.version
+        return new_table
+
+    def find_route_cache(self, from_ss: int, target_ss: int, sec_min: float=0.5, max_jumps: int=25) -> list:
+        """
+        Same as find_route(), but routes to trade hubs (hub_routes.TRADE_HUBS)
+        for policies in hub_routes.POLICIES are taken from precomputed table
+        :return: list of jumps, None if there is no route, or ROUTE_TOO_LONG
+                 if the shortest route is longer than max_jumps
+        """
+        if from_ss == target_ss:
+            return list()
+        graph = self.jump_graph()
+        table = self.hub_routes()
+        if (table is None) or (not table.has_route(target_ss, sec_min)):
+            path = graph.shortest_path(from_ss, target_ss, sec_min, max_jumps)
+            if (path is None) and (graph.shortest_path(from_ss, target_ss, sec_min, len(graph)) is not None):
+                return ROUTE_TOO_LONG
+        else:
+            from_idx = graph.index_of(from_ss)
+            if from_idx < 0:
+                return None
+            path = table.route_path(from_idx, target_ss, sec_min, max_jumps)
+            if (path is None) and (table.route_path(from_idx, target_ss, sec_min, len(graph)) is not None):
+                return ROUTE_TOO_LONG
+        if path is None:
+            return None
+        return graph.path_to_route(path)
 
     def find_wormhole(self, name: str) -> dict:
         ret = None
-        q = 'SELECT id,hole,in_class,maxStableTime,maxStableMass,massRegeneration,maxJumpMass ' \
-            ' FROM wormholeclassifications ' \
-            ' WHERE hole = ?'
-        cur = self._conn.cursor()
-        cur.execute(q, (name,))
-        row = cur.fetchone()
+        row = self.static_data().holes.get(name)
         if row:
             ret = dict()
             ret['id'] = int(row[0])
@@ -690,7 +685,7 @@ class SiteDb:
             ' JOIN invTypes it ON it.typeID=ss.sunTypeID ' \
             ' JOIN mapRegions mr ON mr.regionID=ss.regionID ' \
             ' WHERE ss.solarSystemName LIKE ?'
-        cur = self._conn.cursor()
+        cur = self._pool.reader().cursor()
         cur.execute(q, (name,))
         row = cur.fetchone()
         if row:
@@ -704,26 +699,48 @@ class SiteDb:
             ret['regionname'] = str(row[6])
         return ret
 
+    _SS_INFO_QUERY = 'SELECT ss.solarSystemID, ss.solarSystemName, ss.security, ss.sunTypeID, ss.regionID, ' \
+        '  it.typeName, mr.regionName ' \
+        ' FROM mapSolarSystems ss ' \
+        ' JOIN invTypes it ON it.typeID=ss.sunTypeID ' \
+        ' JOIN mapRegions mr ON mr.regionID=ss.regionID '
+
+    @staticmethod
+    def _ss_info_row_to_dict(row: tuple) -> dict:
+        ret = dict()
+        ret['id'] = int(row[0])
+        ret['name'] = str(row[1])
+        ret['security'] = float(row[2])
+        ret['suntypeid'] = int(row[3])
+        ret['regionid'] = int(row[4])
+        ret['suntype'] = str(row[5])
+        ret['regionname'] = str(row[6])
+        return ret
+
     def find_ss_by_id(self, ssid: int) -> dict:
         ret = None
-        q = 'SELECT ss.solarSystemID, ss.solarSystemName, ss.security, ss.sunTypeID, ss.regionID, ' \
-            '  it.typeName, mr.regionName ' \
-            ' FROM mapSolarSystems ss ' \
-            ' JOIN invTypes it ON it.typeID=ss.sunTypeID ' \
-            ' JOIN mapRegions mr ON mr.regionID=ss.regionID ' \
-            ' WHERE ss.solarSystemID=?'
-        cur = self._conn.cursor()
+        q = self._SS_INFO_QUERY + ' WHERE ss.solarSystemID=?'
+        cur = self._pool.reader().cursor()
         cur.execute(q, (ssid,))
         row = cur.fetchone()
         if row:
-            ret = dict()
-            ret['id'] = int(row[0])
-            ret['name'] = str(row[1])
-            ret['security'] = float(row[2])
-            ret['suntypeid'] = int(row[3])
-            ret['regionid'] = int(row[4])
-            ret['suntype'] = str(row[5])
-            ret['regionname'] = str(row[6])
+            ret = self._ss_info_row_to_dict(row)
+        return ret
+
+    def find_ss_by_ids(self, ssids) -> dict:
+        """
+        Bulk version of find_ss_by_id()
+        :param ssids: iterable of solarsystem IDs
+        :return: dict solarsystem ID => info dict, as returned by find_ss_by_id(); unknown IDs are missing
+        """
+        ret = dict()
+        cur = self._pool.reader().cursor()
+        for chunk in _chunks(ssids, self.SQL_IN_CHUNK_SIZE):
+            q = self._SS_INFO_QUERY + ' WHERE ss.solarSystemID IN ({0})'.format(','.join('?' * len(chunk)))
+            cur.execute(q, chunk)
+            for row in cur:
+                ss_info = self._ss_info_row_to_dict(row)
+                ret[ss_info['id']] = ss_info
         return ret
 
     def find_solarsystem_planets(self, ssid: int) -> list:
@@ -734,7 +751,7 @@ class SiteDb:
              ' FROM mapDenormalize as md '
              ' JOIN invTypes it ON it.typeID=md.typeID '
              ' WHERE md.groupID=7 AND md.solarsystemID=?')
-        cur = self._conn.cursor()
+        cur = self._pool.reader().cursor()
         cur.execute(q, (ssid,))
         for row in cur:
             p = dict()
@@ -754,7 +771,7 @@ class SiteDb:
              ' FROM mapDenormalize as md '
              ' JOIN invTypes it ON it.typeID=md.typeID '
              ' WHERE md.groupID=8 AND md.solarsystemID=?')
-        cur = self._conn.cursor()
+        cur = self._pool.reader().cursor()
         cur.execute(q, (ssid,))
         for row in cur:
             p = dict()
@@ -766,35 +783,89 @@ class SiteDb:
             ret.append(p)
         return ret
 
-    def find_typeid(self, typeid: int) -> dict:
+    _TYPEID_QUERY = 'SELECT it.typeID, it.typeName, it.groupID, ig.groupName, it.capacity ' \
+        ' FROM  invTypes it ' \
+        ' JOIN invGroups ig ON it.groupID = ig.groupID '
+
+    @staticmethod
+    def _typeid_row_to_dict(row: tuple) -> dict:
         ret = dict()
         ret['typeid'] = 0
         ret['name'] = ''
         ret['groupid'] = 0
         ret['groupname'] = ''
         ret['capacity'] = 0
-        q = 'SELECT it.typeID, it.typeName, it.groupID, ig.groupName, it.capacity ' \
-            ' FROM  invTypes it ' \
-            ' JOIN invGroups ig ON it.groupID = ig.groupID ' \
-            ' WHERE it.typeID = ?'
+        if row:
+            ret['typeid'] = int(row[0])
+            if row[1] is not None:
+                ret['name'] = row[1]
+            if row[2] is not None:
+                ret['groupid'] = int(row[2])
+            if row[3] is not None:
+                ret['groupname'] = row[3]
+            if row[4] is not None:
+                ret['capacity'] = float(row[4])
+        return ret
+
+    def type_index(self) -> TypeIndex:
+        """
+        Get preloaded invTypes index, (re)loading it together with static data snapshot
+        :return: current types index, or None if it is disabled in config
+        """
+        if self._type_index_mode == 'off':
+            return None
+        version = self.static_data().version
+        index = self._type_index
+        if (index is not None) and (index.version == version):
+            return index
+        with self._snapshot_lock:
+            index = self._type_index
+            if (index is None) or (index.version != version):
+                index = load_type_index(self._pool.reader(), version)
+                self._type_index = index
+        return index
+
+    def find_typeid(self, typeid: int) -> dict:
+        index = self.type_index()
+        if index is not None:
+            ret = index.find(typeid)
+            if ret is None:
+                ret = self._typeid_row_to_dict(None)
+            return ret
+        row = None
+        q = self._TYPEID_QUERY + ' WHERE it.typeID = ?'
         try:
-            cur = self._conn.cursor()
+            cur = self._pool.reader().cursor()
             cur.execute(q, (typeid,))
             row = cur.fetchone()
-            if row:
-                ret['typeid'] = typeid
-                if row[1] is not None:
-                    ret['name'] = row[1]
-                if row[2] is not None:
-                    ret['groupid'] = int(row[2])
-                if row[3] is not None:
-                    ret['groupname'] = row[3]
-                if row[4] is not None:
-                    ret['capacity'] = float(row[4])
         except TypeError as te:
             print('Content-type: text/plain\n\n')
             print('database.find_typeid(): error finding typeID = ', typeid)
             print(str(te))
+        return self._typeid_row_to_dict(row)
+
+    def find_typeids(self, typeids) -> dict:
+        """
+        Bulk version of find_typeid()
+        :param typeids: iterable of type IDs
+        :return: dict type ID => info dict, as returned by find_typeid(); for unknown
+                 IDs the same empty info dict is returned as find_typeid() does
+        """
+        ret = dict()
+        index = self.type_index()
+        if index is not None:
+            for typeid in typeids:
+                type_info = index.find(typeid)
+                ret[typeid] = type_info if type_info is not None else self._typeid_row_to_dict(None)
+            return ret
+        cur = self._pool.reader().cursor()
+        for chunk in _chunks(typeids, self.SQL_IN_CHUNK_SIZE):
+            for typeid in chunk:
+                ret[typeid] = self._typeid_row_to_dict(None)
+            q = self._TYPEID_QUERY + ' WHERE it.typeID IN ({0})'.format(','.join('?' * len(chunk)))
+            cur.execute(q, chunk)
+            for row in cur:
+                ret[int(row[0])] = self._typeid_row_to_dict(row)
         return ret
 
     def map_denormalize(self, itemid: int) -> dict:
@@ -803,7 +874,7 @@ class SiteDb:
             ' constellationID, regionID, orbitID, x, y, z, ' \
             ' radius, itemName, security, celestialIndex, orbitIndex ' \
             'FROM mapDenormalize WHERE itemID = ?'
-        cur = self._conn.cursor()
+        cur = self._pool.reader().cursor()
         cur.execute(q, (itemid,))
         row = cur.fetchone()
         if row:
@@ -829,7 +900,7 @@ class SiteDb:
         ret = None
         q = 'SELECT typeID, typeName, fuel_bay_capacity, strontium_bay_capacity, fuel_blocks_per_hour ' \
             ' FROM posFuelData WHERE typeID = ?'
-        cur = self._conn.cursor()
+        cur = self._pool.reader().cursor()
         cur.execute(q, (pos_typeid,))
         row = cur.fetchone()
         if row:
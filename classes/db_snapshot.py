@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import types
+
+from . import sleeper_stats
+
+
+def _freeze_index(index: dict) -> types.MappingProxyType:
+    """
+    Convert index of lists {key: [v1, v2, ...]} into read-only mapping of tuples
+    """
+    return types.MappingProxyType({k: tuple(v) for k, v in index.items()})
+
+
+class StaticDataSnapshot:
+    """
+    Read-only in-memory copy of static WH tables from EVE DB:
+    wormholesystems_new, wormholeclassifications, signatures,
+    signature_waves, sleepers and effects_new. Those tables only change
+    between database updates, so they are loaded once and all lookups
+    become dictionary accesses. All rows are stored as tuples, exactly
+    as they are returned by sqlite3; sleepers are stored as dicts, and
+    must not be modified by callers (SiteDb returns copies).
+    """
+
+    def __init__(self, version: tuple):
+        self.version = version
+        # solarsystemid => (class, star, planets, moons, effect, statics)
+        self.wormholesystems = types.MappingProxyType({})
+        # 'J105443' => solarsystemid
+        self.wormholesystems_by_name = types.MappingProxyType({})
+        # solarsystemid => 'J105443', as it is written in DB
+        self.wormholesystems_names = types.MappingProxyType({})
+        # class => (solarsystemid, ...)
+        self.wormholesystems_by_class = types.MappingProxyType({})
+        # hole name => (id, hole, in_class, maxStableTime, maxStableMass, massRegeneration, maxJumpMass)
+        self.holes = types.MappingProxyType({})
+        # in_class => (hole name, ...)
+        self.holes_by_class = types.MappingProxyType({})
+        # solarsystemid => ((hole name, in_class), ...), from system_statics table
+        self.system_statics = types.MappingProxyType({})
+        # sig_id => (id, wh_class, sig_type, sig_name)
+        self.signatures = types.MappingProxyType({})
+        # wh_class => (sig_id, ...)
+        self.signatures_by_class = types.MappingProxyType({})
+        # sig_type => (sig_id, ...)
+        self.signatures_by_type = types.MappingProxyType({})
+        # sig_id => ((sig_id, wave_id, is_capital, sleepers), ...)
+        self.signature_waves = types.MappingProxyType({})
+        # sleeper_id => dict with all sleeper columns
+        self.sleepers = types.MappingProxyType({})
+        # wh_class string, like '1,2' => (sleeper_id, ...)
+        self.sleepers_by_class = types.MappingProxyType({})
+        # sig_id => max DPS of a single non-capital wave
+        self.signature_max_dps = types.MappingProxyType({})
+        # ((id, id_type, hole, effect, icon, c1, c2, c3, c4, c5, c6), ...) ordered by id
+        self.effects = tuple()
+        # id_type => (effects row, ...)
+        self.effects_by_type = types.MappingProxyType({})
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        cur = conn.cursor()
+        self._load_wormholesystems(cur)
+        self._load_holes(cur)
+        self._load_system_statics(cur)
+        self._load_signatures(cur)
+        self._load_signature_waves(cur)
+        self._load_sleepers(cur)
+        self._load_effects(cur)
+        cur.close()
+        self._calc_signature_max_dps()
+
+    def _load_wormholesystems(self, cur: sqlite3.Cursor) -> None:
+        by_id = dict()
+        by_name = dict()
+        names = dict()
+        by_class = dict()
+        cur.execute('SELECT solarsystemid, system, class, star, planets, moons, effect, statics '
+                    ' FROM wormholesystems_new')
+        for row in cur:
+            ssid = int(row[0])
+            by_id[ssid] = tuple(row[2:])
+            by_name[str(row[1]).upper()] = ssid
+            names[ssid] = row[1]
+            by_class.setdefault(row[2], []).append(ssid)
+        self.wormholesystems = types.MappingProxyType(by_id)
+        self.wormholesystems_by_name = types.MappingProxyType(by_name)
+        self.wormholesystems_names = types.MappingProxyType(names)
+        self.wormholesystems_by_class = _freeze_index(by_class)
+
+    def _load_holes(self, cur: sqlite3.Cursor) -> None:
+        by_name = dict()
+        by_class = dict()
+        cur.execute('SELECT id, hole, in_class, maxStableTime, maxStableMass, massRegeneration, maxJumpMass '
+                    ' FROM wormholeclassifications')
+        for row in cur:
+            # the first one wins, as it was with "SELECT ... WHERE hole = ?" + fetchone()
+            if row[1] not in by_name:
+                by_name[row[1]] = tuple(row)
+                by_class.setdefault(row[2], []).append(row[1])
+        self.holes = types.MappingProxyType(by_name)
+        self.holes_by_class = _freeze_index(by_class)
+
+    def _load_system_statics(self, cur: sqlite3.Cursor) -> None:
+        try:
+            cur.execute('SELECT solarsystemid, hole, in_class FROM system_statics ORDER BY solarsystemid, rowid')
+            rows = cur.fetchall()
+        except sqlite3.OperationalError:
+            # DB is not patched with system_statics.sql, split statics the same way here
+            rows = []
+            for ssid, row in self.wormholesystems.items():
+                if row[5] is None:
+                    continue
+                for hole in str(row[5]).split(','):
+                    hole = hole.strip()
+                    if hole != '':
+                        hole_row = self.holes.get(hole)
+                        rows.append((ssid, hole, hole_row[2] if hole_row is not None else None))
+        by_system = dict()
+        for row in rows:
+            by_system.setdefault(int(row[0]), []).append((row[1], row[2]))
+        self.system_statics = _freeze_index(by_system)
+
+    def _load_signatures(self, cur: sqlite3.Cursor) -> None:
+        by_id = dict()
+        by_class = dict()
+        by_type = dict()
+        cur.execute('SELECT id, wh_class, sig_type, sig_name FROM signatures')
+        for row in cur:
+            sig_id = int(row[0])
+            by_id[sig_id] = tuple(row)
+            by_class.setdefault(row[1], []).append(sig_id)
+            by_type.setdefault(row[2], []).append(sig_id)
+        self.signatures = types.MappingProxyType(by_id)
+        self.signatures_by_class = _freeze_index(by_class)
+        self.signatures_by_type = _freeze_index(by_type)
+
+    def _load_signature_waves(self, cur: sqlite3.Cursor) -> None:
+        by_sig = dict()
+        cur.execute('SELECT sig_id, wave_id, is_capital, sleepers FROM signature_waves')
+        for row in cur:
+            by_sig.setdefault(row[0], []).append(tuple(row))
+        self.signature_waves = _freeze_index(by_sig)
+
+    def _load_sleepers(self, cur: sqlite3.Cursor) -> None:
+        by_id = dict()
+        by_class = dict()
+        cur.execute('SELECT id, typeid, wh_class, icon, name,'
+                    ' signature, maxspeed, orbit, optimal, '
+                    ' shield, armor, hull, '
+                    ' shield_res_em, shield_res_therm, shield_res_kin, shield_res_exp, '
+                    ' armor_res_em, armor_res_therm, armor_res_kin, armor_res_exp, '
+                    ' dps_em, dps_therm, dps_kin, dps_exp,'
+                    ' loot_acd, loot_nna, loot_sdl, loot_sdai, '
+                    ' ability, '
+                    ' neut_range, neut_amount, neut_duration, '
+                    ' dis_range, dis_strength, '
+                    ' web_range, web_strength, '
+                    ' rr_range, rr_amount, rr_duration, '
+                    ' extra_comment '
+                    'FROM sleepers')
+        for row in cur:
+            sl = {
+                'id': int(row[0]),
+                'typeid': int(row[1]),
+                'wh_class': str(row[2]),
+                'icon': str(row[3]),
+                'name': str(row[4]),
+                'signature': int(row[5]),
+                'maxspeed': int(row[6]),
+                'orbit': int(row[7]),
+                'optimal': int(row[8]),
+                'shield': int(row[9]),
+                'armor': int(row[10]),
+                'hull': int(row[11]),
+                'shield_res_em': int(row[12]),
+                'shield_res_therm': int(row[13]),
+                'shield_res_kin': int(row[14]),
+                'shield_res_exp': int(row[15]),
+                'armor_res_em': int(row[16]),
+                'armor_res_therm': int(row[17]),
+                'armor_res_kin': int(row[18]),
+                'armor_res_exp': int(row[19]),
+                'dps_em': int(row[20]),
+                'dps_therm': int(row[21]),
+                'dps_kin': int(row[22]),
+                'dps_exp': int(row[23]),
+                'loot_acd': int(row[24]),
+                'loot_nna': int(row[25]),
+                'loot_sdl': int(row[26]),
+                'loot_sdai': int(row[27]),
+                'ability': row[28],  # may be None, let it be None, not 'None'
+                'neut_range': int(row[29]),
+                'neut_amount': int(row[30]),
+                'neut_duration': int(row[31]),
+                'dis_range': int(row[32]),
+                'dis_strength': int(row[33]),
+                'web_range': int(row[34]),
+                'web_strength': int(row[35]),
+                'rr_range': int(row[36]),
+                'rr_amount': int(row[37]),
+                'rr_duration': int(row[38]),
+                'extra_comment': str(row[39])
+            }
+            by_id[sl['id']] = sl
+            by_class.setdefault(sl['wh_class'], []).append(sl['id'])
+        self.sleepers = types.MappingProxyType(by_id)
+        self.sleepers_by_class = _freeze_index(by_class)
+
+    def _calc_signature_max_dps(self) -> None:
+        """
+        For each signature: max DPS of a single wave; capital waves are skipped
+        """
+        sleeper_dps = dict()
+        for sl_id, sl in self.sleepers.items():
+            sleeper_dps[sl_id] = sleeper_stats.sleeper_dps(sl)
+        max_dps_by_sig = dict()
+        for sig_id in self.signatures:
+            max_dps = 0
+            for wave in self.signature_waves.get(sig_id, tuple()):
+                if int(wave[2]):  # skip capital waves
+                    continue
+                wave_dps = 0
+                for sl_id, sl_count, _ in sleeper_stats.parse_wave_sleepers(str(wave[3])):
+                    if sl_id in sleeper_dps:
+                        wave_dps += sleeper_dps[sl_id] * sl_count
+                if wave_dps > max_dps:
+                    max_dps = wave_dps
+            max_dps_by_sig[sig_id] = max_dps
+        self.signature_max_dps = types.MappingProxyType(max_dps_by_sig)
+
+    def _load_effects(self, cur: sqlite3.Cursor) -> None:
+        rows = list()
+        by_type = dict()
+        cur.execute('SELECT id, id_type, hole, effect, icon, c1, c2, c3, c4, c5, c6 '
+                    ' FROM effects_new ORDER BY id')
+        for row in cur:
+            rows.append(tuple(row))
+            by_type.setdefault(row[1], []).append(tuple(row))
+        self.effects = tuple(rows)
+        self.effects_by_type = _freeze_index(by_type)
+
+
+def load_snapshot(conn: sqlite3.Connection, version: tuple) -> StaticDataSnapshot:
+    snap = StaticDataSnapshot(version)
+    snap.load(conn)
+    return snap
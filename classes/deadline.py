@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import functools
+import threading
+import time
+
+import requests.exceptions
+
+
+_local = threading.local()
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """
+    Raised instead of sending a request, when request handler has no time left.
+    Is a requests' Timeout, so it is handled as any other network timeout.
+    """
+    pass
+
+
+class Deadline:
+    """
+    Time budget for handling one client request. Used as context manager:
+    while it is active, it is current deadline of this thread, and all
+    outbound HTTP calls get no more than remaining time as their timeout.
+
+        with Deadline(15):
+            ... # render page
+    """
+
+    def __init__(self, seconds: float):
+        """
+        :param seconds: time budget; 0 or less means no deadline
+        """
+        self.seconds = seconds
+        self.expire_time = (time.monotonic() + seconds) if seconds > 0 else 0
+
+    def remaining(self) -> float:
+        """
+        :return: seconds left (0 if expired), or None if there is no deadline
+        """
+        if self.expire_time <= 0:
+            return None
+        return max(self.expire_time - time.monotonic(), 0)
+
+    def expired(self) -> bool:
+        return (self.expire_time > 0) and (time.monotonic() >= self.expire_time)
+
+    def __enter__(self):
+        # the same deadline can be entered in several threads at once
+        _stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _stack().pop()
+        return False
+
+
+def _stack() -> list:
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def current() -> Deadline:
+    """
+    :return: deadline of current thread, or None
+    """
+    stack = _stack()
+    return stack[-1] if len(stack) > 0 else None
+
+
+def remaining() -> float:
+    """
+    :return: seconds left for current thread, or None if there is no deadline
+    """
+    dl = current()
+    if dl is None:
+        return None
+    return dl.remaining()
+
+
+def expired() -> bool:
+    dl = current()
+    return (dl is not None) and dl.expired()
+
+
+def cap_timeout(timeout: float) -> float:
+    """
+    Limit outbound call timeout by remaining time of current thread's deadline
+    :param timeout: call's own timeout in seconds, may be None
+    :return: timeout to use
+    :raises DeadlineExceeded: if there is no time left
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded('Request deadline exceeded, call skipped')
+    if (timeout is None) or (timeout > left):
+        return left
+    return timeout
+
+
+def bind(func):
+    """
+    Wrap function to run it in another thread (like thread pool worker)
+    under the deadline of the calling thread
+    """
+    dl = current()
+    if dl is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with dl:
+            return func(*args, **kwargs)
+    return wrapper
@@ -3,7 +3,7 @@ import pathlib
 import cherrypy
 
 from .sitecfg import SiteConfig
-from .template_engine import TemplateEngine
+from .template_engine import TemplateEngine, TemplateContext
 from .tr_support import MultiLangTranslator
 
 
@@ -32,9 +32,8 @@ def erro_page_detect_request_locale(tr: MultiLangTranslator) -> str:
     return selected_locale
 
 
-def error_page_create_template_engine(title: str, mode: str) -> TemplateEngine:
-    siteconfig = SiteConfig()
-    te = TemplateEngine(siteconfig)
+def error_page_create_template_context(siteconfig: SiteConfig, title: str, mode: str) -> TemplateContext:
+    te = TemplateContext()
     te.assign('title', title)  # default title
     te.assign('MODE', mode)  # current page identifier
     te.assign('sitecfg', siteconfig)
@@ -66,11 +65,13 @@ def error_page_create_template_engine(title: str, mode: str) -> TemplateEngine:
 
 
 def page_404(status, message, traceback, version):
-    te = error_page_create_template_engine(title='404 - WHDBX', mode='error404')
-    return te.render('404.html')
+    siteconfig = SiteConfig()
+    ctx = error_page_create_template_context(siteconfig, title='404 - WHDBX', mode='error404')
+    return TemplateEngine(siteconfig).render('404.html', ctx)
 
 
 def page_500(status, message, traceback, version):
-    te = error_page_create_template_engine(title='500 - WHDBX', mode='error500')
-    te.assign('stacktrace', str(traceback))
-    return te.render('500.html')
+    siteconfig = SiteConfig()
+    ctx = error_page_create_template_context(siteconfig, title='500 - WHDBX', mode='error500')
+    ctx.assign('stacktrace', str(traceback))
+    return TemplateEngine(siteconfig).render('500.html', ctx)
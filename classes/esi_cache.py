@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import collections
+import datetime
+import email.utils
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import sitecfg
+from .lru_cache import LRUCache
+
+
+# Cached ESI response: body text, ETag header value (may be ''),
+# and unix time until which response is fresh (from Expires header)
+EsiCacheEntry = collections.namedtuple('EsiCacheEntry', ['text', 'etag', 'expires'])
+
+# Response object returned instead of requests.Response for cache hits;
+# has the same attributes, that are used by esi_calls
+CachedResponse = collections.namedtuple('CachedResponse', ['status_code', 'text', 'headers'])
+
+
+def parse_expires(headers) -> float:
+    """
+    :param headers: response headers
+    :return: local unix time when response expires, or 0 if there is no valid Expires.
+             It is counted from Date header, if any, so that clock skew does not matter
+    """
+    expires = _parse_http_date(headers.get('expires'))
+    if expires <= 0:
+        return 0
+    server_now = _parse_http_date(headers.get('date'))
+    if server_now <= 0:
+        return expires
+    return time.time() + (expires - server_now)
+
+
+def _parse_http_date(value: str) -> float:
+    if not value:
+        return 0
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return 0
+    if dt is None:
+        return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+class EsiCacheBase:
+    """
+    Storage for ESI responses. Entries are kept for KEEP_STALE seconds
+    after they expire, to be revalidated with If-None-Match.
+    """
+    KEEP_STALE = 24 * 3600
+
+    def get(self, key: str) -> EsiCacheEntry:
+        return None
+
+    def set(self, key: str, entry: EsiCacheEntry) -> None:
+        pass
+
+    def _keep_time(self, entry: EsiCacheEntry) -> float:
+        return max(entry.expires - time.time(), 0) + self.KEEP_STALE
+
+
+class EsiCacheMemory(EsiCacheBase):
+    def __init__(self, max_entries: int):
+        self._cache = LRUCache(max_entries)
+
+    def get(self, key: str) -> EsiCacheEntry:
+        return self._cache.get(key)
+
+    def set(self, key: str, entry: EsiCacheEntry) -> None:
+        self._cache.put(key, entry, self._keep_time(entry))
+
+
+class EsiCacheSqlite(EsiCacheBase):
+    def __init__(self, filename: str):
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS esi_cache '
+                               '(key TEXT PRIMARY KEY, text TEXT, etag TEXT, expires REAL, keep_until REAL)')
+            self._conn.execute('DELETE FROM esi_cache WHERE keep_until < ?', (time.time(),))
+            self._conn.commit()
+
+    def get(self, key: str) -> EsiCacheEntry:
+        with self._lock:
+            row = self._conn.execute('SELECT text, etag, expires FROM esi_cache WHERE key = ? AND keep_until >= ?',
+                                     (key, time.time())).fetchone()
+        if row is None:
+            return None
+        return EsiCacheEntry(row[0], row[1], row[2])
+
+    def set(self, key: str, entry: EsiCacheEntry) -> None:
+        keep_until = time.time() + self._keep_time(entry)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO esi_cache (key, text, etag, expires, keep_until) '
+                               'VALUES (?, ?, ?, ?, ?)', (key, entry.text, entry.etag, entry.expires, keep_until))
+            self._conn.commit()
+
+
+class EsiCacheRedis(EsiCacheBase):
+    KEY_PREFIX = 'esi_cache_'
+
+    def __init__(self, host: str, port: int, db: int):
+        import redis  # optional dependency, only needed for this cache type
+        self._redis = redis.StrictRedis(host, port, db)
+
+    def get(self, key: str) -> EsiCacheEntry:
+        value = self._redis.get(self.KEY_PREFIX + key)
+        if value is None:
+            return None
+        try:
+            return EsiCacheEntry(*json.loads(value.decode('utf-8')))
+        except (ValueError, TypeError):
+            return None
+
+    def set(self, key: str, entry: EsiCacheEntry) -> None:
+        self._redis.set(self.KEY_PREFIX + key, json.dumps(list(entry)), ex=int(self._keep_time(entry)) + 1)
+
+
+_esi_cache = None
+_esi_cache_lock = threading.Lock()
+
+
+def get_esi_cache(cfg: sitecfg.SiteConfig) -> EsiCacheBase:
+    """
+    :return: shared ESI responses cache, of type configured in [esi] cache_type
+    """
+    global _esi_cache
+    if _esi_cache is not None:
+        return _esi_cache
+    with _esi_cache_lock:
+        if _esi_cache is None:
+            if cfg.ESI_CACHE_TYPE == 'memory':
+                _esi_cache = EsiCacheMemory(cfg.ESI_CACHE_SIZE)
+            elif cfg.ESI_CACHE_TYPE == 'sqlite':
+                _esi_cache = EsiCacheSqlite(cfg.ESI_CACHE_FILE)
+            elif cfg.ESI_CACHE_TYPE == 'redis':
+                _esi_cache = EsiCacheRedis(cfg.ESI_CACHE_REDIS_HOST, cfg.ESI_CACHE_REDIS_PORT, cfg.ESI_CACHE_REDIS_DB)
+            else:
+                _esi_cache = EsiCacheBase()  # 'none', does not store anything
+        return _esi_cache
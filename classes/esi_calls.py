@@ -3,20 +3,122 @@ import datetime
 import json
 import os
 import os.path
+import time
+import urllib.parse
 
 import requests
 
 from . import sitecfg
+from . import http_client
+from . import esi_throttle
+from .esi_throttle import PRIORITY_ESSENTIAL, PRIORITY_NORMAL, PRIORITY_BACKGROUND
+from .esi_cache import CachedResponse, EsiCacheEntry, get_esi_cache, parse_expires
+from .single_flight import SingleFlight
 
 
 esi_proxies = None
 
+# concurrent identical requests to ESI are sent only once
+esi_flight = SingleFlight()
+
+# ESI error limit, tracked from all responses
+esi_budget = esi_throttle.EsiErrorBudget()
+
 
 def set_esi_proxies(proxies: dict):
     global esi_proxies
     esi_proxies = proxies
 
 
+class _ThrottledClient:
+    """
+    Sends requests through shared ESI client only if ESI error budget allows
+    calls of given priority. Otherwise request is not sent, and a fake
+    "420 Error limited" response is returned, like ESI does when error limit is hit.
+    """
+
+    def __init__(self, client: http_client.HttpClient, priority: int):
+        self._client = client
+        self._priority = priority
+
+    def _throttled_response(self) -> CachedResponse:
+        return CachedResponse(420, json.dumps({'error': 'ESI error limit is almost reached, request skipped'}), {})
+
+    def get(self, url: str, **kwargs):
+        if not esi_budget.allow(self._priority):
+            return self._throttled_response()
+        return self._client.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        if not esi_budget.allow(self._priority):
+            return self._throttled_response()
+        return self._client.post(url, **kwargs)
+
+
+def _track_error_budget(r: requests.Response) -> None:
+    esi_budget.update(r.status_code, r.headers)
+
+
+def esi_client(cfg: sitecfg.SiteConfig, priority: int = PRIORITY_NORMAL) -> _ThrottledClient:
+    """
+    :param priority: call priority, for error limit throttling, one of esi_throttle.PRIORITY_*
+    :return: shared keep-alive HTTP client for ESI
+    """
+    client = http_client.get_client('esi', headers={'User-Agent': cfg.SSO_USER_AGENT}, timeout=10,
+                                    on_response=_track_error_budget)
+    return _ThrottledClient(client, priority)
+
+
+def sso_client(cfg: sitecfg.SiteConfig) -> http_client.HttpClient:
+    """
+    :return: shared keep-alive HTTP client for login.eveonline.com
+    """
+    return http_client.get_client('sso', headers={'User-Agent': cfg.SSO_USER_AGENT}, timeout=10)
+
+
+def esi_cached_get(cfg: sitecfg.SiteConfig, url: str, params: dict = None, headers: dict = None,
+                   timeout: float = 10, priority: int = PRIORITY_NORMAL):
+    """
+    GET public (not authenticated) ESI route, honouring Expires and ETag:
+    fresh response is returned from cache without any request, expired one
+    is revalidated with If-None-Match, and 304 reply is used as a cache hit.
+    If ESI is not available, or call is throttled by error budget,
+    expired response is returned, if there is one.
+    :return: requests.Response, or CachedResponse with the same fields for cache hits
+    """
+    global esi_proxies
+    cache = get_esi_cache(cfg)
+    key = url
+    if params:
+        key += '?' + urllib.parse.urlencode(sorted(params.items()))
+    entry = cache.get(key)
+    if (entry is not None) and (entry.expires > time.time()):
+        return CachedResponse(200, entry.text, {})
+    req_headers = dict(headers) if headers else dict()
+    if (entry is not None) and (entry.etag != ''):
+        req_headers['If-None-Match'] = entry.etag
+    try:
+        r = esi_client(cfg, priority).get(url, params=params, headers=req_headers, proxies=esi_proxies,
+                                          timeout=timeout)
+    except requests.exceptions.RequestException:
+        # ESI is down or circuit is open: expired data is better than nothing
+        if entry is not None:
+            return CachedResponse(200, entry.text, {})
+        raise
+    # 420 is error limited, by ESI itself or by our error budget
+    if ((r.status_code >= 500) or (r.status_code == 420)) and (entry is not None):
+        return CachedResponse(200, entry.text, {})
+    if (r.status_code == 304) and (entry is not None):
+        entry = EsiCacheEntry(entry.text, r.headers.get('etag', entry.etag), parse_expires(r.headers))
+        cache.set(key, entry)
+        return CachedResponse(200, entry.text, r.headers)
+    if r.status_code == 200:
+        entry = EsiCacheEntry(r.text, r.headers.get('etag', ''), parse_expires(r.headers))
+        if (entry.expires > 0) or (entry.etag != ''):
+            cache.set(key, entry)
+    return r
+
+
 class ESIException(Exception):
     def __init__(self, msg: str = ''):
         self.msg = msg
@@ -55,33 +157,22 @@ def analyze_esi_response_headers(headers: dict) -> None:
         pass
 
 
-def universe_names(cfg: sitecfg.SiteConfig, ids_list: list) -> list:
+def _universe_names_request(cfg: sitecfg.SiteConfig, url: str, ids_str: str) -> str:
     global esi_proxies
-    ret = []
     error_str = ''
-    if len(ids_list) <= 0:
-        return ret
+    response_text = ''
     try:
-        # https://esi.evetech.net/ui/?version=latest#/Universe/post_universe_names
-        url = '{}/universe/names/'.format(cfg.ESI_BASE_URL)
-        ids_str = '['
-        for an_id in set(ids_list):
-            if len(ids_str) > 1:
-                ids_str += ','
-            ids_str += str(an_id)
-        ids_str += ']'
-        r = requests.post(url,
-                          headers={
-                              'Content-Type': 'application/json',
-                              'Accept': 'application/json',
-                              'User-Agent': cfg.SSO_USER_AGENT
-                          },
-                          data=ids_str,
-                          proxies=esi_proxies,
-                          timeout=20)
+        r = esi_client(cfg, PRIORITY_BACKGROUND).post(url,
+                                                      headers={
+                                                          'Content-Type': 'application/json',
+                                                          'Accept': 'application/json',
+                                                          'User-Agent': cfg.SSO_USER_AGENT
+                                                      },
+                                                      data=ids_str,
+                                                      proxies=esi_proxies,
+                                                      timeout=20)
         response_text = r.text
         if r.status_code == 200:
-            ret = json.loads(response_text)
             analyze_esi_response_headers(r.headers)
         else:
             obj = json.loads(response_text)
@@ -95,12 +186,33 @@ def universe_names(cfg: sitecfg.SiteConfig, ids_list: list) -> list:
         error_str = 'Failed to parse response JSON from CCP ESI server!'
     if error_str != '':
         raise ESIException(error_str)
+    return response_text
+
+
+def universe_names(cfg: sitecfg.SiteConfig, ids_list: list) -> list:
+    ret = []
+    if len(ids_list) <= 0:
+        return ret
+    # https://esi.evetech.net/ui/?version=latest#/Universe/post_universe_names
+    url = '{}/universe/names/'.format(cfg.ESI_BASE_URL)
+    ids_str = '['
+    for an_id in sorted(set(ids_list)):
+        if len(ids_str) > 1:
+            ids_str += ','
+        ids_str += str(an_id)
+    ids_str += ']'
+    # users opening the same page at once ask for the same names
+    response_text = esi_flight.do(('universe_names', url, ids_str),
+                                  _universe_names_request, cfg, url, ids_str)
+    try:
+        ret = json.loads(response_text)
+    except json.JSONDecodeError:
+        raise ESIException('Failed to parse response JSON from CCP ESI server!')
     # ret == [{'category': 'character', 'name': 'Xur Hermit', 'id': 2114246032}]
     return ret
 
 
 def public_data(cfg: sitecfg.SiteConfig, char_id: int) -> dict:
-    global esi_proxies
     ret = {
         'error': '',
         'char_id': char_id,
@@ -120,14 +232,13 @@ def public_data(cfg: sitecfg.SiteConfig, char_id: int) -> dict:
         # https://esi.tech.ccp.is/latest/#!/Character/get_characters_character_id
         # This route is cached for up to 3600 seconds
         url = '{}/characters/{}/'.format(cfg.ESI_BASE_URL, char_id)
-        r = requests.get(url,
-                         headers={
-                             'Content-Type': 'application/json',
-                             'Accept': 'application/json',
-                             'User-Agent': cfg.SSO_USER_AGENT
-                         },
-                         proxies=esi_proxies,
-                         timeout=10)
+        r = esi_cached_get(cfg, url,
+                           headers={
+                               'Content-Type': 'application/json',
+                               'Accept': 'application/json',
+                               'User-Agent': cfg.SSO_USER_AGENT
+                           },
+                           timeout=10)
         obj = json.loads(r.text)
         if r.status_code == 200:
             details = json.loads(r.text)
@@ -144,14 +255,13 @@ def public_data(cfg: sitecfg.SiteConfig, char_id: int) -> dict:
         # https://esi.tech.ccp.is/latest/#!/Corporation/get_corporations_corporation_id
         # This route is cached for up to 3600 seconds
         url = '{}/corporations/{}/'.format(cfg.ESI_BASE_URL, ret['corp_id'])
-        r = requests.get(url,
-                         headers={
-                             'Content-Type': 'application/json',
-                             'Accept': 'application/json',
-                             'User-Agent': cfg.SSO_USER_AGENT
-                         },
-                         proxies=esi_proxies,
-                         timeout=10)
+        r = esi_cached_get(cfg, url,
+                           headers={
+                               'Content-Type': 'application/json',
+                               'Accept': 'application/json',
+                               'User-Agent': cfg.SSO_USER_AGENT
+                           },
+                           timeout=10)
         obj = json.loads(r.text)
         if r.status_code == 200:
             details = json.loads(r.text)
@@ -185,17 +295,17 @@ def do_refresh_token(cfg: sitecfg.SiteConfig, refresh_token: str) -> dict:
         }
     }
     try:
-        r = requests.post('https://login.eveonline.com/oauth/token',
-                          auth=(cfg.SSO_CLIENT_ID, cfg.SSO_SECRET_KEY),
-                          headers={
-                              'Content-Type': 'application/x-www-form-urlencoded',
-                              'User-Agent': cfg.SSO_USER_AGENT
-                          },
-                          data={
-                              'grant_type': 'refresh_token',
-                              'refresh_token': refresh_token
-                          },
-                          timeout=10)
+        r = sso_client(cfg).post('https://login.eveonline.com/oauth/token',
+                                 auth=(cfg.SSO_CLIENT_ID, cfg.SSO_SECRET_KEY),
+                                 headers={
+                                     'Content-Type': 'application/x-www-form-urlencoded',
+                                     'User-Agent': cfg.SSO_USER_AGENT
+                                 },
+                                 data={
+                                     'grant_type': 'refresh_token',
+                                     'refresh_token': refresh_token
+                                 },
+                                 timeout=10)
         if (r.status_code >= 200) and (r.status_code < 300):
             response_text = r.text
             details = json.loads(response_text)
@@ -235,15 +345,15 @@ def location_online(cfg: sitecfg.SiteConfig, char_id: int, access_token: str) ->
         # https://esi.tech.ccp.is/latest/#!/Location/get_characters_character_id_online
         # This route is cached for up to 60 seconds
         url = '{}/characters/{}/online/'.format(cfg.ESI_BASE_URL, char_id)
-        r = requests.get(url,
-                         headers={
-                             'Authorization': 'Bearer ' + access_token,
-                             'Content-Type': 'application/json',
-                             'Accept': 'application/json',
-                             'User-Agent': cfg.SSO_USER_AGENT
-                         },
-                         proxies=esi_proxies,
-                         timeout=10)
+        r = esi_client(cfg, PRIORITY_ESSENTIAL).get(url,
+                                                    headers={
+                                                        'Authorization': 'Bearer ' + access_token,
+                                                        'Content-Type': 'application/json',
+                                                        'Accept': 'application/json',
+                                                        'User-Agent': cfg.SSO_USER_AGENT
+                                                    },
+                                                    proxies=esi_proxies,
+                                                    timeout=10)
         response_text = r.text
         # '{"last_login":"2018-05-22T22:52:32Z","last_logout":"2018-05-19T20:43:44Z","logins":505,"online":true}'
         if r.status_code == 200:
@@ -277,15 +387,15 @@ def location_ship(cfg: sitecfg.SiteConfig, char_id: int, access_token: str) -> d
         # https://esi.tech.ccp.is/latest/#!/Location/get_characters_character_id_ship
         # This route is cached for up to 5 seconds
         url = '{}/characters/{}/ship/'.format(cfg.ESI_BASE_URL, char_id)
-        r = requests.get(url,
-                         headers={
-                             'Authorization': 'Bearer ' + access_token,
-                             'Content-Type': 'application/json',
-                             'Accept': 'application/json',
-                             'User-Agent': cfg.SSO_USER_AGENT
-                         },
-                         proxies=esi_proxies,
-                         timeout=10)
+        r = esi_client(cfg, PRIORITY_ESSENTIAL).get(url,
+                                                    headers={
+                                                        'Authorization': 'Bearer ' + access_token,
+                                                        'Content-Type': 'application/json',
+                                                        'Accept': 'application/json',
+                                                        'User-Agent': cfg.SSO_USER_AGENT
+                                                    },
+                                                    proxies=esi_proxies,
+                                                    timeout=10)
         obj = json.loads(r.text)
         if r.status_code == 200:
             details = json.loads(r.text)
@@ -321,15 +431,15 @@ def location_location(cfg: sitecfg.SiteConfig, char_id: int, access_token: str)
         # #    and also the current station or structure ID if applicable.
         # This route is cached for up to 5 seconds
         url = '{}/characters/{}/location/'.format(cfg.ESI_BASE_URL, char_id)
-        r = requests.get(url,
-                         headers={
-                             'Authorization': 'Bearer ' + access_token,
-                             'Content-Type': 'application/json',
-                             'Accept': 'application/json',
-                             'User-Agent': cfg.SSO_USER_AGENT
-                         },
-                         proxies=esi_proxies,
-                         timeout=10)
+        r = esi_client(cfg, PRIORITY_ESSENTIAL).get(url,
+                                                    headers={
+                                                        'Authorization': 'Bearer ' + access_token,
+                                                        'Content-Type': 'application/json',
+                                                        'Accept': 'application/json',
+                                                        'User-Agent': cfg.SSO_USER_AGENT
+                                                    },
+                                                    proxies=esi_proxies,
+                                                    timeout=10)
         obj = json.loads(r.text)
         if r.status_code == 200:
             details = json.loads(r.text)
@@ -371,15 +481,14 @@ def market_region_orders(cfg: sitecfg.SiteConfig, region_id: int, order_type: st
         }
         if optional_type_id is not None:
             get_params['type_id'] = optional_type_id
-        r = requests.get(url,
-                         params=get_params,
-                         headers={
-                             'Content-Type': 'application/json',
-                             'Accept': 'application/json',
-                             'User-Agent': cfg.SSO_USER_AGENT
-                         },
-                         proxies=esi_proxies,
-                         timeout=20)
+        r = esi_cached_get(cfg, url,
+                           params=get_params,
+                           headers={
+                               'Content-Type': 'application/json',
+                               'Accept': 'application/json',
+                               'User-Agent': cfg.SSO_USER_AGENT
+                           },
+                           timeout=20)
         response_text = r.text
         if r.status_code == 200:
             ret = json.loads(response_text)
@@ -415,16 +524,16 @@ def ui_open_window_information(cfg: sitecfg.SiteConfig, target_id: int, access_t
     try:
         # https://esi.tech.ccp.is/latest/#!/User32Interface/post_ui_openwindow_information
         url = '{}/ui/openwindow/information/'.format(cfg.ESI_BASE_URL)
-        r = requests.post(url,
-                          params={'target_id': target_id},
-                          headers={
-                              'Authorization': 'Bearer ' + access_token,
-                              'Content-Type': 'application/json',
-                              'Accept': 'application/json',
-                              'User-Agent': cfg.SSO_USER_AGENT
-                          },
-                          proxies=esi_proxies,
-                          timeout=10)
+        r = esi_client(cfg, PRIORITY_ESSENTIAL).post(url,
+                                                     params={'target_id': target_id},
+                                                     headers={
+                                                         'Authorization': 'Bearer ' + access_token,
+                                                         'Content-Type': 'application/json',
+                                                         'Accept': 'application/json',
+                                                         'User-Agent': cfg.SSO_USER_AGENT
+                                                     },
+                                                     proxies=esi_proxies,
+                                                     timeout=10)
         # only check return code. 204 is "reqeust accepted"
         if (r.status_code >= 200) and (r.status_code <= 299):
             ret = True
@@ -440,39 +549,47 @@ def ui_open_window_information(cfg: sitecfg.SiteConfig, target_id: int, access_t
     return ret
 
 
-def get_killmail_by_id_hash(cfg: sitecfg.SiteConfig, kill_id: str, kill_hash: str) -> dict:
-    """
-    Get killmail JSON info
-    :param cfg: configuration
-    :param kill_id: id like 72725284
-    :param kill_hash: long hash like 56a83bf9445ad4ed88426b19e600e801e6ab57f4
-    :return: returned JSON from API as python dict
-    """
+def _killmail_request(cfg: sitecfg.SiteConfig, url: str) -> str:
     global esi_proxies
-    ret = {}
     error_str = ''
+    response_text = ''
     try:
-        # https://esi.evetech.net/ui/#/Killmails/get_killmails_killmail_id_killmail_hash
-        # GET /killmails/{killmail_id}/{killmail_hash}/
-        url = '{}/killmails/{}/{}/'.format(cfg.ESI_BASE_URL, kill_id, kill_hash)
-        r = requests.get(url,
-                         headers={
-                              'Content-Type': 'application/json',
-                              'Accept': 'application/json',
-                              'User-Agent': cfg.SSO_USER_AGENT
-                         },
-                         proxies=esi_proxies,
-                         timeout=10)
+        r = esi_client(cfg, PRIORITY_BACKGROUND).get(url,
+                                                     headers={
+                                                          'Content-Type': 'application/json',
+                                                          'Accept': 'application/json',
+                                                          'User-Agent': cfg.SSO_USER_AGENT
+                                                     },
+                                                     proxies=esi_proxies,
+                                                     timeout=10)
         # only check return code. 204 is "reqeust accepted"
         if (r.status_code >= 200) and (r.status_code <= 299):
-            ret = json.loads(r.text)
+            response_text = r.text
             analyze_esi_response_headers(r.headers)
         else:
             error_str = 'Error connecting to ESI server: HTTP status {}'.format(r.status_code)
     except requests.exceptions.RequestException as e:
         error_str = 'Error connection to ESI server: {}'.format(str(e))
-    except json.JSONDecodeError:
-        error_str = 'Failed to parse response JSON from CCP ESI server!'
     if error_str != '':
         raise ESIException(error_str)
+    return response_text
+
+
+def get_killmail_by_id_hash(cfg: sitecfg.SiteConfig, kill_id: str, kill_hash: str) -> dict:
+    """
+    Get killmail JSON info
+    :param cfg: configuration
+    :param kill_id: id like 72725284
+    :param kill_hash: long hash like 56a83bf9445ad4ed88426b19e600e801e6ab57f4
+    :return: returned JSON from API as python dict
+    """
+    # https://esi.evetech.net/ui/#/Killmails/get_killmails_killmail_id_killmail_hash
+    # GET /killmails/{killmail_id}/{killmail_hash}/
+    url = '{}/killmails/{}/{}/'.format(cfg.ESI_BASE_URL, kill_id, kill_hash)
+    # every waiting thread parses its own copy, because callers modify returned dict
+    response_text = esi_flight.do(('killmail', url), _killmail_request, cfg, url)
+    try:
+        ret = json.loads(response_text)
+    except json.JSONDecodeError:
+        raise ESIException('Failed to parse response JSON from CCP ESI server!')
     return ret
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+# Priorities of ESI calls, lower is more important
+PRIORITY_ESSENTIAL = 0   # user actions: location, open window in client
+PRIORITY_NORMAL = 1      # data shown on requested page: public char info, prices
+PRIORITY_BACKGROUND = 2  # enrichment: killmails prefetch, names resolving
+
+PRIORITY_NAMES = {
+    PRIORITY_ESSENTIAL: 'essential',
+    PRIORITY_NORMAL: 'normal',
+    PRIORITY_BACKGROUND: 'background'
+}
+
+
+class EsiErrorBudget:
+    """
+    Process-wide ESI error limit tracker. ESI allows only some number of
+    error responses per time window, and bans IP if it is exceeded.
+    Remaining budget and window reset time are taken from headers
+    X-ESI-Error-Limit-Remain / X-ESI-Error-Limit-Reset of every response.
+    As budget drains, less important calls are not sent at all,
+    until the window is reset.
+    """
+    # when remaining errors count is at or below this, calls of
+    # this priority and less important ones are shed
+    SHED_LEVELS = {
+        PRIORITY_BACKGROUND: 50,
+        PRIORITY_NORMAL: 20,
+        PRIORITY_ESSENTIAL: 3
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.remain = None        # unknown until first response
+        self.reset_time = 0       # time.time() when error window resets
+        self.last_update_time = 0
+        self.num_responses = 0
+        self.num_error_limited = 0  # HTTP 420 responses
+        self.num_shed = {priority: 0 for priority in PRIORITY_NAMES}
+
+    def update(self, status_code: int, headers) -> None:
+        """
+        Update budget from any ESI response, including error ones
+        """
+        now = time.time()
+        with self._lock:
+            self.num_responses += 1
+            if status_code == 420:
+                # error limited already
+                self.num_error_limited += 1
+                self.remain = 0
+            if 'x-esi-error-limit-remain' in headers:
+                try:
+                    self.remain = int(headers['x-esi-error-limit-remain'])
+                except ValueError:
+                    pass
+            if 'x-esi-error-limit-reset' in headers:
+                try:
+                    self.reset_time = now + int(headers['x-esi-error-limit-reset'])
+                except ValueError:
+                    pass
+            self.last_update_time = now
+
+    def allow(self, priority: int) -> bool:
+        """
+        :param priority: one of PRIORITY_* constants
+        :return: True if the call can be sent now, False if it should be skipped
+        """
+        with self._lock:
+            if self.remain is None:
+                return True
+            if time.time() >= self.reset_time:
+                return True  # new error window, budget is restored
+            if self.remain > self.SHED_LEVELS[priority]:
+                return True
+            self.num_shed[priority] += 1
+            return False
+
+    def state(self) -> dict:
+        with self._lock:
+            now = time.time()
+            return {
+                'remain': self.remain,
+                'reset_in': max(int(self.reset_time - now), 0) if self.remain is not None else None,
+                'last_update_secs_ago': int(now - self.last_update_time) if self.last_update_time > 0 else None,
+                'responses': self.num_responses,
+                'error_limited': self.num_error_limited,
+                'shed': {PRIORITY_NAMES[p]: n for p, n in self.num_shed.items()},
+                'shed_levels': {PRIORITY_NAMES[p]: n for p, n in self.SHED_LEVELS.items()}
+            }
@@ -3,6 +3,7 @@ import sqlite3
 import threading
 import sys
 
+from . import deadline
 from . import sitecfg
 from . import esi_calls
 
@@ -169,7 +170,10 @@ class EveNamesDb:
         all_unknown_ids = unknown_charids + unknown_corpids + unknown_allyids
         # filter all_unknown_ids from zeroes as they don't make sense to request as ID
         all_unknown_ids = [x for x in all_unknown_ids if x > 0]
-        names = self._resolver.resolve_universe_names(all_unknown_ids)
+        names = []
+        # out of time: show kills with names known so far
+        if (len(all_unknown_ids) > 0) and not deadline.expired():
+            names = self._resolver.resolve_universe_names(all_unknown_ids)
         if self._resolver.error_str != '':
             print('names resolving error: {}'.format(self._resolver.error_str), file=sys.stderr)
             print('names resolving error:  ids were: {}'.format(all_unknown_ids), file=sys.stderr)
@@ -185,9 +189,11 @@ class EveNamesDb:
             elif cat == 'alliance':
                 self.set_ally_name(obj['id'], obj['name'])
 
-        # 3. fill in gathered information
+        # 3. fill in gathered information; unresolved names stay empty
         for kill in kills:
             victim = kill['victim']
+            for name_key in ('character_name', 'corporation_name', 'alliance_name'):
+                victim.setdefault(name_key, '')
             if 'character_id' in victim:
                 char_id = int(victim['character_id'])
                 if char_id > 0:
@@ -207,6 +213,8 @@ class EveNamesDb:
                     if ally_name != '':
                         victim['alliance_name'] = ally_name
             for atk in kill['attackers']:
+                for name_key in ('character_name', 'corporation_name', 'alliance_name'):
+                    atk.setdefault(name_key, '')
                 if 'character_id' in atk:
                     char_id = int(atk['character_id'])
                     if char_id > 0:
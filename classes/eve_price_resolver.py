@@ -6,8 +6,10 @@ import json
 import requests
 import requests.exceptions
 
+from . import deadline
 from . import sitecfg
 from . import esi_calls
+from . import http_client
 
 
 class EvePriceResolver:
@@ -157,7 +159,7 @@ class EveCentralPriceResolver(EvePriceResolver):
         try:
             if self._debug:
                 print('EveCentral: Sending request! {0}'.format(url))
-            r = requests.get(url, headers=self._headers)
+            r = http_client.get_client('evecentral', timeout=20).get(url, headers=self._headers)
             if r.status_code == 200:
                 ret = r.text
             else:
@@ -232,11 +234,16 @@ class EsiPriceResolver(EvePriceResolver):
     def Jita_sell_min(self, typeid: int, ignore_time: bool=False) -> float:
         orders = []
         cache_fn = 'esi_{}_region_{}_sell_min.json'.format(str(typeid), str(self.THE_FORGE_REGIONID))
-        contents = self._cache.load_file_contents(cache_fn, ignore_time)
+        # out of time for request: outdated price is better than none
+        contents = self._cache.load_file_contents(cache_fn, ignore_time or deadline.expired())
         if contents == '':  # not in cache
             if self._debug:
                 print('EsiPriceResolver: sell_min: typeID {} not in cache, requesting'.format(typeid))
-            orders = esi_calls.market_region_orders(self._cfg, self.THE_FORGE_REGIONID, 'sell', typeid)
+            try:
+                orders = esi_calls.market_region_orders(self._cfg, self.THE_FORGE_REGIONID, 'sell', typeid)
+            except esi_calls.ESIException as e:
+                if self._debug:
+                    print('EsiPriceResolver: sell_min: typeID {} request failed: {}'.format(typeid, e.error_string()))
             if len(orders) > 0:
                 print('EsiPriceResolver: sell_min: typeID {} requested OK'.format(typeid))
                 self._cache.save_file_contents(cache_fn, json.dumps(orders))
@@ -262,11 +269,16 @@ class EsiPriceResolver(EvePriceResolver):
     def Jita_buy_max(self, typeid: int, ignore_time: bool=False) -> float:
         orders = []
         cache_fn = 'esi_{}_region_{}_buy_max.json'.format(str(typeid), str(self.THE_FORGE_REGIONID))
-        contents = self._cache.load_file_contents(cache_fn, ignore_time)
+        # out of time for request: outdated price is better than none
+        contents = self._cache.load_file_contents(cache_fn, ignore_time or deadline.expired())
         if contents == '':  # not in cache
             if self._debug:
                 print('EsiPriceResolver: buy_max: {} not in cache, requesting'.format(typeid))
-            orders = esi_calls.market_region_orders(self._cfg, self.THE_FORGE_REGIONID, 'buy', typeid)
+            try:
+                orders = esi_calls.market_region_orders(self._cfg, self.THE_FORGE_REGIONID, 'buy', typeid)
+            except esi_calls.ESIException as e:
+                if self._debug:
+                    print('EsiPriceResolver: buy_max: typeID {} request failed: {}'.format(typeid, e.error_string()))
             if len(orders) > 0:
                 self._cache.save_file_contents(cache_fn, json.dumps(orders))
         else:
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import http.cookiejar
+import threading
+
+import requests
+import requests.adapters
+import requests.exceptions
+
+from . import deadline
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class HttpClient:
+    """
+    Thread-safe HTTP client for a single upstream (ESI, EVE-SSO, zkillboard, ...).
+    All threads share one requests.Session, so connections are kept alive and
+    reused from a pool, instead of TCP+TLS handshake on every call. Responses
+    are transparently decompressed (requests always asks for gzip, deflate).
+    Cookies are never stored, session is shared between all site users.
+    Requests go through a circuit breaker: when upstream is down, they fail
+    fast with CircuitOpenError instead of holding a worker thread until timeout.
+    Timeout of every request is limited by current thread's deadline, if any.
+    With stream=True, request result is reported to circuit breaker only when
+    the body is read with iter_content() or response is closed with finish_stream(),
+    so upstream that sends headers and then stalls is counted as failing.
+    """
+
+    def __init__(self, name: str, headers: dict = None, timeout: float = 10, pool_size: int = 10,
+                 on_response=None, breaker: CircuitBreaker = None):
+        """
+        :param name: upstream name, only for information
+        :param headers: default headers for all requests, can be overriden per request
+        :param timeout: default timeout in seconds, can be overriden per request
+        :param pool_size: max number of kept-alive connections per host
+        :param on_response: optional callable(response), called for every response received
+        :param breaker: circuit breaker for this upstream; connection errors, timeouts
+                        and HTTP 5xx responses are counted as failures
+        """
+        self.name = name
+        self.timeout = timeout
+        self.breaker = breaker if breaker is not None else CircuitBreaker(name)
+        self._session = requests.Session()
+        self._session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        if headers:
+            self._session.headers.update(headers)
+        if on_response is not None:
+            self._session.hooks['response'].append(lambda r, *args, **kwargs: on_response(r))
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        timeout = kwargs.get('timeout')
+        if timeout is None:
+            timeout = self.timeout
+        kwargs['timeout'] = deadline.cap_timeout(timeout)
+        if not self.breaker.allow():
+            raise CircuitOpenError('{} is not available now, request skipped'.format(self.name))
+        try:
+            r = self._session.request(method, url, **kwargs)
+        except requests.exceptions.Timeout:
+            if kwargs['timeout'] != timeout:
+                # cut short by deadline, upstream may be just fine
+                self.breaker.release()
+            else:
+                self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        if r.status_code >= 500:
+            self.breaker.record_failure()
+        elif kwargs.get('stream'):
+            # body is not received yet
+            r.breaker_pending = True
+            r.breaker_timeout_cut = (kwargs['timeout'] != timeout)
+        else:
+            self.breaker.record_success()
+        return r
+
+    def iter_content(self, r: requests.Response, chunk_size: int = 16384, decode_unicode: bool = False):
+        """
+        Read body of response to request(..., stream=True) in chunks, and report
+        result to circuit breaker. Caller may stop iterating early.
+        """
+        success = False
+        try:
+            for chunk in r.iter_content(chunk_size=chunk_size, decode_unicode=decode_unicode):
+                yield chunk
+            success = True
+        except GeneratorExit:
+            success = True  # caller has read enough
+            raise
+        finally:
+            self.finish_stream(r, success)
+
+    def finish_stream(self, r: requests.Response, success: bool = True) -> None:
+        """
+        Close response to request(..., stream=True) and report its result to circuit
+        breaker, if it was not reported yet. Can be called more than once.
+        :param success: False if body could not be read (read timeout, connection reset)
+        """
+        if getattr(r, 'breaker_pending', False):
+            r.breaker_pending = False
+            if success:
+                self.breaker.record_success()
+            elif r.breaker_timeout_cut and deadline.expired():
+                # cut short by deadline, upstream may be just fine
+                self.breaker.release()
+            else:
+                self.breaker.record_failure()
+        r.close()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self) -> None:
+        self._session.close()
+
+
+_clients = dict()  # name => HttpClient
+_clients_lock = threading.Lock()
+_pool_size = 10
+_breaker_failures = 5
+_breaker_reset_timeout = 30
+
+
+def set_pool_size(pool_size: int) -> None:
+    """
+    Set connection pool size for clients created after this call;
+    should be about the number of threads making requests at once
+    """
+    global _pool_size
+    _pool_size = pool_size
+
+
+def set_circuit_breaker(failure_threshold: int, reset_timeout: float) -> None:
+    """
+    Set circuit breaker parameters for clients created after this call
+    :param failure_threshold: consecutive failures to stop sending requests; 0 disables breakers
+    :param reset_timeout: seconds before next try to reach upstream
+    """
+    global _breaker_failures, _breaker_reset_timeout
+    _breaker_failures = failure_threshold
+    _breaker_reset_timeout = reset_timeout
+
+
+def is_available(name: str) -> bool:
+    """
+    :return: False if requests to this upstream are being rejected by circuit breaker now
+    """
+    client = _clients.get(name)
+    if client is None:
+        return True
+    return not client.breaker.is_open()
+
+
+def breakers_info() -> dict:
+    """
+    :return: dict upstream name => circuit breaker state
+    """
+    return {name: client.breaker.info() for name, client in list(_clients.items())}
+
+
+def get_client(name: str, headers: dict = None, timeout: float = 10, on_response=None) -> HttpClient:
+    """
+    Get shared client for upstream, create it on first use.
+    :param name: upstream name, like 'esi', 'zkb'
+    :param headers: default headers, used only when client is created
+    :param timeout: default timeout, used only when client is created
+    :param on_response: response hook, used only when client is created
+    :return: shared client
+    """
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            breaker = CircuitBreaker(name, _breaker_failures, _breaker_reset_timeout)
+            client = HttpClient(name, headers, timeout, _pool_size, on_response, breaker)
+            _clients[name] = client
+        return client
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+from array import array
+import collections
+import mmap
+import os
+import struct
+
+from .route_graph import JumpGraph
+
+
+# Trade hubs, the same as in WHSystem: Jita, Amarr, Dodixie, Hek, Rens
+TRADE_HUBS = (30000142, 30002187, 30002659, 30002053, 30002510)
+
+# security policies: minimum security of intermediate systems on route
+POLICY_HIGHSEC = 0.5
+POLICY_SHORTEST = -1.0
+POLICIES = (POLICY_HIGHSEC, POLICY_SHORTEST)
+
+HUB_ROUTES_FILENAME = 'hub_routes.bin'
+
+# magic, n_systems, n_hubs, n_policies, reserved, db_mtime_ns, db_size;
+# the file is a local cache, so all arrays are in native byte order
+_HEADER = struct.Struct('=8sIIIIqq')
+_MAGIC = b'WHDBXHR1'
+
+
+def _reverse_adjacency(graph: JumpGraph) -> tuple:
+    """
+    Build CSR arrays of incoming jumps: sources of jumps into system i are
+    rtargets[roffsets[i]:roffsets[i+1]]
+    """
+    incoming = [list() for _ in range(len(graph))]
+    for from_idx in range(len(graph)):
+        for to_idx in graph.neighbours(from_idx):
+            incoming[to_idx].append(from_idx)
+    roffsets = array('i', [0])
+    rtargets = array('i')
+    for sources in incoming:
+        rtargets.extend(sources)
+        roffsets.append(len(rtargets))
+    return roffsets, rtargets
+
+
+def _next_hop_tree(graph: JumpGraph, roffsets: array, rtargets: array,
+                   hub_idx: int, sec_min: float) -> array:
+    """
+    Breadth-first search backwards from hub. For every system, store dense
+    index of the next system on the shortest route into hub, or -1 if
+    hub is unreachable. Like in JumpGraph.shortest_path(), the start system
+    and the hub itself are not checked against sec_min, only intermediate ones.
+    """
+    next_hop = array('i', [-1]) * len(graph)
+    next_hop[hub_idx] = hub_idx
+    queue = collections.deque()
+    queue.append(hub_idx)
+    security = graph.security
+    while queue:
+        idx = queue.popleft()
+        for i in range(roffsets[idx], roffsets[idx + 1]):
+            prev_idx = rtargets[i]
+            if next_hop[prev_idx] >= 0:
+                continue  # already visited
+            next_hop[prev_idx] = idx
+            if security[prev_idx] >= sec_min:
+                queue.append(prev_idx)
+    return next_hop
+
+
+def build_hub_routes(graph: JumpGraph, filename: str, db_mtime_ns: int = 0, db_size: int = 0) -> None:
+    """
+    Precompute next hop arrays from every system to every trade hub,
+    for each security policy, and store them into a single binary file:
+    header, hubs IDs, policies (sec_min * 1000), solarsystem IDs, and then
+    n_hubs * n_policies arrays of n_systems int32.
+    :param graph: stargate jumps graph
+    :param filename: output file name, it is replaced atomically
+    :param db_mtime_ns: EVE DB file modification time, to detect stale tables
+    :param db_size: EVE DB file size
+    """
+    roffsets, rtargets = _reverse_adjacency(graph)
+    dirname = os.path.dirname(filename)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, len(graph), len(TRADE_HUBS), len(POLICIES), 0, db_mtime_ns, db_size))
+        f.write(array('i', TRADE_HUBS).tobytes())
+        f.write(array('i', [int(round(sec_min * 1000)) for sec_min in POLICIES]).tobytes())
+        f.write(graph.ssids.tobytes())
+        for hub_ssid in TRADE_HUBS:
+            hub_idx = graph.index_of(hub_ssid)
+            for sec_min in POLICIES:
+                if hub_idx < 0:
+                    next_hop = array('i', [-1]) * len(graph)
+                else:
+                    next_hop = _next_hop_tree(graph, roffsets, rtargets, hub_idx, sec_min)
+                f.write(next_hop.tobytes())
+    os.replace(tmp_filename, filename)
+
+
+class HubRoutesTable:
+    """
+    Read-only memory-mapped view of the file written by build_hub_routes().
+    Route from any system to a trade hub is a walk over next hop array,
+    O(route length), without any search.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.n_systems = 0
+        self.db_mtime_ns = 0
+        self.db_size = 0
+        self._hubs = dict()      # hub ssid => hub number
+        self._policies = dict()  # sec_min * 1000 => policy number
+        self._ssids = None
+        self._next_hops = None
+        self._file = open(filename, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._load()
+        except (ValueError, OSError):
+            self.close()
+            raise
+
+    def _load(self) -> None:
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError('{0}: truncated hub routes file'.format(self.filename))
+        magic, n_systems, n_hubs, n_policies, _, self.db_mtime_ns, self.db_size = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError('{0}: not a hub routes file'.format(self.filename))
+        expected_size = _HEADER.size + 4 * (n_hubs + n_policies + n_systems + n_hubs * n_policies * n_systems)
+        if len(self._mmap) != expected_size:
+            raise ValueError('{0}: invalid file size {1} != {2}'.format(
+                self.filename, len(self._mmap), expected_size))
+        self.n_systems = n_systems
+        ints = memoryview(self._mmap)[_HEADER.size:].cast('i')
+        for i in range(n_hubs):
+            self._hubs[ints[i]] = i
+        for i in range(n_policies):
+            self._policies[ints[n_hubs + i]] = i
+        pos = n_hubs + n_policies
+        self._ssids = ints[pos:pos + n_systems]
+        self._next_hops = ints[pos + n_systems:]
+
+    def close(self) -> None:
+        self._ssids = None
+        self._next_hops = None
+        if getattr(self, '_mmap', None) is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # still referenced by some reader, will be closed by GC
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def matches_graph(self, graph: JumpGraph) -> bool:
+        """
+        Check that dense indexes in this file are the same as in jumps graph
+        """
+        if self.n_systems != len(graph):
+            return False
+        return self._ssids.tobytes() == graph.ssids.tobytes()
+
+    def has_route(self, hub_ssid: int, sec_min: float) -> bool:
+        return (hub_ssid in self._hubs) and (int(round(sec_min * 1000)) in self._policies)
+
+    def route_path(self, from_idx: int, hub_ssid: int, sec_min: float, max_jumps: int) -> list:
+        """
+        :param from_idx: dense index of start system (as in JumpGraph)
+        :param hub_ssid: trade hub solarsystem ID
+        :param sec_min: security policy, one of POLICIES
+        :param max_jumps: maximum route length
+        :return: list of dense indexes from start to hub (inclusive), or None if no route found
+        """
+        hub_no = self._hubs[hub_ssid]
+        policy_no = self._policies[int(round(sec_min * 1000))]
+        base = (hub_no * len(self._policies) + policy_no) * self.n_systems
+        next_hops = self._next_hops
+        path = [from_idx]
+        idx = from_idx
+        while True:
+            next_idx = next_hops[base + idx]
+            if next_idx < 0:
+                return None
+            if next_idx == idx:
+                return path  # arrived to hub
+            if len(path) > max_jumps:
+                return None
+            path.append(next_idx)
+            idx = next_idx
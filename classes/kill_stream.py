@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+import logging
+import threading
+
+from cherrypy.process.plugins import SimplePlugin
+import requests.exceptions
+
+from . import esi_calls
+from . import http_client
+
+
+class KillStreamWorker(SimplePlugin):
+    """
+    CherryPy engine plugin, that listens to zKillboard RedisQ kill stream
+    (or any server with the same protocol) in background. Every new kill in
+    w-space is fetched from ESI once and saved into app.killmails_cache, and
+    names of its characters, corporations, alliances are resolved into
+    app.names_db. So when anyone opens a kills block, recent kills are local.
+
+    RedisQ protocol: GET url?queueID=...&ttw=... waits up to ttw seconds
+    and returns {"package": {...}} with one kill, or {"package": null}.
+    Package has "killID" and "zkb": {"hash": ..., "locationID": ...}, and may
+    also have full "killmail"; then ESI is not asked for it. Otherwise solar
+    system is found by locationID (nearest celestial) in EVE DB, and ESI is
+    asked only for w-space kills; kills with unknown location are skipped.
+    """
+    # wait this number of seconds after stream error
+    RETRY_INTERVAL = 30
+    # resolve names for this number of kills at once
+    NAMES_BATCH = 20
+
+    def __init__(self, bus, app, url: str, queue_id: str, ttw: int = 10):
+        """
+        :param bus: cherrypy.engine
+        :param app: WhdbxApp, provides cfg, db, killmails_cache, names_db
+        :param url: RedisQ listen URL
+        :param queue_id: RedisQ queue ID, identifies this server for stream
+        :param ttw: seconds for stream server to wait for a new kill
+        """
+        super(KillStreamWorker, self).__init__(bus)
+        self.app = app
+        self.url = url
+        self.queue_id = queue_id
+        self.ttw = ttw
+        self.num_received = 0
+        self.num_saved = 0
+        self.num_fetched = 0  # killmails requested from ESI
+        self.num_unknown = 0  # kills skipped, because their solar system is unknown
+        self._pending_names = []  # saved killmails to resolve names for
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None  # set to None by the thread itself, when it exits
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self._stopping = False
+            if self._thread is not None:
+                # still running, maybe finishing its long poll after stop()
+                return
+            self._wakeup.clear()
+            self._thread = threading.Thread(target=self._run, name='KillStreamWorker')
+            self._thread.daemon = True
+            self._thread.start()
+        self.bus.log('Kill stream worker started: {}'.format(self.url))
+
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stopping = True
+        self._wakeup.set()
+        # may be in the middle of a long poll request, do not wait for it;
+        # it exits when the request ends, and only then can be started again
+        thread.join(1)
+        self.bus.log('Kill stream worker stopped')
+
+    def listen(self) -> dict:
+        """
+        Wait for next kill from stream
+        :return: package dict, or None if there were no new kills
+        """
+        client = http_client.get_client('redisq', timeout=self.ttw + 10)
+        r = client.get(self.url, params={'queueID': self.queue_id, 'ttw': self.ttw})
+        if r.status_code != 200:
+            raise requests.exceptions.HTTPError('Kill stream HTTP status: {}'.format(r.status_code))
+        package = json.loads(r.text).get('package')
+        if not isinstance(package, dict):
+            return None
+        return package
+
+    def is_wspace(self, ssid: int) -> bool:
+        return ssid in self.app.db.query_wormholesystems_new({ssid})
+
+    def kill_solar_system(self, package: dict) -> int:
+        """
+        Find out solar system of a kill without asking ESI
+        :return: solar system ID, or 0 if it is unknown
+        """
+        killmail = package.get('killmail')
+        if isinstance(killmail, dict) and ('solar_system_id' in killmail):
+            return int(killmail['solar_system_id'])
+        # nearest celestial, or solar system itself
+        location_id = package['zkb'].get('locationID')
+        if location_id:
+            item = self.app.db.map_denormalize(int(location_id))
+            if item is not None:
+                return item['solarsystemid']
+        return 0
+
+    def process(self, package: dict) -> bool:
+        """
+        Save killmail from stream package into cache, if it is a w-space kill
+        :return: True if killmail was saved
+        """
+        kill_id = str(package['killID'])
+        kill_hash = str(package['zkb']['hash'])
+        ssid = self.kill_solar_system(package)
+        if ssid == 0:
+            # do not ask ESI for every kill in New Eden just to learn where it was
+            self.num_unknown += 1
+            return False
+        if not self.is_wspace(ssid):
+            return False
+        if len(self.app.killmails_cache.get_killmails([(kill_id, kill_hash)])) > 0:
+            return False  # already got it from a page view
+        killmail = package.get('killmail')
+        if not isinstance(killmail, dict):
+            self.num_fetched += 1
+            killmail = esi_calls.get_killmail_by_id_hash(self.app.cfg, kill_id, kill_hash)
+        self.app.killmails_cache.save_killmail(kill_id, kill_hash, killmail)
+        self._pending_names.append(copy.deepcopy(killmail))
+        return True
+
+    def resolve_names(self) -> None:
+        """
+        Resolve names for saved killmails into names db; killmails in cache stay as they are
+        """
+        if len(self._pending_names) == 0:
+            return
+        kills = self._pending_names
+        self._pending_names = []
+        self.app.names_db.fill_names_in_zkb_kills(kills)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stopping:
+                    self._thread = None
+                    return
+            try:
+                package = self.listen()
+                if package is not None:
+                    self.num_received += 1
+                    if self.process(package):
+                        self.num_saved += 1
+                if (package is None) or (len(self._pending_names) >= self.NAMES_BATCH):
+                    self.resolve_names()
+                continue
+            except (requests.exceptions.RequestException, esi_calls.ESIException,
+                    ValueError, KeyError, TypeError) as e:
+                # stream or ESI is down, or unexpected reply format
+                self.bus.log('Kill stream error: {}'.format(str(e)), level=logging.WARNING)
+            except Exception as e:
+                # like sqlite3.Error from killmails cache; worker must not die silently
+                self.bus.log('Kill stream error: {}'.format(str(e)), level=logging.ERROR, traceback=True)
+            self._wakeup.wait(self.RETRY_INTERVAL)
+            self._wakeup.clear()
@@ -5,6 +5,9 @@ from classes.sitecfg import SiteConfig
 
 
 class KillMailsCache:
+    # max number of parameters in a single "WHERE ... IN (?, ?, ...)"
+    SQL_IN_CHUNK_SIZE = 500
+
     def __init__(self, siteconfig: SiteConfig):
         self._conn = sqlite3.connect(siteconfig.ZKB_CACHE_DIR + '/killmails.db', check_same_thread=False)
         self.check_tables()
@@ -45,3 +48,41 @@ class KillMailsCache:
                     (kill_id, kill_hash, json_text))
         self._conn.commit()
         cur.close()
+
+    def get_killmails(self, kills: list) -> dict:
+        """
+        Bulk version of get_killmail()
+        :param kills: list of tuples (kill_id, kill_hash)
+        :return: dict (str(kill_id), str(kill_hash)) => killmail, only for found killmails
+        """
+        ret = {}
+        kill_ids = list(set([str(kill[0]) for kill in kills]))
+        wanted = set([(str(kill[0]), str(kill[1])) for kill in kills])
+        cur = self._conn.cursor()
+        for i in range(0, len(kill_ids), self.SQL_IN_CHUNK_SIZE):
+            chunk = kill_ids[i:i + self.SQL_IN_CHUNK_SIZE]
+            cur.execute('SELECT kill_id, kill_hash, json FROM killmails WHERE kill_id IN ({})'.format(
+                ','.join(['?'] * len(chunk))), chunk)
+            for row in cur.fetchall():
+                key = (str(row[0]), str(row[1]))
+                if (key not in wanted) or (row[2] == ''):
+                    continue
+                try:
+                    ret[key] = json.loads(row[2])
+                except json.JSONDecodeError:
+                    pass
+        cur.close()
+        return ret
+
+    def save_killmails(self, killmails: dict):
+        """
+        Bulk version of save_killmail(), in a single transaction
+        :param killmails: dict (kill_id, kill_hash) => killmail
+        """
+        if len(killmails) == 0:
+            return
+        rows = [(kill_id, kill_hash, json.dumps(killmail)) for (kill_id, kill_hash), killmail in killmails.items()]
+        cur = self._conn.cursor()
+        cur.executemany('INSERT OR REPLACE INTO killmails (kill_id, kill_hash, json) VALUES (?,?,?)', rows)
+        self._conn.commit()
+        cur.close()
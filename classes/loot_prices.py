@@ -2,13 +2,11 @@
 
 from . import sitecfg
 from .eve_price_resolver import get_resolver
+# Sleepers blue loot prices are defined in sleeper_stats; kept importable from here
+from .sleeper_stats import ACD_PRICE, NNA_PRICE, SDL_PRICE, SDAI_PRICE
 
 
-# Sleepers blue loot
-ACD_PRICE = 1500000   # Ancient Coordinates Database
-NNA_PRICE = 200000    # Neural Network Analyzer
-SDL_PRICE = 500000    # Sleeper Data Library
-SDAI_PRICE = 5000000  # Sleeper Drone AI Piece
+__all__ = ['GasPrices', 'ACD_PRICE', 'NNA_PRICE', 'SDL_PRICE', 'SDAI_PRICE']
 
 
 class GasPrices:
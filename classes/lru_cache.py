@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import collections
+import threading
+import time
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory cache with bounded number of entries and optional
+    time-to-live. When cache is full, least recently used entry is evicted.
+    """
+
+    def __init__(self, max_entries: int, ttl: float = 0):
+        """
+        :param max_entries: maximum number of stored entries; 0 disables cache
+        :param ttl: entry lifetime in seconds; 0 means entries never expire
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = collections.OrderedDict()  # key => (expire_time, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if (item[0] > 0) and (item[0] <= time.monotonic()):
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return item[1]
+
+    def get_stale(self, key) -> tuple:
+        """
+        Like get(), but expired entry is returned too, and is not removed
+        :return: tuple (value, is_expired), or (None, False) if there is no such key
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None, False
+            self._data.move_to_end(key)
+            return item[1], (item[0] > 0) and (item[0] <= time.monotonic())
+
+    def ttl_left(self, key) -> float:
+        """
+        :return: seconds before entry expires (negative if already expired),
+                 or None if there is no such key
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] <= 0:
+                return float('inf')
+            return item[0] - time.monotonic()
+
+    def put(self, key, value, ttl: float = None) -> None:
+        """
+        :param ttl: override default entry lifetime for this entry
+        """
+        if self.max_entries <= 0:
+            return
+        if ttl is None:
+            ttl = self.ttl
+        expire_time = (time.monotonic() + ttl) if ttl > 0 else 0
+        with self._lock:
+            self._data[key] = (expire_time, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def remove(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
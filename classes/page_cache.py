@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import collections
+import hashlib
+import os
+import threading
+import time
+
+from .lru_cache import LRUCache
+
+
+# Rendered pages contain EVE-SSO login URL with per-session random state.
+# It is replaced with this placeholder in cached copy, and substituted back
+# for every client.
+SSO_STATE_PLACEHOLDER = b'{{whdbx:sso_state}}'
+
+CachedPage = collections.namedtuple('CachedPage', ['body', 'etag'])
+
+
+class PageCache:
+    """
+    Full-page cache of rendered HTML for pages that depend only on static
+    DB data, templates and locale. Cache key must include data version
+    (see versioned_key()), so that outdated pages are never served and
+    are just pushed out of LRU.
+    """
+    # how often to check if any template file was changed
+    TEMPLATES_CHECK_INTERVAL = 10  # seconds
+
+    def __init__(self, max_entries: int, template_dir: str):
+        self._pages = LRUCache(max_entries)
+        self._template_dir = template_dir
+        self._templates_version = None
+        self._templates_check_time = 0
+        self._lock = threading.Lock()
+
+    def templates_version(self) -> tuple:
+        """
+        :return: a value that changes whenever any template file is modified
+        """
+        now = time.monotonic()
+        with self._lock:
+            if (self._templates_version is not None) and \
+                    (now - self._templates_check_time < self.TEMPLATES_CHECK_INTERVAL):
+                return self._templates_version
+        max_mtime_ns = 0
+        num_files = 0
+        for dirpath, _, filenames in os.walk(self._template_dir):
+            for filename in filenames:
+                try:
+                    st = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                max_mtime_ns = max(max_mtime_ns, st.st_mtime_ns)
+                num_files += 1
+        with self._lock:
+            self._templates_version = (max_mtime_ns, num_files)
+            self._templates_check_time = now
+            return self._templates_version
+
+    def versioned_key(self, key: tuple, db_version: tuple) -> tuple:
+        return key + (db_version, self.templates_version())
+
+    def get(self, key: tuple) -> CachedPage:
+        return self._pages.get(key)
+
+    def put(self, key: tuple, html: str, sso_state: str) -> CachedPage:
+        """
+        Store rendered page, rendered for session with given sso_state
+        :return: stored page, that should be passed to page_for_session()
+        """
+        body = html.encode('utf-8')
+        if sso_state != '':
+            body = body.replace(sso_state.encode('utf-8'), SSO_STATE_PLACEHOLDER)
+        h = hashlib.sha1(repr(key).encode('utf-8'))
+        h.update(body)
+        page = CachedPage(body, h.hexdigest())
+        self._pages.put(key, page)
+        return page
+
+    def clear(self) -> None:
+        self._pages.clear()
+
+
+def page_for_session(page: CachedPage, sso_state: str) -> CachedPage:
+    """
+    :return: page body and strong ETag for the session with given sso_state
+    """
+    state = sso_state.encode('utf-8')
+    body = page.body.replace(SSO_STATE_PLACEHOLDER, state)
+    etag = '"{0}-{1}"'.format(page.etag, hashlib.sha1(state).hexdigest()[:12])
+    return CachedPage(body, etag)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from array import array
+import collections
+import sqlite3
+
+
+class JumpGraph:
+    """
+    Stargate jumps graph of New Eden, loaded once from mapSolarSystemJumps.
+    Stored in compact CSR (compressed sparse row) form: all solar systems
+    get a dense index 0..N-1, and neighbours of system i are
+    targets[offsets[i]:offsets[i+1]] (also dense indexes).
+    """
+
+    def __init__(self, version: tuple = None):
+        self.version = version
+        self.ssids = array('i')     # index => solarsystem ID, sorted
+        self.names = list()         # index => solarsystem name
+        self.security = array('d')  # index => security status
+        self.offsets = array('i')   # index => start of neighbours in targets, len = N+1
+        self.targets = array('i')   # neighbours indexes
+        self._index = dict()        # solarsystem ID => index
+
+    def __len__(self):
+        return len(self.ssids)
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        cur = conn.cursor()
+        cur.execute('SELECT solarSystemID, solarSystemName, security '
+                    ' FROM mapSolarSystems ORDER BY solarSystemID')
+        for row in cur:
+            self._index[int(row[0])] = len(self.ssids)
+            self.ssids.append(int(row[0]))
+            self.names.append(str(row[1]))
+            self.security.append(float(row[2]))
+        # count neighbours of each system, then fill targets
+        adjacency = [list() for _ in range(len(self.ssids))]
+        cur.execute('SELECT fromSolarSystemID, toSolarSystemID '
+                    ' FROM mapSolarSystemJumps ORDER BY fromSolarSystemID, toSolarSystemID')
+        for row in cur:
+            from_idx = self._index.get(int(row[0]))
+            to_idx = self._index.get(int(row[1]))
+            if (from_idx is None) or (to_idx is None):
+                continue
+            adjacency[from_idx].append(to_idx)
+        cur.close()
+        self.offsets.append(0)
+        for neighbours in adjacency:
+            self.targets.extend(neighbours)
+            self.offsets.append(len(self.targets))
+
+    def index_of(self, ssid: int) -> int:
+        """
+        :return: dense index of solarsystem, or -1 if there is no such system
+        """
+        return self._index.get(ssid, -1)
+
+    def neighbours(self, idx: int) -> array:
+        return self.targets[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def shortest_path(self, from_ss: int, target_ss: int, sec_min: float, max_jumps: int) -> list:
+        """
+        Breadth-first search for the shortest route between two systems.
+        Intermediate systems must have security >= sec_min; the
+        target system itself is always allowed.
+        :param from_ss: start solarsystem ID
+        :param target_ss: destination solarsystem ID
+        :param sec_min: minimum security of systems to route through
+        :param max_jumps: maximum route length
+        :return: list of dense indexes from start to target (inclusive), or None if no route found
+        """
+        from_idx = self.index_of(from_ss)
+        target_idx = self.index_of(target_ss)
+        if (from_idx < 0) or (target_idx < 0):
+            return None
+        if from_idx == target_idx:
+            return [from_idx]
+        parents = array('i', [-1]) * len(self.ssids)
+        parents[from_idx] = from_idx
+        depth = 0
+        queue = collections.deque()
+        queue.append(from_idx)
+        offsets = self.offsets
+        targets = self.targets
+        security = self.security
+        while queue and (depth < max_jumps):
+            depth += 1
+            # process one BFS level at a time
+            for _ in range(len(queue)):
+                idx = queue.popleft()
+                for i in range(offsets[idx], offsets[idx + 1]):
+                    next_idx = targets[i]
+                    if parents[next_idx] >= 0:
+                        continue  # already visited
+                    if next_idx == target_idx:
+                        parents[next_idx] = idx
+                        return self._unwind(parents, from_idx, target_idx)
+                    if security[next_idx] < sec_min:
+                        continue
+                    parents[next_idx] = idx
+                    queue.append(next_idx)
+        return None
+
+    @staticmethod
+    def _unwind(parents: array, from_idx: int, target_idx: int) -> list:
+        path = [target_idx]
+        idx = target_idx
+        while idx != from_idx:
+            idx = parents[idx]
+            path.append(idx)
+        path.reverse()
+        return path
+
+    def jump_dict(self, from_idx: int, to_idx: int) -> dict:
+        jump = dict()
+        jump['from_ssid'] = self.ssids[from_idx]
+        jump['from_ssname'] = self.names[from_idx]
+        jump['from_sssec'] = self.security[from_idx]
+        jump['to_ssid'] = self.ssids[to_idx]
+        jump['to_ssname'] = self.names[to_idx]
+        jump['to_sssec'] = self.security[to_idx]
+        return jump
+
+    def path_to_route(self, path: list) -> list:
+        """
+        Convert list of dense indexes to list of jump dicts, as returned by SiteDb.find_route()
+        """
+        route = list()
+        for i in range(1, len(path)):
+            route.append(self.jump_dict(path[i - 1], path[i]))
+        return route
+
+
+def load_jump_graph(conn: sqlite3.Connection, version: tuple = None) -> JumpGraph:
+    graph = JumpGraph(version)
+    graph.load(conn)
+    return graph
@@ -3,6 +3,7 @@
 from . import database
 from . import sitecfg
 from . import sleeper
+from . import sleeper_stats
 from . import loot_prices
 
 
@@ -38,21 +39,10 @@ class WHSignatureWave:
         #  'sleeper_id:count:abilities,sleeper_id:count:abilities,...'
         if self.sleepers_str == '':
             return
-        sl_defs = self.sleepers_str.split(',')
-        for sl_def in sl_defs:
-            #  'sleeper_id:count:abilities'
-            #  or 'sleeper_id:count'
-            sl_def = sl_def.strip()
-            sl_def_list = sl_def.split(':')
-            sl_id = int(sl_def_list[0])
-            if sl_id > 0:
-                sl_count = int(sl_def_list[1])
-                sl_abilities = ''
-                if len(sl_def_list) > 2:
-                    sl_abilities = sl_def_list[2]
-                self.sleeper_ids.append(sl_id)
-                self.sleeper_count.append(sl_count)
-                self.sleeper_abilities.append(sl_abilities)
+        for sl_id, sl_count, sl_abilities in sleeper_stats.parse_wave_sleepers(self.sleepers_str):
+            self.sleeper_ids.append(sl_id)
+            self.sleeper_count.append(sl_count)
+            self.sleeper_abilities.append(sl_abilities)
         i = 0
         for sl_id in self.sleeper_ids:
             sl = sleeper.WHSleeper()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from . import deadline
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+        # leader ran out of its own request deadline, result is not trustworthy
+        self.deadline_expired = False
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call with some key is in
+    progress, other threads calling with the same key do not execute
+    function, but wait for the first call to finish, and get the same
+    result (or the same exception raised). Nothing is cached after the
+    call has finished. Result object is shared between all waiting threads,
+    so it should be immutable (like response text) or not modified by callers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = dict()  # key => _Call in progress
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Waiting threads wait no longer than their own request deadline
+        (see deadline module), and raise DeadlineExceeded if it is over.
+        If the first call has run out of its caller's deadline, its result
+        is not shared: waiting threads call function again themselves.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+            if leader:
+                break
+            if not call.done.wait(deadline.remaining()):
+                raise deadline.DeadlineExceeded('Request deadline exceeded, while waiting for the same call')
+            if call.deadline_expired:
+                continue
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.exception = e
+            raise
+        finally:
+            call.deadline_expired = isinstance(call.exception, deadline.DeadlineExceeded) or deadline.expired()
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        """
+        :return: number of calls currently in progress
+        """
+        with self._lock:
+            return len(self._calls)
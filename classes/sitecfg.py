@@ -12,6 +12,12 @@ class SiteConfig:
         self.TEMPLATE_DIR = '.'
         self.TEMPLATE_CACHE_DIR = '.'
 
+        self.SERVER_THREAD_POOL = 10
+        self.PAGE_CACHE_SIZE = 200
+        self.CIRCUIT_BREAKER_FAILURES = 5
+        self.CIRCUIT_BREAKER_RESET = 30
+        self.DEADLINES = dict()  # endpoint => max seconds to handle request
+
         self.SESSION_TYPE = 'memory'
         self.SESSION_TIME_MINUTES = 60
         self.SESSION_FILES_DIR = '.'
@@ -20,6 +26,8 @@ class SiteConfig:
         self.SESSION_REDIS_DB = 0
 
         self.EVEDB = ''
+        self.EVEDB_MMAP_SIZE = 268435456  # 256 Mb
+        self.EVEDB_TYPE_INDEX = 'lazy'
         self.ROUTES_CACHE_DIR = '.'
         self.NAMES_DB = ''
 
@@ -27,8 +35,26 @@ class SiteConfig:
         self.ZKB_CACHE_TIME = 1200
         self.ZKB_CACHE_DIR = '.'
         self.ZKB_CACHE_SQLITE = ''
+        self.ZKB_CACHE_SQLITE_MAX_ENTRIES = 10000
         self.ZKB_USE_EVEKILL = False
         self.ZKB_KILLS_ON_PAGE = 30
+        self.ZKB_INCREMENTAL = True
+        self.ZKB_MEMORY_CACHE_SIZE = 200
+        self.ZKB_BLOCK_CACHE_SIZE = 100
+        self.ZKB_BACKGROUND_REFRESH = True
+        self.ZKB_REFRESH_TOP_SYSTEMS = 0
+        self.ZKB_KILL_STREAM = False
+        self.ZKB_KILL_STREAM_URL = 'https://redisq.zkillboard.com/listen.php'
+        self.ZKB_KILL_STREAM_QUEUE_ID = ''
+        self.ZKB_KILL_STREAM_TTW = 10
+
+        self.ESI_MAX_PARALLEL = 8
+        self.ESI_CACHE_TYPE = 'memory'
+        self.ESI_CACHE_SIZE = 1000
+        self.ESI_CACHE_FILE = './_caches/esi_cache.db'
+        self.ESI_CACHE_REDIS_HOST = 'localhost'
+        self.ESI_CACHE_REDIS_PORT = 6379
+        self.ESI_CACHE_REDIS_DB = 0
 
         self.PRICE_RESOLVER = 'esi'
         self.EVECENTRAL_CACHE_DIR = ''
@@ -61,6 +87,14 @@ class SiteConfig:
                 self.TEMPLATE_DIR = cfg['general']['template_dir']
             if 'template_cache_dir' in cfg['general']:
                 self.TEMPLATE_CACHE_DIR = cfg['general']['template_cache_dir']
+            if 'thread_pool' in cfg['general']:
+                self.SERVER_THREAD_POOL = cfg['general'].getint('thread_pool')
+            if 'page_cache_size' in cfg['general']:
+                self.PAGE_CACHE_SIZE = cfg['general'].getint('page_cache_size')
+            if 'circuit_breaker_failures' in cfg['general']:
+                self.CIRCUIT_BREAKER_FAILURES = cfg['general'].getint('circuit_breaker_failures')
+            if 'circuit_breaker_reset' in cfg['general']:
+                self.CIRCUIT_BREAKER_RESET = cfg['general'].getint('circuit_breaker_reset')
 
             # session vars
             if 'session_storage_type' in cfg['general']:
@@ -80,6 +114,10 @@ class SiteConfig:
         if cfg.has_section('sqlite'):
             if 'evedb' in cfg['sqlite']:
                 self.EVEDB = cfg['sqlite']['evedb']
+            if 'evedb_mmap_size' in cfg['sqlite']:
+                self.EVEDB_MMAP_SIZE = int(cfg['sqlite']['evedb_mmap_size'])
+            if 'evedb_type_index' in cfg['sqlite']:
+                self.EVEDB_TYPE_INDEX = str(cfg['sqlite']['evedb_type_index'])
             if 'routes_cache_dir' in cfg['sqlite']:
                 self.ROUTES_CACHE_DIR = cfg['sqlite']['routes_cache_dir']
             if 'names_db' in cfg['sqlite']:
@@ -95,10 +133,52 @@ class SiteConfig:
                 self.ZKB_CACHE_DIR = cfg['zkillboard']['cache_dir']
             if 'cache_sqlite' in cfg['zkillboard']:
                 self.ZKB_CACHE_SQLITE = cfg['zkillboard']['cache_sqlite']
+            if 'cache_sqlite_max_entries' in cfg['zkillboard']:
+                self.ZKB_CACHE_SQLITE_MAX_ENTRIES = int(cfg['zkillboard']['cache_sqlite_max_entries'])
             if 'use_evekill' in cfg['zkillboard']:
                 self.ZKB_USE_EVEKILL = cfg['zkillboard'].getboolean('use_evekill')
             if 'kills_on_page' in cfg['zkillboard']:
                 self.ZKB_KILLS_ON_PAGE = int(cfg['zkillboard']['kills_on_page'])
+            if 'incremental' in cfg['zkillboard']:
+                self.ZKB_INCREMENTAL = cfg['zkillboard'].getboolean('incremental')
+            if 'memory_cache_size' in cfg['zkillboard']:
+                self.ZKB_MEMORY_CACHE_SIZE = int(cfg['zkillboard']['memory_cache_size'])
+            if 'block_cache_size' in cfg['zkillboard']:
+                self.ZKB_BLOCK_CACHE_SIZE = int(cfg['zkillboard']['block_cache_size'])
+            if 'background_refresh' in cfg['zkillboard']:
+                self.ZKB_BACKGROUND_REFRESH = cfg['zkillboard'].getboolean('background_refresh')
+            if 'refresh_top_systems' in cfg['zkillboard']:
+                self.ZKB_REFRESH_TOP_SYSTEMS = int(cfg['zkillboard']['refresh_top_systems'])
+            if 'kill_stream' in cfg['zkillboard']:
+                self.ZKB_KILL_STREAM = cfg['zkillboard'].getboolean('kill_stream')
+            if 'kill_stream_url' in cfg['zkillboard']:
+                self.ZKB_KILL_STREAM_URL = str(cfg['zkillboard']['kill_stream_url'])
+            if 'kill_stream_queue_id' in cfg['zkillboard']:
+                self.ZKB_KILL_STREAM_QUEUE_ID = str(cfg['zkillboard']['kill_stream_queue_id'])
+            if 'kill_stream_ttw' in cfg['zkillboard']:
+                self.ZKB_KILL_STREAM_TTW = int(cfg['zkillboard']['kill_stream_ttw'])
+
+        # esi
+        if cfg.has_section('esi'):
+            if 'max_parallel_requests' in cfg['esi']:
+                self.ESI_MAX_PARALLEL = int(cfg['esi']['max_parallel_requests'])
+            if 'cache_type' in cfg['esi']:
+                self.ESI_CACHE_TYPE = str(cfg['esi']['cache_type'])
+            if 'cache_size' in cfg['esi']:
+                self.ESI_CACHE_SIZE = int(cfg['esi']['cache_size'])
+            if 'cache_file' in cfg['esi']:
+                self.ESI_CACHE_FILE = str(cfg['esi']['cache_file'])
+            if 'cache_redis_host' in cfg['esi']:
+                self.ESI_CACHE_REDIS_HOST = str(cfg['esi']['cache_redis_host'])
+            if 'cache_redis_port' in cfg['esi']:
+                self.ESI_CACHE_REDIS_PORT = int(cfg['esi']['cache_redis_port'])
+            if 'cache_redis_db' in cfg['esi']:
+                self.ESI_CACHE_REDIS_DB = int(cfg['esi']['cache_redis_db'])
+
+        # request deadlines
+        if cfg.has_section('deadlines'):
+            for endpoint in cfg['deadlines']:
+                self.DEADLINES[endpoint] = cfg['deadlines'].getfloat(endpoint)
 
         # eve-central
         if cfg.has_section('evecentral'):
@@ -124,6 +204,13 @@ class SiteConfig:
             if 'user_agent' in cfg['sso']:
                 self.SSO_USER_AGENT = str(cfg['sso']['user_agent'])
 
+    def request_deadline(self, endpoint: str) -> float:
+        """
+        :param endpoint: endpoint name, as in [deadlines] config section
+        :return: time budget for request in seconds, 0 if unlimited
+        """
+        return self.DEADLINES.get(endpoint, self.DEADLINES.get('default', 0))
+
     def sso_login_url(self, optional_state: str = ''):
         url = 'https://login.eveonline.com/oauth/authorize'
         url += '?response_type=code'
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from . import database
-from . import loot_prices
+from . import sleeper_stats
 
 
 class WHSleeper:
@@ -142,20 +142,9 @@ class WHSleeper:
         # icon file
         self.icon_file = self.name.lower() + '.png'
         # calc
-        self.dps_total = self.dps_em + self.dps_therm + self.dps_kin + self.dps_exp
-        # calc EHP
-        armor_average_resist = (self.armor_res_em + self.armor_res_therm +
-                                self.armor_res_kin + self.armor_res_exp) / 4
-        shield_average_resist = (self.shield_res_em + self.shield_res_therm +
-                                 self.shield_res_kin + self.shield_res_exp) / 4
-        armor_ehp = round(self.armor / (1 - armor_average_resist/100))
-        shield_ehp = round(self.shield / (1 - shield_average_resist / 100))
-        self.ehp_total = shield_ehp + armor_ehp + self.hull
-        # loot
-        self.loot_total = self.loot_acd * loot_prices.ACD_PRICE
-        self.loot_total += self.loot_nna * loot_prices.NNA_PRICE
-        self.loot_total += self.loot_sdl * loot_prices.SDL_PRICE
-        self.loot_total += self.loot_sdai * loot_prices.SDAI_PRICE
+        self.dps_total = sleeper_stats.sleeper_dps(ret)
+        self.ehp_total = sleeper_stats.sleeper_ehp(ret)
+        self.loot_total = sleeper_stats.sleeper_loot(ret)
         self.isk_per_ehp = self.loot_total / self.ehp_total
         # ewar stats
         if self.neut_duration > 0:
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Sleepers and signature waves stats formulas, shared between
+# WHSleeper/WHSignatureWave and precomputed static data snapshot.
+
+
+# Sleepers blue loot
+ACD_PRICE = 1500000   # Ancient Coordinates Database
+NNA_PRICE = 200000    # Neural Network Analyzer
+SDL_PRICE = 500000    # Sleeper Data Library
+SDAI_PRICE = 5000000  # Sleeper Drone AI Piece
+
+
+def sleeper_dps(sl: dict) -> int:
+    return sl['dps_em'] + sl['dps_therm'] + sl['dps_kin'] + sl['dps_exp']
+
+
+def sleeper_ehp(sl: dict) -> int:
+    armor_average_resist = (sl['armor_res_em'] + sl['armor_res_therm'] +
+                            sl['armor_res_kin'] + sl['armor_res_exp']) / 4
+    shield_average_resist = (sl['shield_res_em'] + sl['shield_res_therm'] +
+                             sl['shield_res_kin'] + sl['shield_res_exp']) / 4
+    armor_ehp = round(sl['armor'] / (1 - armor_average_resist / 100))
+    shield_ehp = round(sl['shield'] / (1 - shield_average_resist / 100))
+    return shield_ehp + armor_ehp + sl['hull']
+
+
+def sleeper_loot(sl: dict) -> int:
+    loot_total = sl['loot_acd'] * ACD_PRICE
+    loot_total += sl['loot_nna'] * NNA_PRICE
+    loot_total += sl['loot_sdl'] * SDL_PRICE
+    loot_total += sl['loot_sdai'] * SDAI_PRICE
+    return loot_total
+
+
+def parse_wave_sleepers(sleepers_str: str) -> list:
+    """
+    Parse sleepers line from signature_waves table
+    :param sleepers_str: 'sleeper_id:count:abilities,sleeper_id:count,...'
+    :return: list of tuples (sleeper_id, count, abilities)
+    """
+    ret = list()
+    if not sleepers_str:
+        return ret
+    for sl_def in sleepers_str.split(','):
+        sl_def_list = sl_def.strip().split(':')
+        sl_id = int(sl_def_list[0])
+        if sl_id > 0:
+            sl_abilities = ''
+            if len(sl_def_list) > 2:
+                sl_abilities = sl_def_list[2]
+            ret.append((sl_id, int(sl_def_list[1]), sl_abilities))
+    return ret
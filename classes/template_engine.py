@@ -5,19 +5,15 @@ from mako.lookup import TemplateLookup
 from mako import exceptions
 
 
-class TemplateEngine:
-    def __init__(self, siteconfig: sitecfg.SiteConfig):
-        params = {
-            'directories':      siteconfig.TEMPLATE_DIR,
-            'module_directory': siteconfig.TEMPLATE_CACHE_DIR,
-            # 'input_encoding':   'utf-8',
-            # 'output_encoding':   'utf-8',
-            # 'encoding_errors':  'replace',
-            'strict_undefined': True
-        }
-        self._lookup = TemplateLookup(**params)
+class TemplateContext:
+    """
+    Template variables for rendering a single page. Every request handler
+    creates its own context, so TemplateEngine itself holds no per-request
+    state and can be shared by all server threads.
+    """
+
+    def __init__(self):
         self._args = dict()
-        self._headers_sent = False
 
     def assign(self, vname: str, vvalue):
         self._args[vname] = vvalue
@@ -39,19 +35,36 @@ class TemplateEngine:
     def unassign_all(self):
         self._args = dict()
 
-    def render(self, tname):
+    def args(self) -> dict:
+        return self._args
+
+
+class TemplateEngine:
+    def __init__(self, siteconfig: sitecfg.SiteConfig):
+        params = {
+            'directories':      siteconfig.TEMPLATE_DIR,
+            'module_directory': siteconfig.TEMPLATE_CACHE_DIR,
+            # 'input_encoding':   'utf-8',
+            # 'output_encoding':   'utf-8',
+            # 'encoding_errors':  'replace',
+            'strict_undefined': True
+        }
+        self._lookup = TemplateLookup(**params)
+        self._headers_sent = False
+
+    def render(self, tname: str, ctx: TemplateContext) -> str:
         tmpl = self._lookup.get_template(tname)
-        return tmpl.render(**self._args)
-        # return tmpl.render_unicode(**self._args)
+        return tmpl.render(**ctx.args())
+        # return tmpl.render_unicode(**ctx.args())
 
-    def output(self, tname):
+    def output(self, tname: str, ctx: TemplateContext):
         if not self._headers_sent:
             print('Content-Type: text/html')
             print()
             self._headers_sent = True
         # MAKO exceptions handler
         try:
-            rendered = self.render(tname)
+            rendered = self.render(tname, ctx)
             print(rendered)  # python IO encoding mut be set to utf-8 (see ../main.py header for details)
             # print(os.environ)
             # print(locale.getpreferredencoding())
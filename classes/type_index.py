@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from array import array
+import bisect
+import sqlite3
+import sys
+
+
+class TypeIndex:
+    """
+    Compact read-only index of invTypes joined with invGroups:
+    typeID => name, groupID, group name, capacity.
+    Columns are stored in parallel arrays sorted by typeID, lookup is
+    a binary search. Names are interned, group names are stored only
+    once per group, so ~50k types take a few megabytes.
+    """
+
+    def __init__(self, version: tuple = None):
+        self.version = version
+        self.typeids = array('i')     # sorted
+        self.names = list()           # interned strings
+        self.group_nums = array('i')  # index into group_ids / group_names
+        self.capacity = array('d')
+        self.group_ids = array('i')
+        self.group_names = list()
+
+    def __len__(self):
+        return len(self.typeids)
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        group_nums = dict()  # groupID => index in group_ids
+        cur = conn.cursor()
+        cur.execute('SELECT it.typeID, it.typeName, it.groupID, ig.groupName, it.capacity '
+                    ' FROM invTypes it '
+                    ' JOIN invGroups ig ON it.groupID = ig.groupID '
+                    ' ORDER BY it.typeID')
+        for row in cur:
+            group_id = int(row[2]) if row[2] is not None else 0
+            group_num = group_nums.get(group_id)
+            if group_num is None:
+                group_num = len(self.group_ids)
+                group_nums[group_id] = group_num
+                self.group_ids.append(group_id)
+                self.group_names.append(sys.intern(row[3]) if row[3] is not None else '')
+            self.typeids.append(int(row[0]))
+            self.names.append(sys.intern(row[1]) if row[1] is not None else '')
+            self.group_nums.append(group_num)
+            self.capacity.append(float(row[4]) if row[4] is not None else 0.0)
+        cur.close()
+
+    def find(self, typeid: int) -> dict:
+        """
+        :return: the same dict as SiteDb.find_typeid() returns, or None if type was not found
+        """
+        i = bisect.bisect_left(self.typeids, typeid)
+        if (i >= len(self.typeids)) or (self.typeids[i] != typeid):
+            return None
+        group_num = self.group_nums[i]
+        ret = dict()
+        ret['typeid'] = typeid
+        ret['name'] = self.names[i]
+        ret['groupid'] = self.group_ids[group_num]
+        ret['groupname'] = self.group_names[group_num]
+        ret['capacity'] = self.capacity[i]
+        return ret
+
+
+def load_type_index(conn: sqlite3.Connection, version: tuple = None) -> TypeIndex:
+    index = TypeIndex(version)
+    index.load(conn)
+    return index
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from .database import WHClass
+from .db_snapshot import StaticDataSnapshot
+
+
+# 'effect' request parameter value => effect name in DB
+EFFECTS = {
+    'bh': 'Black Hole',
+    'cv': 'Cataclysmic Variable',
+    'mag': 'Magnetar',
+    'pul': 'Pulsar',
+    'rg': 'Red Giant',
+    'wr': 'Wolf-Rayet Star'
+}
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count('1')
+
+
+class WHDBFilter:
+    """
+    In-memory filter engine for WH database search page.
+    All WH systems are numbered 0..N-1 (ordered by solarsystemid), and for
+    each facet value a bitset (Python int, bit i set = system i matches)
+    is precomputed. A query ORs bitsets of selected values inside a facet
+    and ANDs facets together; facets without selected values match everything.
+    Facets and their values are the same as request parameters of the page:
+      'class': '1'..'6', '-1'..'-6', 'shattered', 'frigwr', 'drifters' (and any other integer class),
+      'effect': 'noeffect', 'bh', 'cv', 'mag', 'pul', 'rg', 'wr',
+      'in_class': static destination class, '1'..'9' (and any other integer class).
+    """
+
+    FACETS = ('class', 'effect', 'in_class')
+
+    def __init__(self, snap: StaticDataSnapshot):
+        self.version = snap.version
+        self._systems = list()  # system number => result dict, as returned by query()
+        self._all = 0
+        self._bitsets = {facet: dict() for facet in self.FACETS}
+        self._build(snap)
+
+    def _add_bit(self, facet: str, value: str, bit: int) -> None:
+        bitsets = self._bitsets[facet]
+        bitsets[value] = bitsets.get(value, 0) | bit
+
+    def _build(self, snap: StaticDataSnapshot) -> None:
+        for ssid in sorted(snap.wormholesystems.keys()):
+            # class, star, planets, moons, effect, statics
+            row = snap.wormholesystems[ssid]
+            bit = 1 << len(self._systems)
+            jsys = dict()
+            jsys['id'] = ssid
+            jsys['name'] = snap.wormholesystems_names[ssid]
+            jsys['class'] = int(row[0])
+            jsys['star'] = row[1]  # not very needed
+            jsys['planets'] = int(row[2])  # not very needed
+            jsys['moons'] = int(row[3])  # not very needed
+            jsys['effect'] = row[4]
+            jsys['statics'] = list()
+            for st_name, in_class in snap.system_statics.get(ssid, tuple()):
+                if in_class is not None:
+                    in_class = int(in_class)
+                    self._add_bit('in_class', str(in_class), bit)
+                    st_name = '{} {}'.format(st_name, WHClass.to_string(in_class))
+                jsys['statics'].append(st_name)
+            self._systems.append(jsys)
+            self._all |= bit
+            # class facet
+            wh_class = jsys['class']
+            self._add_bit('class', str(wh_class), bit)
+            if WHClass.is_shattered(wh_class):
+                self._add_bit('class', 'shattered', bit)
+            if wh_class == WHClass.FRIG_WH_CLASS:
+                self._add_bit('class', 'frigwr', bit)
+            if WHClass.is_drifters(wh_class):
+                self._add_bit('class', 'drifters', bit)
+            # effect facet
+            if jsys['effect'] is None:
+                self._add_bit('effect', 'noeffect', bit)
+            for eff, effect_name in EFFECTS.items():
+                if jsys['effect'] == effect_name:
+                    self._add_bit('effect', eff, bit)
+
+    def __len__(self):
+        return len(self._systems)
+
+    def _facet_mask(self, facet: str, values: list) -> int:
+        """
+        :return: OR of bitsets of all known values, or mask of all systems
+                 if there are no known values in this facet
+        """
+        bitsets = self._bitsets[facet]
+        mask = 0
+        known = False
+        for value in values:
+            value = self._normalize(facet, value)
+            if value is None:
+                continue
+            known = True
+            mask |= bitsets.get(value, 0)
+        if not known:
+            return self._all
+        return mask
+
+    @staticmethod
+    def _normalize(facet: str, value: str) -> str:
+        """
+        :return: facet value as it is stored in bitsets, or None if it is not valid for this facet
+        """
+        value = str(value)
+        if facet == 'effect':
+            if (value == 'noeffect') or (value in EFFECTS):
+                return value
+            return None
+        if (facet == 'class') and (value in ('shattered', 'frigwr', 'drifters')):
+            return value
+        try:
+            return str(int(value))
+        except ValueError:
+            return None
+
+    def query(self, selected: dict) -> dict:
+        """
+        :param selected: dict facet => list of selected values, like request params
+        :return: dict with keys 'systems' (list of dicts for matching systems),
+                 and 'facets': {facet: {value: count}}, where count is the number of
+                 systems this value would yield together with selections in other facets
+        """
+        masks = dict()
+        for facet in self.FACETS:
+            values = selected.get(facet, [])
+            if isinstance(values, str):
+                values = [values]
+            masks[facet] = self._facet_mask(facet, values)
+        result = self._all
+        for facet in self.FACETS:
+            result &= masks[facet]
+        # facet counts
+        facets = dict()
+        for facet in self.FACETS:
+            others = self._all
+            for other_facet in self.FACETS:
+                if other_facet != facet:
+                    others &= masks[other_facet]
+            facets[facet] = {value: _popcount(others & bitset) for value, bitset in self._bitsets[facet].items()}
+        # collect systems from set bits
+        systems = list()
+        mask = result
+        while mask:
+            low_bit = mask & (-mask)
+            jsys = dict(self._systems[low_bit.bit_length() - 1])
+            jsys['statics'] = list(jsys['statics'])
+            systems.append(jsys)
+            mask ^= low_bit
+        return {'systems': systems, 'facets': facets}
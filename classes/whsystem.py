@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from .database import SiteDb, WHClass, get_ss_security_color
+from .database import SiteDb, WHClass, get_ss_security_color, ROUTE_TOO_LONG
 
 
 class WHStatic:
@@ -189,12 +189,14 @@ class WHSystem:
         self.route_dodixie = None
         self.route_hek = None
         self.route_rens = None
+        self.routes_too_long = set()  # hubs IDs, high-sec route to which is longer than MAX_ROUTE_JUMPS
         # Hubs systems IDs
         self.JITA_ID = 30000142
         self.AMARR_ID = 30002187
         self.DODIXIE_ID = 30002659
         self.HEK_ID = 30002053
         self.RENS_ID = 30002510
+        self.MAX_ROUTE_JUMPS = 25
         self.THERA_SSID = 31000005
 
     def is_valid(self):
@@ -300,33 +302,37 @@ class WHSystem:
             planet.set_type_from_string(pl[1])
             self.planets.append(planet)
 
-#
-#   With Eve-Central dead, we have no easy way to get trade routes,
-#        so this all is commented for a while
-#
-#    def query_trade_routes(self, config: sitecfg.SiteConfig):
-#        # find routes to popular trade hubs:
-#        if not self.is_wh:
-#            ec = eve_central.EveCentral(config)
-#            self.route_jita = ec.route(self.name, 'Jita')
-#            self.route_amarr = ec.route(self.name, 'Amarr')
-#            self.route_dodixie = ec.route(self.name, 'Dodixie')
-#            self.route_hek = ec.route(self.name, 'Hek')
-#            self.route_rens = ec.route(self.name, 'Rens')
-#            # process
-#            self.process_route_sec_colors(self.route_jita)
-#            self.process_route_sec_colors(self.route_amarr)
-#            self.process_route_sec_colors(self.route_dodixie)
-#            self.process_route_sec_colors(self.route_hek)
-#            self.process_route_sec_colors(self.route_rens)
-#
-#    def process_route_sec_colors(self, route):
-#        if not isinstance(route, list):
-#            return
-#        if len(route) < 1:
-#            return
-#        for jump in route:
-#            sec = float(jump['to']['security'])
-#            jump['to']['sec_color'] = get_ss_security_color(sec)
-#            sec = float(jump['from']['security'])
-#            jump['from']['sec_color'] = get_ss_security_color(sec)
+    def query_trade_routes(self):
+        # find routes to popular trade hubs, only for k-space systems
+        if self.is_wh or (not self.is_valid()):
+            return
+        self.route_jita = self.find_trade_route(self.JITA_ID)
+        self.route_amarr = self.find_trade_route(self.AMARR_ID)
+        self.route_dodixie = self.find_trade_route(self.DODIXIE_ID)
+        self.route_hek = self.find_trade_route(self.HEK_ID)
+        self.route_rens = self.find_trade_route(self.RENS_ID)
+        # process
+        self.process_route_sec_colors(self.route_jita)
+        self.process_route_sec_colors(self.route_amarr)
+        self.process_route_sec_colors(self.route_dodixie)
+        self.process_route_sec_colors(self.route_hek)
+        self.process_route_sec_colors(self.route_rens)
+
+    def find_trade_route(self, hub_id: int) -> list:
+        """
+        :return: high-sec route to trade hub, or None; if route exists, but is
+                 too long, hub ID is added to routes_too_long
+        """
+        route = self._db.find_route_cache(self.ssys_id, hub_id, 0.5, self.MAX_ROUTE_JUMPS)
+        if route == ROUTE_TOO_LONG:
+            self.routes_too_long.add(hub_id)
+            return None
+        return route
+
+    @staticmethod
+    def process_route_sec_colors(route: list):
+        if not isinstance(route, list):
+            return
+        for jump in route:
+            jump['from_sec_color'] = get_ss_security_color(jump['from_sssec'])
+            jump['to_sec_color'] = get_ss_security_color(jump['to_sssec'])
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import collections
+import logging
+import threading
+import time
+
+from cherrypy.process.plugins import SimplePlugin
+
+
+class ZKBBlockRefresher(SimplePlugin):
+    """
+    CherryPy engine plugin, that re-renders kills blocks for "hot" keys
+    in background shortly before they expire in app.zkb_block_cache.
+    Hot keys are w-space block in all languages, and optionally top N
+    most viewed solar systems. For hot keys, request handler serves stale
+    block while it is being refreshed, so no visitor waits for zkillboard.
+    """
+    # how often to check cached blocks, seconds
+    CHECK_INTERVAL = 10
+    # refresh block this number of seconds before it expires
+    REFRESH_AHEAD = 60
+    # if zkillboard returned nothing, try again after this number of seconds
+    RETRY_INTERVAL = 60
+
+    def __init__(self, bus, app, top_systems: int = 0):
+        """
+        :param bus: cherrypy.engine
+        :param app: WhdbxApp, provides zkb_block_cache, load_zkb_kills() and render_zkb_block()
+        :param top_systems: also refresh this number of most viewed systems
+        """
+        super(ZKBBlockRefresher, self).__init__(bus)
+        self.app = app
+        self.top_systems = top_systems
+        self._views = collections.Counter()  # (ssid, locale) => number of views
+        self._views_decay_time = time.monotonic()
+        self._retry_times = dict()  # ssid => time of next refresh attempt after failure
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='ZKBBlockRefresher')
+        self._thread.daemon = True
+        self._thread.start()
+        self.bus.log('ZKB block refresher started')
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        self.bus.log('ZKB block refresher stopped')
+
+    def record_view(self, key: tuple) -> None:
+        if self.top_systems <= 0:
+            return
+        with self._lock:
+            self._views[key] += 1
+
+    def hot_keys(self) -> list:
+        ret = [('w-space', locale) for locale in self.app.tr.supported_locales]
+        if self.top_systems > 0:
+            with self._lock:
+                for key, _ in self._views.most_common(self.top_systems + len(ret)):
+                    if key not in ret:
+                        ret.append(key)
+        return ret[0:len(self.app.tr.supported_locales) + self.top_systems]
+
+    def is_hot(self, key: tuple) -> bool:
+        return key in self.hot_keys()
+
+    def wakeup(self) -> None:
+        """
+        Check cached blocks now, do not wait for CHECK_INTERVAL
+        """
+        self._wakeup.set()
+
+    def _decay_views(self) -> None:
+        """
+        Halve view counters once per cache time, so that only recently
+        popular systems stay in top
+        """
+        now = time.monotonic()
+        if now - self._views_decay_time < self.app.zkb_block_cache.ttl:
+            return
+        self._views_decay_time = now
+        with self._lock:
+            for key in list(self._views.keys()):
+                self._views[key] //= 2
+                if self._views[key] <= 0:
+                    del self._views[key]
+
+    def refresh(self) -> None:
+        cache = self.app.zkb_block_cache
+        refresh_ahead = min(self.REFRESH_AHEAD, cache.ttl / 2)
+        # the same kills are rendered in every language, so they are fetched
+        # and filled with details once per solar system, not once per block
+        locales_by_ssid = collections.OrderedDict()  # ssid => locales of hot blocks
+        due_ssids = set()
+        for ssid, locale in self.hot_keys():
+            locales_by_ssid.setdefault(ssid, []).append(locale)
+            ttl_left = cache.ttl_left((ssid, locale))
+            if (ttl_left is None) or (ttl_left <= refresh_ahead):
+                due_ssids.add(ssid)
+        for ssid, locales in locales_by_ssid.items():
+            if self._stopping:
+                break
+            if ssid not in due_ssids:
+                continue
+            if self._retry_times.get(ssid, 0) > time.monotonic():
+                continue
+            loaded = self.app.load_zkb_kills(ssid, refresh=True)
+            # blocks of one system are refreshed together, so they expire together
+            for locale in locales:
+                html, num_kills, is_fresh = self.app.render_zkb_block(ssid, locale, loaded=loaded)
+                if (num_kills > 0) and is_fresh:
+                    cache.put((ssid, locale), html)
+            if (len(loaded[0]) > 0) and loaded[1]:
+                self._retry_times.pop(ssid, None)
+            else:
+                self._retry_times[ssid] = time.monotonic() + self.RETRY_INTERVAL
+        self._decay_views()
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.bus.log('ZKB block refresher error: {}'.format(str(e)),
+                             level=logging.ERROR, traceback=True)
+            self._wakeup.wait(self.CHECK_INTERVAL)
+            self._wakeup.clear()
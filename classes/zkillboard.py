@@ -3,13 +3,21 @@ import os
 import os.path
 import datetime
 import json
+import re
 import sqlite3
+import threading
+import time
 
 # Uses python-requests
 # http://docs.python-requests.org/en/latest/
 import requests
 import requests.exceptions
 
+from . import deadline
+from . import http_client
+from .lru_cache import LRUCache
+from .single_flight import SingleFlight
+
 # Look at the X-Bin-Request-Count header and X-Bin-Max-Requests header
 # for how many requests you've made, and how many you can make pr. hour.
 # You can do any amount of requests pr. second that you want.
@@ -43,8 +51,118 @@ zkb_cache_options_sqlite = {
     'use_evekill': True
 }
 
+# concurrent requests for the same URL are sent to zkillboard only once
+zkb_flight = SingleFlight()
+
+_json_decoder = json.JSONDecoder()
+# characters a JSON number can consist of
+_json_number_re = re.compile(r'[-+0-9.eE]*')
+
+# afterKillID modifier was rejected by zkillboard, do not use it until this time.monotonic()
+zkb_after_kill_id_retry_time = 0.0
+
+
+class JsonNotArrayError(ValueError):
+    """
+    Raised by iter_json_array(), when text is valid JSON, but not an array,
+    like zkillboard's {"error": "..."} reply
+    """
+    # do not read more than this number of characters of such reply
+    MAX_LENGTH = 65536
+
+    def __init__(self, value):
+        super(JsonNotArrayError, self).__init__('JSON text is not an array')
+        self.value = value
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally parse top-level JSON array, yielding its elements as soon
+    as they are received. Caller may stop iterating early, then the rest
+    of the text is never read or parsed.
+    :param chunks: iterable of str pieces of JSON text
+    :raises JsonNotArrayError: if text is valid JSON, but not an array
+    :raises ValueError: if text is not a valid JSON array
+    """
+    buf = ''
+    pos = 0
+    state = 'start'  # 'start' => '[', 'first' => value or ']', 'value', 'sep' => ',' or ']'
+    chunks = iter(chunks)
+    eof = False
+    while state != 'done':
+        # skip whitespace, read more text if buffer is exhausted
+        while (pos < len(buf)) and (buf[pos] in ' \t\r\n'):
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError('Unexpected end of JSON array')
+            buf = buf[pos:]
+            pos = 0
+            try:
+                buf += next(chunks)
+            except StopIteration:
+                eof = True
+            continue
+        if state == 'start':
+            if buf[pos] != '[':
+                text = buf[pos:]
+                for chunk in chunks:
+                    if len(text) >= JsonNotArrayError.MAX_LENGTH:
+                        raise ValueError('JSON text is not an array')
+                    text += chunk
+                raise JsonNotArrayError(json.loads(text))
+            pos += 1
+            state = 'first'
+        elif (state in ('first', 'sep')) and (buf[pos] == ']'):
+            state = 'done'
+        elif state == 'sep':
+            if buf[pos] != ',':
+                raise ValueError('Expected "," in JSON array at {}'.format(pos))
+            pos += 1
+            state = 'value'
+        else:
+            try:
+                value, end = _json_decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                end = len(buf)  # value is not complete yet
+            else:
+                # raw_decode() returns 1 for '1.' or '1e', so a number is complete
+                # only if something other than number characters follows it
+                if (type(value) in (int, float)) and (_json_number_re.match(buf, pos).end() >= len(buf)):
+                    end = len(buf)
+            if (end >= len(buf)) and not eof:
+                # need more text; a number may be cut in the middle, too
+                buf = buf[pos:]
+                pos = 0
+                try:
+                    buf += next(chunks)
+                except StopIteration:
+                    eof = True
+                continue
+            pos = end
+            state = 'sep'
+            yield value
+
+
+# parsed kills lists for recently requested URLs, in front of disk cache
+zkb_memory_cache = LRUCache(200)
+
+
+def set_memory_cache_size(max_entries: int) -> None:
+    """
+    :param max_entries: max number of kills lists kept in memory; 0 disables memory cache
+    """
+    zkb_memory_cache.max_entries = max_entries
+    if max_entries <= 0:
+        zkb_memory_cache.clear()
+
 
 class ZKBCacheBase:
+    # expired replies are kept this long, to be shown when zkillboard is not available
+    KEEP_STALE = 24 * 3600
+
     def __init__(self, options: dict=None):
         self._cache_time = 600  # seconds
         self._debug = False
@@ -54,8 +172,21 @@ class ZKBCacheBase:
             if 'debug' in options:
                 self._debug = options['debug']
 
+    def get_entry(self, request_str: str, max_age: float) -> tuple:
+        """
+        :param max_age: ignore replies older than this number of seconds
+        :return: tuple (reply_str, age in seconds), or ('', 0) if there is no such reply
+        """
+        return '', 0
+
     def get_json(self, request_str: str):
-        return None
+        return self.get_entry(request_str, self._cache_time)[0]
+
+    def get_stale_json(self, request_str: str):
+        """
+        Like get_json(), but also returns expired reply, if it is still kept
+        """
+        return self.get_entry(request_str, self._cache_time + self.KEEP_STALE)[0]
 
     def save_json(self, request_str: str, reply_str: str):
         return None
@@ -77,45 +208,38 @@ class ZKBCacheFile(ZKBCacheBase):
                         raise IOError('ZKBCacheFile: Already exists and is NOT a directory: ' + cache_dir)
                 self._cache_dir = cache_dir
 
-    def get_json(self, request_str: str):
+    def get_entry(self, request_str: str, max_age: float) -> tuple:
         ret = ''
         if request_str is None:
-            return ret
+            return ret, 0
         if self._cache_dir is None:
-            return ret
+            return ret, 0
         cache_file = self._cache_dir + '/' + request_str + '.json'
-        # first try to get from cache
-        if os.path.isfile(cache_file) and os.access(cache_file, os.R_OK):
-            # check if cache file is too old for now
-            # get file modification time
+        # single stat() tells if file exists and how old it is
+        try:
             st = os.stat(cache_file)
-            dt_cache = datetime.datetime.fromtimestamp(st.st_mtime)
-            # get current time
-            dt_now = datetime.datetime.now()
-            # compare deltas
-            delta = dt_now - dt_cache
-            delta_secs = delta.total_seconds()
-            if delta_secs < self._cache_time:
-                if self._debug:
-                    print('ZKBCacheFile: Loading from cache: [{0}]'.format(cache_file))
-                try:
-                    f = open(cache_file, 'rt')
-                    ret = f.read()
-                    f.close()
-                except IOError as e:
-                    if self._debug:
-                        print('ZKBCacheFile: failed to read cache data from: [{0}]'.format(cache_file))
-                        print(str(e))
-            else:
-                if self._debug:
-                    print('ZKBCacheFile: Cache file [{0}] skipped, too old: {1} secs. (limit was: {2})'.
-                          format(cache_file, delta_secs, self._cache_time))
-                # Do not delete cache file, it will be just overwritten
-                #  in case of successful request, or left to live otherwise
-                #  this will allow to get at least any old data in the case of failure
-                # Or maybe delete it anyway?...
-                os.remove(cache_file)
-        return ret
+        except OSError:
+            return ret, 0
+        age = time.time() - st.st_mtime
+        if age >= max_age:
+            # Do not delete cache file, it will be just overwritten
+            #  in case of successful request, or left to live otherwise;
+            #  this allows to show at least old data in the case of failure
+            if self._debug:
+                print('ZKBCacheFile: Cache file [{0}] skipped, too old: {1} secs. (limit was: {2})'.
+                      format(cache_file, age, max_age))
+            return ret, 0
+        if self._debug:
+            print('ZKBCacheFile: Loading from cache: [{0}]'.format(cache_file))
+        try:
+            with open(cache_file, 'rt') as f:
+                ret = f.read()
+        except IOError as e:
+            if self._debug:
+                print('ZKBCacheFile: failed to read cache data from: [{0}]'.format(cache_file))
+                print(str(e))
+            return '', 0
+        return ret, age
 
     def save_json(self, request_str: str, reply_str: str):
         if request_str is None:
@@ -143,44 +267,68 @@ class ZKBCacheFile(ZKBCacheBase):
 
 
 class ZKBCacheSqlite(ZKBCacheBase):
+    """
+    Cache of zkillboard replies in sqlite database, one row per request.
+    One instance is shared by all threads (see get_sqlite_cache()).
+    Rows expired more than KEEP_STALE seconds ago are deleted in batches,
+    every EVICT_INTERVAL seconds, and then the oldest rows, if there are
+    more than max_entries.
+    """
+    EVICT_INTERVAL = 300  # seconds
+
     def __init__(self, options: dict=None):
         super(ZKBCacheSqlite, self).__init__(options)
         self._cache_file = None
         self._db = None
+        self._lock = threading.Lock()
+        self._max_entries = 10000
+        self._evict_time = 0
         if options:
+            if 'cache_max_entries' in options:
+                self._max_entries = int(options['cache_max_entries'])
             if 'cache_file' in options:
                 self._cache_file = options['cache_file']
                 if (self._cache_file is not None) and (self._cache_file != ''):
-                    self._db = sqlite3.connect(self._cache_file)
-                    cur = self._db.cursor()
-                    cur.execute('CREATE TABLE IF NOT EXISTS zkb_cache '
-                                '(req text, resp text, save_time int)')
-                    self._db.commit()
-                    cur.close()
-
-    def get_json(self, request_str: str):
+                    cache_dir = os.path.dirname(self._cache_file)
+                    if cache_dir != '':
+                        os.makedirs(cache_dir, exist_ok=True)
+                    self._db = sqlite3.connect(self._cache_file, check_same_thread=False)
+                    self.check_tables()
+
+    def check_tables(self):
+        with self._lock:
+            cur = self._db.cursor()
+            # readers do not block writer, and commit does not wait for fsync
+            cur.execute('PRAGMA journal_mode=WAL')
+            cur.execute('PRAGMA synchronous=NORMAL')
+            # old versions created table without primary key, full of duplicates
+            cur.execute('PRAGMA table_info(zkb_cache)')
+            columns = cur.fetchall()
+            if (len(columns) > 0) and not any([col[5] for col in columns]):
+                cur.execute('DROP TABLE zkb_cache')
+            cur.execute('CREATE TABLE IF NOT EXISTS zkb_cache '
+                        '(req TEXT PRIMARY KEY NOT NULL, resp TEXT, save_time INT)')
+            cur.execute('CREATE INDEX IF NOT EXISTS zkb_cache_save_time ON zkb_cache (save_time)')
+            self._db.commit()
+            cur.close()
+
+    def get_entry(self, request_str: str, max_age: float) -> tuple:
         ret = ''
         if not self._cache_file:
-            return ret
+            return ret, 0
         if not self._db:
-            return ret
+            return ret, 0
         tm_now = int(datetime.datetime.now().timestamp())
-        cur = self._db.cursor()
-        cur.execute('SELECT resp, save_time FROM zkb_cache WHERE req = ?', (request_str,))
-        row = cur.fetchone()
+        with self._lock:
+            cur = self._db.cursor()
+            # expired row is not deleted here, it will be overwritten or evicted
+            cur.execute('SELECT resp, save_time FROM zkb_cache WHERE req = ? AND save_time > ?',
+                        (request_str, tm_now - max_age))
+            row = cur.fetchone()
+            cur.close()
         if row:
-            save_time = int(row[1])
-            time_passed = tm_now - save_time
-            if time_passed > self._cache_time:
-                cur.close()
-                # delete old record
-                cur = self._db.cursor()
-                cur.execute('DELETE FROM zkb_cache WHERE req = ? AND save_time = ?', (request_str, save_time))
-                self._db.commit()
-            else:
-                ret = row[0]
-        cur.close()
-        return ret
+            return row[0], tm_now - int(row[1])
+        return ret, 0
 
     def save_json(self, request_str: str, reply_str: str):
         if not self._cache_file:
@@ -188,15 +336,54 @@ class ZKBCacheSqlite(ZKBCacheBase):
         if not self._db:
             return
         tm_now = int(datetime.datetime.now().timestamp())
-        cur = self._db.cursor()
-        cur.execute('INSERT INTO zkb_cache (req, resp, save_time) VALUES (?, ?, ?)',
-                    (request_str, reply_str, tm_now))
-        self._db.commit()
-        cur.close()
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute('INSERT OR REPLACE INTO zkb_cache (req, resp, save_time) VALUES (?, ?, ?)',
+                        (request_str, reply_str, tm_now))
+            if tm_now - self._evict_time >= self.EVICT_INTERVAL:
+                self._evict_time = tm_now
+                self._evict(cur, tm_now)
+            self._db.commit()
+            cur.close()
         return
 
+    def _evict(self, cur: sqlite3.Cursor, tm_now: int):
+        cur.execute('DELETE FROM zkb_cache WHERE save_time < ?', (tm_now - self._cache_time - self.KEEP_STALE,))
+        if self._max_entries > 0:
+            cur.execute('DELETE FROM zkb_cache WHERE req IN '
+                        '(SELECT req FROM zkb_cache ORDER BY save_time DESC LIMIT -1 OFFSET ?)',
+                        (self._max_entries,))
+        if self._debug:
+            print('ZKBCacheSqlite: evicted old rows')
+
+
+_sqlite_caches = dict()  # (cache_file, cache_time, cache_max_entries) => ZKBCacheSqlite
+_sqlite_caches_lock = threading.Lock()
+
+
+def get_sqlite_cache(options: dict) -> ZKBCacheSqlite:
+    """
+    Get shared sqlite cache for options, create it on first use;
+    there is no need to open database for each ZKB object
+    """
+    key = (options.get('cache_file'), options.get('cache_time'), options.get('cache_max_entries'))
+    with _sqlite_caches_lock:
+        cache = _sqlite_caches.get(key)
+        if cache is None:
+            cache = ZKBCacheSqlite(options)
+            _sqlite_caches[key] = cache
+        return cache
+
 
 class ZKB:
+    # max number of kills kept per feed in incremental mode, if kills_on_page is not set
+    FEED_MAX_KILLS = 200
+    # zkillboard's reply to a modifier it does not accept: HTTP 400 with {"error": "..."} naming it
+    MODIFIER_REJECTED_STATUS = 400
+    AFTER_KILL_ID_REJECTED_RE = re.compile(r'\bafterKillID\b', re.IGNORECASE)
+    # seconds to request full feeds after afterKillID was rejected, before trying it again
+    AFTER_KILL_ID_RETRY_INTERVAL = 3600
+
     def __init__(self, options: dict=None):
         self.HOURS = 3600
         self.DAYS = 24 * self.HOURS
@@ -212,6 +399,12 @@ class ZKB:
         self._cache = None
         self._debug = False
         self._use_evekill = False
+        self._timeout = 20  # seconds
+        self._cache_time = 600  # seconds
+        self._incremental = False  # request only kills newer than already known ones
+        self.is_stale = False  # last go() returned expired kills, zkillboard is not available
+        self.reply_status = 0  # HTTP status of zkillboard's reply to last request, 0 on network error
+        self.reply_error = ''  # error message from zkillboard's reply to last request, if any
         self.request_count = 0
         self.max_requests = 0
         self.kills_on_page = 0
@@ -230,11 +423,17 @@ class ZKB:
                 if cache_type == 'file':
                     self._cache = ZKBCacheFile(options)
                 elif cache_type == 'sqlite':
-                    self._cache = ZKBCacheSqlite(options)
+                    self._cache = get_sqlite_cache(options)
                 else:
                     raise IndexError('ZKB: Unknown cache_type in options: ' + cache_type)
             if 'kills_on_page' in options:
                 self.kills_on_page = options['kills_on_page']
+            if 'timeout' in options:
+                self._timeout = options['timeout']
+            if 'cache_time' in options:
+                self._cache_time = int(options['cache_time'])
+            if 'incremental' in options:
+                self._incremental = options['incremental']
 
     def clear_url(self):
         self._url = self._BASE_URL_ZKB
@@ -346,21 +545,24 @@ class ZKB:
     def add_solarSystem(self, solarSystemID):
         self.add_modifier('solarSystemID', solarSystemID)
 
-    # Default cache lifetime set to 1 hour (3600 seconds)
-    def go(self):
-        zkb_kills = []
-        ret = ''
-        # first, try to get from cache
-        if self._cache:
-            ret = self._cache.get_json(self._modifiers)
-        if (ret is None) or (ret == ''):
-            # either no cache exists or cache read error :( send request
+    def _request_kills(self, url: str) -> list:
+        """
+        Send request to zkillboard. Reply is parsed while it is being received,
+        and only first kills_on_page kills are read.
+        :return: trimmed and normalized kills list, or None on any error
+        """
+        ret = None
+        self.reply_status = 0
+        self.reply_error = ''
+        try:
+            if self._debug:
+                print('ZKB: Sending request! {0}'.format(url))
+            client = http_client.get_client('zkb', timeout=self._timeout)
+            r = client.get(url, headers=self._headers, stream=True)
+            self.reply_status = r.status_code
             try:
-                if self._debug:
-                    print('ZKB: Sending request! {0}'.format(self._url))
-                r = requests.get(self._url, headers=self._headers)
                 if r.status_code == 200:
-                    ret = r.text
+                    ret = self._read_kills(client, r)
                     if 'x-bin-request-count' in r.headers:
                         self.request_count = int(r.headers['x-bin-request-count'])
                     if 'x-bin-max-requests' in r.headers:
@@ -376,55 +578,209 @@ class ZKB:
                 else:
                     if self._debug:
                         print('ZKB: ERROR: HTTP response code: {0}'.format(r.status_code))
-            except requests.exceptions.RequestException as e:
-                if self._debug:
-                    print(str(e))
-            # request done, see if we have a response
-            if ret != '':
-                if self._cache:
-                    self._cache.save_json(self._modifiers, ret)
-        # parse response JSON, if we have one
-        if (ret is not None) and (ret != ''):
-            zkb_kills = []
+                    if r.status_code < 500:
+                        # like 400 for unknown modifier, with {"error": "..."}
+                        self._read_reply_error(r.text)
+            finally:
+                # if reply was not read to the end, connection is dropped
+                client.finish_stream(r)
+        except requests.exceptions.RequestException as e:
+            if self._debug:
+                print(str(e))
+        except JsonNotArrayError as e:
+            # like {"error": "..."}
+            self._read_reply_error(e.value)
+            if self._debug:
+                print('ZKB: ERROR: reply is not a kills list: {0}'.format(str(e.value)))
+        except ValueError as e:
+            if self._debug:
+                print('ZKB: ERROR: invalid reply: {0}'.format(str(e)))
+        return ret
+
+    def _read_reply_error(self, reply) -> None:
+        """
+        Remember error message from zkillboard's {"error": "..."} reply
+        :param reply: parsed reply, or reply text
+        """
+        if isinstance(reply, str):
             try:
-                zkb_kills = json.loads(ret)
+                reply = json.loads(reply)
             except ValueError:
-                # skip JSON parse errors
-                pass
-            utcnow = datetime.datetime.utcnow()
-            try:
-                if self.kills_on_page > 0:
-                    # manually limit number of kills to process
-                    zkb_kills = zkb_kills[0:self.kills_on_page]
-                for a_kill in zkb_kills:
-                    # a_kill should be a dict object.
-                    # Sometimes ZKB can return 'error' key as string, we can parse only dicts
-                    if type(a_kill) != dict:
-                        continue
-
-                    # kill price in ISK, killmail hash
-                    a_kill['killmail_hash'] = ''
-                    a_kill['total_value'] = 0
-                    a_kill['total_value_m'] = 0
-                    a_kill['is_npc'] = False
-                    a_kill['is_solo'] = False
-                    if 'zkb' in a_kill:
-                        if 'totalValue' in a_kill['zkb']:
-                            a_kill['total_value'] = float(a_kill['zkb']['totalValue'])
-                            a_kill['total_value_m'] = round(float(a_kill['zkb']['totalValue']) / 1000000.0)
-                        if 'hash' in a_kill['zkb']:
-                            a_kill['killmail_hash'] = a_kill['zkb']['hash']
-                        if 'npc' in a_kill['zkb']:
-                            a_kill['is_npc'] = a_kill['zkb']['npc']
-                        if 'solo' in a_kill['zkb']:
-                            a_kill['is_solo'] = a_kill['zkb']['solo']
-                    del a_kill['zkb']
-            except KeyError as k_e:
+                return
+        if isinstance(reply, dict) and ('error' in reply):
+            self.reply_error = str(reply['error'])
+
+    def _request_feed(self, key: tuple) -> list:
+        """
+        Request kills from zkillboard. In incremental mode, if there are kills
+        from previous request (even expired ones), only newer kills are requested,
+        and merged into previous list.
+        :return: kills list, or None on any error
+        """
+        global zkb_after_kill_id_retry_time
+        if self._incremental and (time.monotonic() >= zkb_after_kill_id_retry_time):
+            prev_kills = self._load_stale_kills(key)
+            if len(prev_kills) > 0:
+                last_id = max([int(a_kill['killmail_id']) for a_kill in prev_kills])
+                # the same as add_afterKillID(), for this request only
+                new_kills = self._request_kills('{0}afterKillID/{1}/'.format(self._url, last_id))
+                if new_kills is not None:
+                    if self._debug:
+                        print('ZKB: {0} new kills after {1}'.format(len(new_kills), last_id))
+                    return self._merge_kills(new_kills, prev_kills)
+                if not self._after_kill_id_rejected():
+                    # network error, rate limit, or zkillboard is down: do not add load
+                    return None
+                # afterKillID is not supported now, request everything for a while
+                zkb_after_kill_id_retry_time = time.monotonic() + self.AFTER_KILL_ID_RETRY_INTERVAL
                 if self._debug:
-                    print('It is possible that ZKB API has changed (again).')
-                    print(str(k_e))
+                    print('ZKB: afterKillID was rejected: {0}'.format(self.reply_error))
+        return self._request_kills(self._url)
+
+    def _after_kill_id_rejected(self) -> bool:
+        """
+        :return: True if last reply says that afterKillID modifier itself is not accepted
+        """
+        return (self.reply_status == self.MODIFIER_REJECTED_STATUS) and \
+            (self.AFTER_KILL_ID_REJECTED_RE.search(self.reply_error) is not None)
+
+    def _merge_kills(self, new_kills: list, prev_kills: list) -> list:
+        """
+        :return: newest kills from both lists, no more than kills_on_page (or FEED_MAX_KILLS)
+        """
+        max_kills = self.kills_on_page if self.kills_on_page > 0 else self.FEED_MAX_KILLS
+        ret = []
+        seen_ids = set()
+        for a_kill in sorted(new_kills + prev_kills, key=lambda k: int(k['killmail_id']), reverse=True):
+            kill_id = int(a_kill['killmail_id'])
+            if kill_id in seen_ids:
+                continue
+            seen_ids.add(kill_id)
+            ret.append(a_kill)
+            if len(ret) >= max_kills:
+                break
+        return ret
+
+    def _read_kills(self, client: http_client.HttpClient, r: requests.Response) -> list:
+        zkb_kills = []
+        if r.encoding is None:
+            r.encoding = 'utf-8'  # JSON
+        # errors while reading body are counted by zkb circuit breaker
+        for a_kill in iter_json_array(client.iter_content(r, chunk_size=16384, decode_unicode=True)):
+            if type(a_kill) == dict:
+                zkb_kills.append(self._normalize_kill(a_kill))
+            if (self.kills_on_page > 0) and (len(zkb_kills) >= self.kills_on_page):
+                break
         return zkb_kills
 
+    def _normalize_kill(self, a_kill: dict) -> dict:
+        """
+        Move needed fields from kill's 'zkb' dict to kill itself, and remove the rest.
+        Kills without 'zkb' (normalized already) are not changed
+        """
+        if 'zkb' not in a_kill:
+            return a_kill
+        # kill price in ISK, killmail hash
+        a_kill['killmail_hash'] = ''
+        a_kill['total_value'] = 0
+        a_kill['total_value_m'] = 0
+        a_kill['is_npc'] = False
+        a_kill['is_solo'] = False
+        if 'totalValue' in a_kill['zkb']:
+            a_kill['total_value'] = float(a_kill['zkb']['totalValue'])
+            a_kill['total_value_m'] = round(float(a_kill['zkb']['totalValue']) / 1000000.0)
+        if 'hash' in a_kill['zkb']:
+            a_kill['killmail_hash'] = a_kill['zkb']['hash']
+        if 'npc' in a_kill['zkb']:
+            a_kill['is_npc'] = a_kill['zkb']['npc']
+        if 'solo' in a_kill['zkb']:
+            a_kill['is_solo'] = a_kill['zkb']['solo']
+        del a_kill['zkb']
+        return a_kill
+
+    def _parse_kills(self, text: str) -> list:
+        """
+        Parse cached reply: either already trimmed and normalized kills list,
+        or full zkillboard reply, saved by older versions
+        """
+        zkb_kills = []
+        try:
+            zkb_kills = json.loads(text)
+        except ValueError:
+            # skip JSON parse errors
+            pass
+        if type(zkb_kills) != list:
+            return []
+        zkb_kills = [a_kill for a_kill in zkb_kills if type(a_kill) == dict]
+        if self.kills_on_page > 0:
+            # manually limit number of kills to process
+            zkb_kills = zkb_kills[0:self.kills_on_page]
+        return [self._normalize_kill(a_kill) for a_kill in zkb_kills]
+
+    def _load_kills(self, key: tuple, refresh: bool) -> list:
+        """
+        Get kills from disk cache or from zkillboard, and keep them in memory cache
+        :return: parsed kills list, shared with memory cache, or None if there is no fresh reply
+        """
+        zkb_kills = None
+        age = 0
+        # first, try to get from cache
+        if self._cache and not refresh:
+            ret, age = self._cache.get_entry(self._modifiers, self._cache_time)
+            if ret != '':
+                zkb_kills = self._parse_kills(ret)
+        if zkb_kills is None:
+            # either no cache exists or cache read error :( send request
+            zkb_kills = self._request_feed(key)
+            if zkb_kills is None:
+                return None
+            age = 0
+            if self._cache:
+                self._cache.save_json(self._modifiers, json.dumps(zkb_kills))
+        if self._cache_time - age > 0:
+            zkb_memory_cache.put(key, zkb_kills, self._cache_time - age)
+        return zkb_kills
+
+    def _load_stale_kills(self, key: tuple) -> list:
+        """
+        :return: expired kills list from memory or disk cache, or empty list
+        """
+        zkb_kills, _ = zkb_memory_cache.get_stale(key)
+        if zkb_kills is not None:
+            return zkb_kills
+        if self._cache:
+            ret = self._cache.get_stale_json(self._modifiers)
+            if ret != '':
+                return self._parse_kills(ret)
+        return []
+
+    # Default cache lifetime set to 1 hour (3600 seconds)
+    # refresh=True skips reading the cache, but the reply is still saved into it
+    def go(self, refresh: bool = False):
+        self.is_stale = False
+        key = (self._url, self.kills_on_page)
+        zkb_kills = None
+        if not refresh:
+            # hot systems are served from memory, without file reading and JSON parsing
+            zkb_kills, expired = zkb_memory_cache.get_stale(key)
+            if expired:
+                zkb_kills = None
+        if zkb_kills is None:
+            # many users may open the same system page at once
+            try:
+                zkb_kills = zkb_flight.do(key, self._load_kills, key, refresh)
+            except deadline.DeadlineExceeded:
+                # no time left to wait for another request of the same kills
+                zkb_kills = None
+        if (zkb_kills is None) and not refresh:
+            # zkillboard is not available, old kills are better than nothing
+            zkb_kills = self._load_stale_kills(key)
+            self.is_stale = len(zkb_kills) > 0
+        if zkb_kills is None:
+            return []
+        # kills are shared with memory cache, callers modify them
+        return [dict(a_kill) for a_kill in zkb_kills]
+
 # #################################
 # Unimplemented / Unused:
 #  /api-only/
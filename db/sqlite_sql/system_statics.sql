@@ -0,0 +1,16 @@
+-- Normalized statics of WH systems: one row per (system, static hole), with
+-- destination class of the hole. Built from wormholesystems_new.statics,
+-- so this script must run after wormholesystems_new.sql and user_reported_statics.sql.
+DROP TABLE IF EXISTS system_statics;
+CREATE TABLE system_statics( solarsystemid int, hole text, in_class int, PRIMARY KEY (solarsystemid, hole) );
+INSERT OR IGNORE INTO system_statics (solarsystemid, hole, in_class)
+WITH RECURSIVE split(solarsystemid, hole, rest) AS (
+    SELECT solarsystemid, '', statics || ',' FROM wormholesystems_new WHERE statics IS NOT NULL
+    UNION ALL
+    SELECT solarsystemid, trim(substr(rest, 1, instr(rest, ',') - 1)), substr(rest, instr(rest, ',') + 1)
+      FROM split WHERE rest <> ''
+)
+SELECT s.solarsystemid, s.hole,
+       (SELECT wc.in_class FROM wormholeclassifications wc WHERE wc.hole = s.hole ORDER BY wc.rowid LIMIT 1)
+  FROM split s WHERE s.hole <> '';
+CREATE INDEX system_statics_in_class ON system_statics (in_class, solarsystemid);
@@ -10,6 +10,7 @@
 %SQLITE3_EXE% %DB_FILENAME% < wormholeclassifications.sql
 %SQLITE3_EXE% %DB_FILENAME% < wormholesystems_new.sql
 %SQLITE3_EXE% %DB_FILENAME% < user_reported_statics.sql
+%SQLITE3_EXE% %DB_FILENAME% < system_statics.sql
 
 echo Done.
 pause
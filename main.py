@@ -1,7 +1,9 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 import argparse
+import concurrent.futures
 import datetime
+import functools
 import json
 import logging
 import os
@@ -12,26 +14,75 @@ import uuid
 
 import cherrypy
 from cherrypy._cpdispatch import Dispatcher
+import cherrypy.lib.cptools
 import cherrypy.lib.sessions
 
 import requests
 import requests.exceptions
 
 from classes.sitecfg import SiteConfig
-from classes.template_engine import TemplateEngine
+from classes.template_engine import TemplateEngine, TemplateContext
 from classes.database import SiteDb, WHClass, get_ss_security_color
 from classes.eve_names_resolver import EveNamesDb
 from classes.killmails_cache import KillMailsCache
+from classes.lru_cache import LRUCache
+from classes.page_cache import PageCache, page_for_session
 from classes.sleeper import WHSleeper
 from classes.signature import WHSignature
-from classes.zkillboard import ZKB
+from classes.zkillboard import ZKB, set_memory_cache_size
 from classes.whsystem import WHSystem
+from classes.whdb_filter import WHDBFilter
+from classes.zkb_refresher import ZKBBlockRefresher
+from classes.kill_stream import KillStreamWorker
 from classes.utils import dump_object, is_whsystem_name
+from classes import deadline
 from classes import esi_calls
+from classes import http_client
 from classes import error_pages
 from classes import tr_support
 
 
+def page_cached(handler):
+    """
+    Decorator for page handlers whose output depends only on static DB data,
+    request path, query string and locale. Such pages are served to anonymous
+    visitors from full-page cache, and If-None-Match is answered with 304.
+    """
+    @functools.wraps(handler)
+    def wrapper(self, *args, **kwargs):
+        self.init_session()
+        key = self.page_cache_key()
+        if key is None:
+            return handler(self, *args, **kwargs)
+        page = self.page_cache.get(key)
+        if page is None:
+            html = handler(self, *args, **kwargs)
+            if deadline.expired():
+                # page may be incomplete, do not keep it
+                return html
+            page = self.page_cache.put(key, html, cherrypy.session['sso_state'])
+        page = page_for_session(page, cherrypy.session['sso_state'])
+        cherrypy.response.headers['ETag'] = page.etag
+        cherrypy.response.headers['Cache-Control'] = 'private, no-cache'
+        cherrypy.lib.cptools.validate_etags()  # raises 304 if client has this page already
+        return page.body
+    return wrapper
+
+
+def request_deadline(endpoint: str):
+    """
+    Decorator for handlers calling ESI, zkillboard and other external services:
+    handler runs with time budget for this endpoint from [deadlines] config section.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(self, *args, **kwargs):
+            with deadline.Deadline(self.cfg.request_deadline(endpoint)):
+                return handler(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 class WhdbxApp:
 
     class CustomDispatcher(Dispatcher):
@@ -64,10 +115,20 @@ class WhdbxApp:
     def __init__(self):
         self.rootdir = pathlib.Path(os.path.dirname(os.path.abspath(__file__))).as_posix()
         self.cfg = SiteConfig()
+        # keep-alive connections to ESI, zkillboard, ... for all server threads
+        http_client.set_pool_size(self.cfg.SERVER_THREAD_POOL + self.cfg.ESI_MAX_PARALLEL)
+        http_client.set_circuit_breaker(self.cfg.CIRCUIT_BREAKER_FAILURES, self.cfg.CIRCUIT_BREAKER_RESET)
         self.tmpl = TemplateEngine(self.cfg)
         self.db = SiteDb(self.cfg)
+        self.db.hub_routes()  # build trade hub routes table now, if it is missing or stale
+        self._whdb_filter = None  # WH database search engine, built on first use
         self.names_db = EveNamesDb(self.cfg)
         self.killmails_cache = KillMailsCache(self.cfg)
+        self.esi_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.cfg.ESI_MAX_PARALLEL, thread_name_prefix='ESI')
+        self.page_cache = None
+        if self.cfg.PAGE_CACHE_SIZE > 0:
+            self.page_cache = PageCache(self.cfg.PAGE_CACHE_SIZE, self.cfg.TEMPLATE_DIR)
 
         # options for zkillboard helper
         self.zkb_options = {
@@ -75,9 +136,15 @@ class WhdbxApp:
             'cache_time': self.cfg.ZKB_CACHE_TIME,
             'cache_type': self.cfg.ZKB_CACHE_TYPE,
             'cache_dir': self.cfg.ZKB_CACHE_DIR,
+            'cache_file': self.cfg.ZKB_CACHE_SQLITE,
+            'cache_max_entries': self.cfg.ZKB_CACHE_SQLITE_MAX_ENTRIES,
             'use_evekill': self.cfg.ZKB_USE_EVEKILL,
-            'kills_on_page': self.cfg.ZKB_KILLS_ON_PAGE
+            'kills_on_page': self.cfg.ZKB_KILLS_ON_PAGE,
+            'incremental': self.cfg.ZKB_INCREMENTAL
         }
+        set_memory_cache_size(self.cfg.ZKB_MEMORY_CACHE_SIZE)
+        # rendered zkb_block HTML, per (ssid, locale)
+        self.zkb_block_cache = LRUCache(self.cfg.ZKB_BLOCK_CACHE_SIZE, self.cfg.ZKB_CACHE_TIME)
 
         # session vars declaration
         self.needed_session_vars = [
@@ -99,6 +166,19 @@ class WhdbxApp:
         self.tr = tr_support.MultiLangTranslator(self.translations_dir, 'whdbx')
         self.tr.init_translations()
 
+        # background refresh of hot kills blocks
+        self.zkb_refresher = None
+        if self.cfg.ZKB_BACKGROUND_REFRESH and (self.cfg.ZKB_BLOCK_CACHE_SIZE > 0):
+            self.zkb_refresher = ZKBBlockRefresher(cherrypy.engine, self, self.cfg.ZKB_REFRESH_TOP_SYSTEMS)
+            self.zkb_refresher.subscribe()
+
+        # prefetch of new w-space killmails from kill stream
+        self.kill_stream = None
+        if self.cfg.ZKB_KILL_STREAM and (self.cfg.ZKB_KILL_STREAM_QUEUE_ID != ''):
+            self.kill_stream = KillStreamWorker(cherrypy.engine, self, self.cfg.ZKB_KILL_STREAM_URL,
+                                                self.cfg.ZKB_KILL_STREAM_QUEUE_ID, self.cfg.ZKB_KILL_STREAM_TTW)
+            self.kill_stream.subscribe()
+
         # options for cherrypy application
         session_storage_class = cherrypy.lib.sessions.RamSession
         session_storage_path = os.path.abspath(self.cfg.SESSION_FILES_DIR)
@@ -161,27 +241,31 @@ class WhdbxApp:
         cherrypy.log(s, self.tag)
 
     # call this if any input error
-    def display_failure(self, comment: str = '') -> str:
-        if not self.tmpl.is_set('title'):
-            self.tmpl.assign('title', 'ERROR - WHDBX')
-        self.tmpl.assign('MODE', 'failure')  # current page identifier
+    def display_failure(self, comment: str = '', ctx: TemplateContext = None) -> str:
+        if ctx is None:
+            self.init_session()
+            ctx = self.setup_template_vars('failure')
+            ctx.unassign('title')
+        if not ctx.is_set('title'):
+            ctx.assign('title', 'ERROR - WHDBX')
+        ctx.assign('MODE', 'failure')  # current page identifier
         # assign EVE-SSO data defaults
-        self.tmpl.assign('HAVE_SSO_LOGIN', False)
-        self.tmpl.assign('SSO_TOKEN_EXPIRE_DT', '')
-        self.tmpl.assign('SSO_LOGIN_URL', self.cfg.sso_login_url(cherrypy.session['sso_state']))
-        self.tmpl.assign('SSO_CHAR_ID', '')
-        self.tmpl.assign('SSO_CHAR_NAME', '')
-        self.tmpl.assign('SSO_CORP_ID', '')
-        self.tmpl.assign('SSO_CORP_NAME', '')
-        self.tmpl.assign('SSO_SHIP_ID', '')
-        self.tmpl.assign('SSO_SHIP_NAME', '')
-        self.tmpl.assign('SSO_SHIP_TITLE', '')
-        self.tmpl.assign('SSO_SOLARSYSTEM_ID', '')
-        self.tmpl.assign('SSO_SOLARSYSTEM_NAME', '')
-        self.tmpl.assign('SSO_ONLINE', '')
-        self.setup_locale()
-        self.tmpl.assign('error_comment', comment)
-        return self.tmpl.render('failure.html')
+        ctx.assign('HAVE_SSO_LOGIN', False)
+        ctx.assign('SSO_TOKEN_EXPIRE_DT', '')
+        ctx.assign('SSO_LOGIN_URL', self.cfg.sso_login_url(cherrypy.session['sso_state']))
+        ctx.assign('SSO_CHAR_ID', '')
+        ctx.assign('SSO_CHAR_NAME', '')
+        ctx.assign('SSO_CORP_ID', '')
+        ctx.assign('SSO_CORP_NAME', '')
+        ctx.assign('SSO_SHIP_ID', '')
+        ctx.assign('SSO_SHIP_NAME', '')
+        ctx.assign('SSO_SHIP_TITLE', '')
+        ctx.assign('SSO_SOLARSYSTEM_ID', '')
+        ctx.assign('SSO_SOLARSYSTEM_NAME', '')
+        ctx.assign('SSO_ONLINE', '')
+        self.setup_locale(ctx)
+        ctx.assign('error_comment', comment)
+        return self.tmpl.render('failure.html', ctx)
 
     def init_session(self):
         # create all needed default values in session
@@ -194,6 +278,20 @@ class WhdbxApp:
             if var_name not in cherrypy.session:
                 cherrypy.session[var_name] = ''
 
+    def page_cache_key(self) -> tuple:
+        """
+        :return: full-page cache key for current request, or None if response should not be cached
+        """
+        if self.page_cache is None:
+            return None
+        # logged in users see their character info in page header
+        if cherrypy.session['sso_token'] != '':
+            return None
+        if cherrypy.request.method not in ('GET', 'HEAD'):
+            return None
+        key = (cherrypy.request.path_info, cherrypy.request.query_string, self.get_selected_locale_code())
+        return self.page_cache.versioned_key(key, self.db.static_data().version)
+
     def sso_session_cleanup(self):
         for var_name in self.needed_session_vars:
             cherrypy.session[var_name] = ''
@@ -294,28 +392,51 @@ class WhdbxApp:
         self.cfg.load('whdbx_config_local.ini')
         # enable cherrypy logging to console only in DEBUG
         cherrypy.log.screen = self.cfg.DEBUG
+        # cached pages were rendered with old config
+        if self.page_cache is not None:
+            self.page_cache.clear()
         # reload also ZKB options
         self.zkb_options = {
             'debug': False,
             'cache_time': self.cfg.ZKB_CACHE_TIME,
             'cache_type': self.cfg.ZKB_CACHE_TYPE,
             'cache_dir': self.cfg.ZKB_CACHE_DIR,
+            'cache_file': self.cfg.ZKB_CACHE_SQLITE,
+            'cache_max_entries': self.cfg.ZKB_CACHE_SQLITE_MAX_ENTRIES,
             'use_evekill': self.cfg.ZKB_USE_EVEKILL,
-            'kills_on_page': self.cfg.ZKB_KILLS_ON_PAGE
+            'kills_on_page': self.cfg.ZKB_KILLS_ON_PAGE,
+            'incremental': self.cfg.ZKB_INCREMENTAL
         }
+        # cache size or time may have changed
+        set_memory_cache_size(self.cfg.ZKB_MEMORY_CACHE_SIZE)
+        self.zkb_block_cache = LRUCache(self.cfg.ZKB_BLOCK_CACHE_SIZE, self.cfg.ZKB_CACHE_TIME)
         # output
         msg = '\n'
         msg += 'DEBUG: {}\n'.format(self.cfg.DEBUG)
         msg += 'EMULATE: {}\n'.format(self.cfg.EMULATE)
         msg += 'TEMPLATE_DIR: {}\n'.format(self.cfg.TEMPLATE_DIR)
         msg += 'TEMPLATE_CACHE_DIR: {}\n'.format(self.cfg.TEMPLATE_CACHE_DIR)
+        msg += 'SERVER_THREAD_POOL: {}\n'.format(self.cfg.SERVER_THREAD_POOL)
+        msg += 'PAGE_CACHE_SIZE: {}\n'.format(self.cfg.PAGE_CACHE_SIZE)
+        msg += 'CIRCUIT_BREAKER_FAILURES: {}\n'.format(self.cfg.CIRCUIT_BREAKER_FAILURES)
+        msg += 'CIRCUIT_BREAKER_RESET: {}\n'.format(self.cfg.CIRCUIT_BREAKER_RESET)
+        msg += 'DEADLINES: {}\n'.format(self.cfg.DEADLINES)
         msg += 'EVEDB: {}\n'.format(self.cfg.EVEDB)
+        msg += 'EVEDB_MMAP_SIZE: {}\n'.format(self.cfg.EVEDB_MMAP_SIZE)
+        msg += 'EVEDB_TYPE_INDEX: {}\n'.format(self.cfg.EVEDB_TYPE_INDEX)
         msg += 'ROUTES_CACHE_DIR: {}\n'.format(self.cfg.ROUTES_CACHE_DIR)
         msg += 'ZKB_CACHE_TYPE: {}\n'.format(self.cfg.ZKB_CACHE_TYPE)
         msg += 'ZKB_CACHE_TIME: {}\n'.format(self.cfg.ZKB_CACHE_TIME)
         msg += 'ZKB_CACHE_DIR: {}\n'.format(self.cfg.ZKB_CACHE_DIR)
+        msg += 'ZKB_MEMORY_CACHE_SIZE: {}\n'.format(self.cfg.ZKB_MEMORY_CACHE_SIZE)
+        msg += 'ZKB_BLOCK_CACHE_SIZE: {}\n'.format(self.cfg.ZKB_BLOCK_CACHE_SIZE)
+        msg += 'ZKB_KILL_STREAM: {}\n'.format(self.cfg.ZKB_KILL_STREAM)
+        msg += 'ESI_MAX_PARALLEL: {}\n'.format(self.cfg.ESI_MAX_PARALLEL)
+        msg += 'ESI_CACHE_TYPE: {}\n'.format(self.cfg.ESI_CACHE_TYPE)
         msg += 'ZKB_CACHE_SQLITE: {}\n'.format(self.cfg.ZKB_CACHE_SQLITE)
+        msg += 'ZKB_CACHE_SQLITE_MAX_ENTRIES: {}\n'.format(self.cfg.ZKB_CACHE_SQLITE_MAX_ENTRIES)
         msg += 'ZKB_USE_EVEKILL: {}\n'.format(self.cfg.ZKB_USE_EVEKILL)
+        msg += 'ZKB_INCREMENTAL: {}\n'.format(self.cfg.ZKB_INCREMENTAL)
         msg += 'EVECENTRAL_CACHE_DIR: {}\n'.format(self.cfg.EVECENTRAL_CACHE_DIR)
         msg += 'EVECENTRAL_CACHE_HOURS: {}\n'.format(self.cfg.EVECENTRAL_CACHE_HOURS)
         msg += 'ESI_BASE_URL: {}\n'.format(self.cfg.ESI_BASE_URL)
@@ -324,55 +445,109 @@ class WhdbxApp:
         msg += 'SSO_SCOPES: {}\n'.format(self.cfg.SSO_SCOPES)
         msg += 'SSO_CALLBACK_URL: {}\n'.format(self.cfg.SSO_CALLBACK_URL)
         msg += 'SSO_USER_AGENT: {}\n'.format(self.cfg.SSO_USER_AGENT)
-        msg += '\nDatabase was not reconnected; Template engine was not reloaded here.\n'
+        msg += '\nDatabase was not reconnected; Template engine and ESI thread pool were not reloaded here.\n'
         msg += 'You need to fully restart server to do this.\n'
         return self.debugprint(msg, show_config=False, show_env=False)
 
-    def setup_template_vars(self, page: str = ''):
-        self.tmpl.unassign_all()
-        self.tmpl.assign('title', 'WHDBX')  # default title
-        self.tmpl.assign('error_comment', '')  # should be always defined!
-        self.tmpl.assign('MODE', page)  # current page identifier
-        self.tmpl.assign('sitecfg', self.cfg)
+    @cherrypy.expose()
+    def adm_esi_status(self, **params):
+        if not self.is_ip_admin():
+            return self.debugprint('Access denied', show_config=False, show_env=False)
+        msg = 'ESI error budget:\n'
+        msg += json.dumps(esi_calls.esi_budget.state(), indent=2) + '\n'
+        if self.kill_stream is not None:
+            msg += '\nKill stream: {} kills received, {} saved, {} fetched from ESI, {} with unknown location\n'.format(
+                self.kill_stream.num_received, self.kill_stream.num_saved,
+                self.kill_stream.num_fetched, self.kill_stream.num_unknown)
+        msg += '\nCircuit breakers:\n'
+        msg += json.dumps(http_client.breakers_info(), indent=2) + '\n'
+        return self.debugprint(msg, show_config=False, show_env=False)
+
+    def setup_template_vars(self, page: str = '') -> TemplateContext:
+        """
+        Create template variables context for current request, with common variables set
+        :param page: current page identifier
+        :return: new template context
+        """
+        ctx = TemplateContext()
+        ctx.assign('title', 'WHDBX')  # default title
+        ctx.assign('error_comment', '')  # should be always defined!
+        ctx.assign('MODE', page)  # current page identifier
+        ctx.assign('sitecfg', self.cfg)
         # assign EVE-SSO data defaults
-        self.tmpl.assign('HAVE_SSO_LOGIN', False)
-        self.tmpl.assign('SSO_TOKEN_EXPIRE_DT', '')
-        self.tmpl.assign('SSO_LOGIN_URL', self.cfg.sso_login_url(cherrypy.session['sso_state']))
-        self.tmpl.assign('SSO_CHAR_ID', '')
-        self.tmpl.assign('SSO_CHAR_NAME', '')
-        self.tmpl.assign('SSO_CORP_ID', '')
-        self.tmpl.assign('SSO_CORP_NAME', '')
-        self.tmpl.assign('SSO_SHIP_ID', '')
-        self.tmpl.assign('SSO_SHIP_NAME', '')
-        self.tmpl.assign('SSO_SHIP_TITLE', '')
-        self.tmpl.assign('SSO_SOLARSYSTEM_ID', '')
-        self.tmpl.assign('SSO_SOLARSYSTEM_NAME', '')
-        self.tmpl.assign('SSO_ONLINE', '')
+        ctx.assign('HAVE_SSO_LOGIN', False)
+        ctx.assign('SSO_TOKEN_EXPIRE_DT', '')
+        ctx.assign('SSO_LOGIN_URL', self.cfg.sso_login_url(cherrypy.session['sso_state']))
+        ctx.assign('SSO_CHAR_ID', '')
+        ctx.assign('SSO_CHAR_NAME', '')
+        ctx.assign('SSO_CORP_ID', '')
+        ctx.assign('SSO_CORP_NAME', '')
+        ctx.assign('SSO_SHIP_ID', '')
+        ctx.assign('SSO_SHIP_NAME', '')
+        ctx.assign('SSO_SHIP_TITLE', '')
+        ctx.assign('SSO_SOLARSYSTEM_ID', '')
+        ctx.assign('SSO_SOLARSYSTEM_NAME', '')
+        ctx.assign('SSO_ONLINE', '')
         if cherrypy.session['sso_token'] != '':
-            self.tmpl.assign('HAVE_SSO_LOGIN', True)
-            self.tmpl.assign('SSO_TOKEN_EXPIRE_DT',
+            ctx.assign('HAVE_SSO_LOGIN', True)
+            ctx.assign('SSO_TOKEN_EXPIRE_DT',
                 cherrypy.session['sso_expire_dt_utc'].strftime('%Y-%m-%dT%H:%M:%SZ'))
-            self.tmpl.assign('SSO_CHAR_ID', cherrypy.session['sso_char_id'])
-            self.tmpl.assign('SSO_CHAR_NAME', cherrypy.session['sso_char_name'])
-            self.tmpl.assign('SSO_CORP_ID', cherrypy.session['sso_corp_id'])
-            self.tmpl.assign('SSO_CORP_NAME', cherrypy.session['sso_corp_name'])
-            self.tmpl.assign('SSO_SHIP_ID', cherrypy.session['sso_ship_id'])
-            self.tmpl.assign('SSO_SHIP_NAME', cherrypy.session['sso_ship_name'])
-            self.tmpl.assign('SSO_SHIP_TITLE', cherrypy.session['sso_ship_title'])
-            self.tmpl.assign('SSO_SOLARSYSTEM_ID', cherrypy.session['sso_solarsystem_id'])
-            self.tmpl.assign('SSO_SOLARSYSTEM_NAME', cherrypy.session['sso_solarsystem_name'])
+            ctx.assign('SSO_CHAR_ID', cherrypy.session['sso_char_id'])
+            ctx.assign('SSO_CHAR_NAME', cherrypy.session['sso_char_name'])
+            ctx.assign('SSO_CORP_ID', cherrypy.session['sso_corp_id'])
+            ctx.assign('SSO_CORP_NAME', cherrypy.session['sso_corp_name'])
+            ctx.assign('SSO_SHIP_ID', cherrypy.session['sso_ship_id'])
+            ctx.assign('SSO_SHIP_NAME', cherrypy.session['sso_ship_name'])
+            ctx.assign('SSO_SHIP_TITLE', cherrypy.session['sso_ship_title'])
+            ctx.assign('SSO_SOLARSYSTEM_ID', cherrypy.session['sso_solarsystem_id'])
+            ctx.assign('SSO_SOLARSYSTEM_NAME', cherrypy.session['sso_solarsystem_name'])
         # this can be used in any page showing header.html, so set it here
-        self.tmpl.assign('last_visited_systems', list())  # empty list
+        ctx.assign('last_visited_systems', list())  # empty list
         # TODO: self.fill_last_visited_systems()
         # this can be used in every page with zkb_block, so set it here
-        self.tmpl.assign('zkb_block_title', '')
-        self.setup_locale()
+        ctx.assign('zkb_block_title', '')
+        self.setup_locale(ctx)
+        return ctx
 
-    def setup_locale(self):
+    def setup_locale(self, ctx: TemplateContext):
         selected_locale = self.get_selected_locale_code()
-        self.tmpl.assign('LOCALE', selected_locale)
-        self.tmpl.assign('SUPPORTED_LOCALES', self.tr.supported_locales)
-        self.tmpl.assign('tr', self.tr.get_translator(selected_locale))
+        ctx.assign('LOCALE', selected_locale)
+        ctx.assign('SUPPORTED_LOCALES', self.tr.supported_locales)
+        ctx.assign('tr', self.tr.get_translator(selected_locale))
+
+    def fetch_killmails(self, kills: list) -> dict:
+        """
+        Get killmails from ESI in parallel. Thread pool is shared by all requests,
+        so there are never more than ESI_MAX_PARALLEL requests to ESI at once
+        :param kills: list of tuples (kill_id, kill_hash)
+        :return: dict (kill_id, kill_hash) => killmail, only for successfully received killmails
+        """
+        ret = dict()
+        if not http_client.is_available('esi'):
+            # ESI is down; kills without cached killmails are not shown
+            return ret
+        futures = dict()
+        # workers get the same deadline as this request
+        get_killmail = deadline.bind(esi_calls.get_killmail_by_id_hash)
+        for kill_id, kill_hash in kills:
+            future = self.esi_executor.submit(get_killmail, self.cfg, kill_id, kill_hash)
+            futures[future] = (kill_id, kill_hash)
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=deadline.remaining()):
+                kill_id, kill_hash = futures[future]
+                try:
+                    killmail = future.result()
+                    if killmail:
+                        ret[(kill_id, kill_hash)] = killmail
+                except esi_calls.ESIException as ee:
+                    self.debuglog('ESI exception while getting kill mail: {}/{}: {}'.format(
+                        kill_id, kill_hash, ee.error_string()))
+        except concurrent.futures.TimeoutError:
+            # out of time, go on with killmails received so far
+            for future in futures:
+                future.cancel()
+            self.debuglog('Deadline exceeded, got {} of {} kill mails'.format(len(ret), len(kills)))
+        return ret
 
     def postprocess_zkb_kills(self, kills: list) -> list:
         """
@@ -383,42 +558,54 @@ class WhdbxApp:
         """
         try:
             utcnow = datetime.datetime.utcnow()
-            for a_kill in kills:
-                kill_id = a_kill['killmail_id']
-                kill_hash = a_kill['killmail_hash']
+            # get kill mails, first from cache, then all missing ones from ESI at once
+            kill_keys = [(str(a_kill['killmail_id']), str(a_kill['killmail_hash'])) for a_kill in kills]
+            killmails = self.killmails_cache.get_killmails(kill_keys)
+            missing = [kill_key for kill_key in kill_keys if kill_key not in killmails]
+            if len(missing) > 0:
+                fetched = self.fetch_killmails(missing)
+                self.killmails_cache.save_killmails(fetched)
+                killmails.update(fetched)
+            # kills without kill mail details cannot be shown
+            kills = [a_kill for a_kill, kill_key in zip(kills, kill_keys) if killmails.get(kill_key)]
+            kill_keys = [kill_key for kill_key in kill_keys if killmails.get(kill_key)]
+            for a_kill, kill_key in zip(kills, kill_keys):
+                killmail = killmails[kill_key]
+                # copy all keys
+                for k in killmail.keys():
+                    a_kill[k] = killmail[k]
+                # special processing for date/time of kill
+                a_kill['killmail_time'] = killmail['killmail_time']  # "2018-10-03T17:15:33Z"
+                a_kill['kill_dt'] = datetime.datetime(1970, 1, 1, 0, 0, 0, 0)
                 try:
-                    # get kill mail, try first from cache then from ESI
-                    killmail = self.killmails_cache.get_killmail(kill_id, kill_hash)
-                    if not killmail:
-                        killmail = esi_calls.get_killmail_by_id_hash(self.cfg, kill_id, kill_hash)
-                        if not killmail:
-                            continue
-                        # cache killmail
-                        self.killmails_cache.save_killmail(kill_id, kill_hash, killmail)
-
-                    # copy all keys
-                    for k in killmail.keys():
-                        a_kill[k] = killmail[k]
-                    # special processing for date/time of kill
-                    a_kill['killmail_time'] = killmail['killmail_time']  # "2018-10-03T17:15:33Z"
-                    a_kill['kill_dt'] = datetime.datetime(1970, 1, 1, 0, 0, 0, 0)
-                    try:
-                        a_kill['kill_dt'] = datetime.datetime.strptime(a_kill['killmail_time'], '%Y-%m-%dT%H:%M:%SZ')
-                    except ValueError:
-                        pass
-                    # now calculate how long ago it happened
-                    delta = utcnow - a_kill['kill_dt']
-                    a_kill['days_ago'] = delta.days
-                except esi_calls.ESIException as ee:
-                    self.debuglog('ESI exception while getting kill mail: {}/{}: {}'.format(
-                        kill_id, kill_hash, ee.error_string()))
+                    a_kill['kill_dt'] = datetime.datetime.strptime(a_kill['killmail_time'], '%Y-%m-%dT%H:%M:%SZ')
+                except ValueError:
+                    pass
+                # now calculate how long ago it happened
+                delta = utcnow - a_kill['kill_dt']
+                a_kill['days_ago'] = delta.days
+
+            # collect all type IDs and solarsystem IDs, to resolve them at once
+            typeids = set()
+            ssids = set()
+            for a_kill in kills:
+                if 'ship_type_id' in a_kill.get('victim', {}):
+                    typeids.add(a_kill['victim']['ship_type_id'])
+                for atk in a_kill.get('attackers', []):
+                    if 'ship_type_id' in atk:
+                        typeids.add(atk['ship_type_id'])
+                if 'solar_system_id' in a_kill:
+                    ssids.add(a_kill['solar_system_id'])
+            types_info = self.db.find_typeids(typeids)
+            ss_infos = self.db.find_ss_by_ids(ssids)
+            whsys_rows = self.db.query_wormholesystems_new(ssids)
 
             for a_kill in kills:
                 # find type name for victim ship
                 a_kill['victim']['ship_type_name'] = ''
                 a_kill['victim']['ship_group_name'] = ''
                 if 'ship_type_id' in a_kill['victim']:
-                    type_info = self.db.find_typeid(a_kill['victim']['ship_type_id'])
+                    type_info = types_info[a_kill['victim']['ship_type_id']]
                     a_kill['victim']['ship_type_name'] = type_info['name']
                     a_kill['victim']['ship_group_name'] = type_info['groupname']
                 if 'character_id' not in a_kill['victim']:
@@ -435,7 +622,7 @@ class WhdbxApp:
                     # find type name for attacker ship
                     atk['ship_type_name'] = ''
                     if 'ship_type_id' in atk:
-                        type_info = self.db.find_typeid(atk['ship_type_id'])
+                        type_info = types_info[atk['ship_type_id']]
                         atk['ship_type_name'] = type_info['name']
                     else:
                         atk['ship_type_id'] = 0
@@ -458,13 +645,13 @@ class WhdbxApp:
                 a_kill['solar_system_security'] = 0.0
                 a_kill['solar_system_security_color'] = '#FFFFFF'
                 a_kill['solar_system_whclass'] = ''
-                ss_info = self.db.find_ss_by_id(a_kill['solar_system_id'])
+                ss_info = ss_infos.get(a_kill['solar_system_id'])
                 if ss_info is not None:
                     a_kill['solar_system_name'] = ss_info['name']
                     a_kill['solar_system_region'] = ss_info['regionname']
                     a_kill['solar_system_security'] = ss_info['security']
                     a_kill['solar_system_security_color'] = get_ss_security_color(ss_info['security'])
-                whsys_row = self.db.query_wormholesystem_new(a_kill['solar_system_id'])
+                whsys_row = whsys_rows.get(a_kill['solar_system_id'])
                 if whsys_row is not None:
                     a_kill['solar_system_whclass'] = WHClass.to_string(int(whsys_row[0]))
                 # calc final blow
@@ -490,7 +677,7 @@ class WhdbxApp:
     @cherrypy.expose()
     def index(self):
         self.init_session()
-        self.setup_template_vars('index')
+        ctx = self.setup_template_vars('index')
 
         # ZKB stuff removed, async AJAX loader will be used instead
         #zkb = ZKB(self.zkb_options)
@@ -502,60 +689,64 @@ class WhdbxApp:
         #wspace_kills = zkb.go()
         #wspace_kills = self.postprocess_zkb_kills(wspace_kills)
 
-        #self.tmpl.assign('zkb_kills', wspace_kills)
-        #self.tmpl.assign('zkb_block_title', 'W-Space kills')
-        #self.tmpl.assign('dbg_wspace_kills', dump_object(wspace_kills))
+        #ctx.assign('zkb_kills', wspace_kills)
+        #ctx.assign('zkb_block_title', 'W-Space kills')
+        #ctx.assign('dbg_wspace_kills', dump_object(wspace_kills))
         #
-        return self.tmpl.render('index.html')
+        return self.tmpl.render('index.html', ctx)
 
     @cherrypy.expose()
+    @page_cached
     def effects(self):
         self.init_session()
-        self.setup_template_vars('effects')
+        ctx = self.setup_template_vars('effects')
         translator = self.tr.get_translator(self.get_selected_locale_code())
         effs = self.db.select_all_effects()
-        self.tmpl.assign('effects', effs)
-        self.tmpl.assign('title', translator.gettext('Effects') + ' - WHDBX')
-        return self.tmpl.render('effects.html')
+        ctx.assign('effects', effs)
+        ctx.assign('title', translator.gettext('Effects') + ' - WHDBX')
+        return self.tmpl.render('effects.html', ctx)
 
     @cherrypy.expose()
+    @page_cached
     def wh_colors(self):
         self.init_session()
-        self.setup_template_vars('wh_colors')
+        ctx = self.setup_template_vars('wh_colors')
         translator = self.tr.get_translator(self.get_selected_locale_code())
-        self.tmpl.assign('title', translator.gettext('WH Colors') + ' - WHDBX')
-        return self.tmpl.render('wh_colors.html')
+        ctx.assign('title', translator.gettext('WH Colors') + ' - WHDBX')
+        return self.tmpl.render('wh_colors.html', ctx)
 
     @cherrypy.expose()
+    @page_cached
     def sleepers(self, **params):
         self.init_session()
-        self.setup_template_vars('sleepers')
+        ctx = self.setup_template_vars('sleepers')
         translator = self.tr.get_translator(self.get_selected_locale_code())
         sleeper = WHSleeper()
-        self.tmpl.assign('sleeper', sleeper)
+        ctx.assign('sleeper', sleeper)
         if 'id' in params:
             sleeper_id = int(params['id'])
             sleeper.load_info(sleeper_id, self.db)
-            self.tmpl.assign('MODE', 'single_sleeper')
-            self.tmpl.assign('title', sleeper.name + ' - WHDBX')
-            self.tmpl.assign('class_sleepers', self.db.query_sleeper_by_class(sleeper.wh_class_str))
-            self.tmpl.assign('sleepers_c12', list())
-            self.tmpl.assign('sleepers_c34', list())
-            self.tmpl.assign('sleepers_c56', list())
+            ctx.assign('MODE', 'single_sleeper')
+            ctx.assign('title', sleeper.name + ' - WHDBX')
+            ctx.assign('class_sleepers', self.db.query_sleeper_by_class(sleeper.wh_class_str))
+            ctx.assign('sleepers_c12', list())
+            ctx.assign('sleepers_c34', list())
+            ctx.assign('sleepers_c56', list())
         else:
-            self.tmpl.assign('title', translator.gettext('Sleepers') + ' - WHDBX')
-            self.tmpl.assign('class_sleepers', list())
-            self.tmpl.assign('sleepers_c12', self.db.query_sleeper_by_class('1,2'))
-            self.tmpl.assign('sleepers_c34', self.db.query_sleeper_by_class('3,4'))
-            self.tmpl.assign('sleepers_c56', self.db.query_sleeper_by_class('5,6'))
-        return self.tmpl.render('sleeper.html')
+            ctx.assign('title', translator.gettext('Sleepers') + ' - WHDBX')
+            ctx.assign('class_sleepers', list())
+            ctx.assign('sleepers_c12', self.db.query_sleeper_by_class('1,2'))
+            ctx.assign('sleepers_c34', self.db.query_sleeper_by_class('3,4'))
+            ctx.assign('sleepers_c56', self.db.query_sleeper_by_class('5,6'))
+        return self.tmpl.render('sleeper.html', ctx)
 
     @cherrypy.expose()
+    @request_deadline('signatures')
     def signatures(self, **params):
         self.init_session()
-        self.setup_template_vars('signatures')
+        ctx = self.setup_template_vars('signatures')
         translator = self.tr.get_translator(self.get_selected_locale_code())
-        self.tmpl.assign('title', translator.gettext('Signatures') + ' - WHDBX')
+        ctx.assign('title', translator.gettext('Signatures') + ' - WHDBX')
         #
         sig_id = -1
         if 'id' in params:
@@ -565,71 +756,73 @@ class WhdbxApp:
                 sig_id = -1
         # default vars
         sig = WHSignature(self.cfg)
-        self.tmpl.assign('sig', sig)
-        self.tmpl.assign('sig_dbg', None)
-        self.tmpl.assign('sigs', list())
+        ctx.assign('sig', sig)
+        ctx.assign('sig_dbg', None)
+        ctx.assign('sigs', list())
         # params
         if sig_id > 0:
             sig.load(sig_id, self.db)
             if sig.is_valid():
-                self.tmpl.assign('title', sig.name + ' - WHDBX')
-                self.tmpl.assign('MODE', 'single_signature')
+                ctx.assign('title', sig.name + ' - WHDBX')
+                ctx.assign('MODE', 'single_signature')
                 if sig.wh_class != 0:
-                    self.tmpl.assign('sigs', self.db.query_signatures_for_class(sig.wh_class, True))
+                    ctx.assign('sigs', self.db.query_signatures_for_class(sig.wh_class, True))
                 if sig.wh_class == 0:  # ore site or gas site
                     if sig.sig_type == 'gas':
-                        self.tmpl.assign('sigs', self.db.query_gas_signatures(True))
+                        ctx.assign('sigs', self.db.query_gas_signatures(True))
                     elif sig.sig_type == 'ore':
-                        self.tmpl.assign('sigs', self.db.query_ore_signatures(True))
-            self.tmpl.assign('sigs_c1', list())
-            self.tmpl.assign('sigs_c2', list())
-            self.tmpl.assign('sigs_c3', list())
-            self.tmpl.assign('sigs_c4', list())
-            self.tmpl.assign('sigs_c5', list())
-            self.tmpl.assign('sigs_c6', list())
-            self.tmpl.assign('sigs_gas', list())
-            self.tmpl.assign('sigs_ore', list())
-            self.tmpl.assign('sigs_thera', list())
+                        ctx.assign('sigs', self.db.query_ore_signatures(True))
+            ctx.assign('sigs_c1', list())
+            ctx.assign('sigs_c2', list())
+            ctx.assign('sigs_c3', list())
+            ctx.assign('sigs_c4', list())
+            ctx.assign('sigs_c5', list())
+            ctx.assign('sigs_c6', list())
+            ctx.assign('sigs_gas', list())
+            ctx.assign('sigs_ore', list())
+            ctx.assign('sigs_thera', list())
         else:
-            self.tmpl.assign('sigs_c1', self.db.query_signatures_for_class(1, True))
-            self.tmpl.assign('sigs_c2', self.db.query_signatures_for_class(2, True))
-            self.tmpl.assign('sigs_c3', self.db.query_signatures_for_class(3, True))
-            self.tmpl.assign('sigs_c4', self.db.query_signatures_for_class(4, True))
-            self.tmpl.assign('sigs_c5', self.db.query_signatures_for_class(5, True))
-            self.tmpl.assign('sigs_c6', self.db.query_signatures_for_class(6, True))
-            self.tmpl.assign('sigs_gas', self.db.query_gas_signatures(True))
-            self.tmpl.assign('sigs_ore', self.db.query_ore_signatures(True))
-            self.tmpl.assign('sigs_thera', self.db.query_signatures_for_class(WHClass.THERA_WH_CLASS, True))
+            ctx.assign('sigs_c1', self.db.query_signatures_for_class(1, True))
+            ctx.assign('sigs_c2', self.db.query_signatures_for_class(2, True))
+            ctx.assign('sigs_c3', self.db.query_signatures_for_class(3, True))
+            ctx.assign('sigs_c4', self.db.query_signatures_for_class(4, True))
+            ctx.assign('sigs_c5', self.db.query_signatures_for_class(5, True))
+            ctx.assign('sigs_c6', self.db.query_signatures_for_class(6, True))
+            ctx.assign('sigs_gas', self.db.query_gas_signatures(True))
+            ctx.assign('sigs_ore', self.db.query_ore_signatures(True))
+            ctx.assign('sigs_thera', self.db.query_signatures_for_class(WHClass.THERA_WH_CLASS, True))
         # debug mode
         if self.cfg.DEBUG:
-            self.tmpl.assign('sig_dbg', dump_object(sig))
-        return self.tmpl.render('signature.html')
+            ctx.assign('sig_dbg', dump_object(sig))
+        return self.tmpl.render('signature.html', ctx)
 
     @cherrypy.expose()
+    @page_cached
     def whdb(self):
         self.init_session()
-        self.setup_template_vars('whdb')
+        ctx = self.setup_template_vars('whdb')
         translator = self.tr.get_translator(self.get_selected_locale_code())
-        self.tmpl.assign('title', translator.gettext('WH Database') +  ' - WHDBX')
-        return self.tmpl.render('whdb.html')
+        ctx.assign('title', translator.gettext('WH Database') +  ' - WHDBX')
+        return self.tmpl.render('whdb.html', ctx)
 
     @cherrypy.expose()
+    @page_cached
     def about(self):
         self.init_session()
-        self.setup_template_vars('about')
+        ctx = self.setup_template_vars('about')
         selected_locale = self.get_selected_locale_code()
         tr = self.tr.get_translator(selected_locale)
-        self.tmpl.assign('title', tr.gettext('About project') + ' - WHDBX')
-        return self.tmpl.render('about_' + selected_locale + '.html')
+        ctx.assign('title', tr.gettext('About project') + ' - WHDBX')
+        return self.tmpl.render('about_' + selected_locale + '.html', ctx)
 
     @cherrypy.expose()
     def eve_sso_help(self):
         self.init_session()
-        self.setup_template_vars('eve_sso_help')
+        ctx = self.setup_template_vars('eve_sso_help')
         selected_locale = self.get_selected_locale_code()
         tr = self.tr.get_translator(selected_locale)
-        self.tmpl.assign('title', tr.gettext('About EVE-SSO') + ' - WHDBX')
-        return self.tmpl.render('eve_sso_help_' + selected_locale + '.html')
+        ctx.assign('title', tr.gettext('About EVE-SSO') + ' - WHDBX')
+        return self.tmpl.render('eve_sso_help_' + selected_locale + '.html', ctx)
 
     @cherrypy.expose()
     def logout(self):
@@ -642,21 +835,20 @@ class WhdbxApp:
     @cherrypy.expose()
     def ss(self, jsystem):
         self.init_session()
-        self.setup_template_vars('ss')
+        ctx = self.setup_template_vars('ss')
         #
         # find solarsystem
         ss_info = self.db.find_ss_by_name(jsystem)
         if ss_info is None:
-            return self.display_failure('Solar system not found: {}'.format(jsystem))
+            return self.display_failure('Solar system not found: {}'.format(jsystem), ctx)
         ssid = ss_info['id']
         #
         # find whsystem
         whsys = WHSystem(self.db)
         whsys.query_info(ssid)
         if whsys.name != '':
-            self.tmpl.assign('title', whsys.name + ' - WHDBX')
-            # whsys.query_trade_routes(self.cfg)
-            # ^^ With Eve-Central dead, we have no easy way to get trade routes
+            ctx.assign('title', whsys.name + ' - WHDBX')
+            whsys.query_trade_routes()
         #
         # WH signatures
         sigs = []
@@ -664,17 +856,17 @@ class WhdbxApp:
             sigs = self.db.query_signatures_for_class(whsys.wh_class, True)
         #
         # assign template vars
-        self.tmpl.assign('whsys', whsys)
-        self.tmpl.assign('utcnow', datetime.datetime.utcnow())
-        self.tmpl.assign('sigs', sigs)
+        ctx.assign('whsys', whsys)
+        ctx.assign('utcnow', datetime.datetime.utcnow())
+        ctx.assign('sigs', sigs)
         if self.cfg.DEBUG:
-            self.tmpl.assign('whsys_dbg', dump_object(whsys))
-        return self.tmpl.render('whsystem_info.html')
+            ctx.assign('whsys_dbg', dump_object(whsys))
+        return self.tmpl.render('whsystem_info.html', ctx)
 
     @cherrypy.expose()
+    @request_deadline('eve_sso_callback')
     def eve_sso_callback(self, code, state):
         self.init_session()
-        self.tmpl.unassign_all()
 
         # verify that saved state == received state
         saved_state = cherrypy.session.get('sso_state')
@@ -685,15 +877,16 @@ class WhdbxApp:
         # Now we have an auth code, it's time to obtain an access token.
         # the authorization code is single use only.
 
+        sso_client = esi_calls.sso_client(self.cfg)
         try:
-            r = requests.post('https://login.eveonline.com/oauth/token',
-                              auth=(self.cfg.SSO_CLIENT_ID, self.cfg.SSO_SECRET_KEY),
-                              headers={
-                                  'Content-Type': 'application/x-www-form-urlencoded',
-                                  'User-Agent': self.cfg.SSO_USER_AGENT
-                              },
-                              data={'grant_type': 'authorization_code', 'code': code},
-                              timeout=10)
+            r = sso_client.post('https://login.eveonline.com/oauth/token',
+                                auth=(self.cfg.SSO_CLIENT_ID, self.cfg.SSO_SECRET_KEY),
+                                headers={
+                                    'Content-Type': 'application/x-www-form-urlencoded',
+                                    'User-Agent': self.cfg.SSO_USER_AGENT
+                                },
+                                data={'grant_type': 'authorization_code', 'code': code},
+                                timeout=10)
         except requests.exceptions.RequestException as req_e:
             return self.display_failure('Error during communication to '
                                         'login.eveonline.com (get token): <br />' + str(req_e))
@@ -726,12 +919,12 @@ class WhdbxApp:
         try:
             # special request to EVE-SSO login site to get char ID & name (not part of OAuth2 protocol)
             # see http://eveonline-third-party-documentation.readthedocs.io/en/latest/sso/obtaincharacterid.html
-            r = requests.get('https://login.eveonline.com/oauth/verify',
-                             headers={
-                                 'Authorization': 'Bearer ' + access_token,
-                                 'User-Agent': self.cfg.SSO_USER_AGENT
-                             },
-                             timeout=10)
+            r = sso_client.get('https://login.eveonline.com/oauth/verify',
+                               headers={
+                                   'Authorization': 'Bearer ' + access_token,
+                                   'User-Agent': self.cfg.SSO_USER_AGENT
+                               },
+                               timeout=10)
         except requests.exceptions.RequestException as req_e:
             return self.display_failure('Error during communication to '
                                         'login.eveonline.com (get character info): <br />' + str(req_e))
@@ -875,130 +1068,18 @@ class WhdbxApp:
 
     def ajax_whdb_query(self, **params) -> dict:
         # QUERY_PARAMS= {'whdb': ['1'], 'class': ['5', '6', 'shattered', 'frigwr']}
-        res = dict()
-        res['systems'] = []
-        s3conn = self.db.connection_handle()
-        q = 'SELECT solarsystemid, system, class, star, planets, moons, effect, statics \n'
-        q += ' FROM wormholesystems_new'
-        class_cond = ''
-        eff_cond = ''
-        static_cond = ''
-
-        if 'class' in params:
-            class_list = params['class']  # it can be single value, str...
-            if type(class_list) == str:
-                class_list = [class_list]
-            for class_str in class_list:
-                # first, optionally append " OR " to sql query
-                if len(class_cond) > 0:
-                    class_cond += ' OR '
-                # determine if class_str is integer
-                iclass = 0
-                try:
-                    iclass = int(class_str)
-                except ValueError:
-                    pass
-                if iclass != 0:
-                    # for all numeric classes, 1, 2, 3, -1, -2, -3, ...
-                    class_cond += ('(class=' + str(iclass) + ')')
-                else:
-                    # special cases for string specifiers
-                    if class_str == 'frigwr':
-                        class_cond += '(class=13)'
-                    elif class_str == 'drifters':
-                        # drifters WH have several classes: 14, 15, 16, 17, 18
-                        class_cond += '((class >= 14) AND (class <= 18))'
-        if 'effect' in params:
-            eff_list = params['effect']
-            if type(eff_list) == str:
-                eff_list = [eff_list]
-            for eff in eff_list:
-                if len(eff_cond) > 0:
-                    eff_cond += ' OR '
-                if eff == 'noeffect':
-                    eff_cond += '(effect IS NULL)'
-                elif eff == 'bh':
-                    eff_cond += '(effect=\'Black Hole\')'
-                elif eff == 'cv':
-                    eff_cond += '(effect=\'Cataclysmic Variable\')'
-                elif eff == 'mag':
-                    eff_cond += '(effect=\'Magnetar\')'
-                elif eff == 'pul':
-                    eff_cond += '(effect=\'Pulsar\')'
-                elif eff == 'rg':
-                    eff_cond += '(effect=\'Red Giant\')'
-                elif eff == 'wr':
-                    eff_cond += '(effect=\'Wolf-Rayet Star\')'
-        if 'in_class' in params:
-            in_class_list = params['in_class']
-            icl = ''
-            for ic in in_class_list:
-                if ic.isnumeric():
-                    if icl != '':
-                        icl += ' OR '
-                    icl += ('in_class=' + ic)
-            if icl != '':
-                q2 = 'SELECT hole FROM wormholeclassifications WHERE '
-                q2 += icl
-                hole_list = []
-                cur2 = s3conn.cursor()
-                cur2.execute(q2)
-                for row in cur2:
-                    hole_list.append(row[0])
-                    if static_cond != '':
-                        static_cond += ' OR '
-                    static_cond += '(statics LIKE \'%' + row[0] + '%\')'
-        # finalize query
-        where_cond = ''
-        if class_cond != '':
-            where_cond += '(' + class_cond + ')'
-        if eff_cond != '':
-            if where_cond != '':
-                where_cond += ' AND '
-            where_cond += '(' + eff_cond + ')'
-        if static_cond != '':
-            if where_cond != '':
-                where_cond += ' AND '
-            where_cond += '(' + static_cond + ')'
-        if where_cond != '':
-            q += '\n WHERE ' + where_cond
-
-        self.debuglog('whdb: query:' + q)
-
-        cursor = s3conn.cursor()
-        cursor.execute(q)
-        for row in cursor:
-            jsys = dict()
-            # solarsystemid, system, class, star, planets, moons, effect, statics
-            jsys['id'] = int(row[0])
-            jsys['name'] = row[1]
-            jsys['class'] = int(row[2])
-            jsys['star'] = row[3]  # not very needed
-            jsys['planets'] = int(row[4])  # not very needed
-            jsys['moons'] = int(row[5])  # not very needed
-            jsys['effect'] = row[6]
-            jsys['statics'] = []
-            for st in str(row[7]).split(','):
-                jsys['statics'].append(st)
-            res['systems'].append(jsys)
-        res['query'] = q
-        cursor.close()
-
-        # also fetch statics destinations classes
-        for jsys in res['systems']:
-            for i in range(0, len(jsys['statics'])):
-                st_name = jsys['statics'][i]
-                cursor = s3conn.cursor()
-                q = 'SELECT in_class FROM wormholeclassifications WHERE hole = ?'
-                cursor.execute(q, (st_name, ))
-                row = cursor.fetchone()
-                if row:
-                    st_spec = '{} {}'.format(st_name, WHClass.to_string(row[0]))
-                    jsys['statics'][i] = st_spec
-                cursor.close()
-
+        # in-memory filter is rebuilt only when static data snapshot is reloaded
+        snap = self.db.static_data()
+        whdb_filter = self._whdb_filter
+        if (whdb_filter is None) or (whdb_filter.version != snap.version):
+            whdb_filter = WHDBFilter(snap)
+            self._whdb_filter = whdb_filter
+        res = whdb_filter.query(params)
+        self.debuglog('whdb: query: {} => {} systems'.format(
+            {facet: params[facet] for facet in WHDBFilter.FACETS if facet in params}, len(res['systems'])))
         return res
 
+    @request_deadline('sso_refresh_token')
     def ajax_sso_call_refresh_token(self) -> dict:
         self.debuglog('ajax: sso_refresh_token: start refresh')
         res = {
@@ -1026,6 +1107,7 @@ class WhdbxApp:
         del res['del']  # these values should not go exposed
         return res
 
+    @request_deadline('esi_call')
     def ajax_esi_call_public_data(self) -> dict:
         self.debuglog('ajax: esi_call_public_data: start')
         # AJAX JSON return structure
@@ -1058,6 +1140,7 @@ class WhdbxApp:
             self.debuglog('ajax: esi_call_public_data: error:' + ret['error'])
         return ret
 
+    @request_deadline('esi_call')
     def ajax_esi_call_location_ship(self) -> dict:
         self.debuglog('ajax: ajax_esi_call_location_ship: start')
         ret = {
@@ -1088,6 +1171,7 @@ class WhdbxApp:
         self.debuglog('ajax: ajax_esi_call_location_ship: success')
         return ret
 
+    @request_deadline('esi_call')
     def ajax_esi_call_location_online(self) -> dict:
         self.debuglog('ajax: ajax_esi_call_location_online: start')
         ret = {
@@ -1114,6 +1198,7 @@ class WhdbxApp:
             self.debuglog('ajax: ajax_esi_call_location_online: error: ' + ret['error'])
         return ret
 
+    @request_deadline('esi_call')
     def ajax_esi_call_location_location(self) -> dict:
         self.debuglog('ajax: ajax_esi_call_location_location: start')
         ret = {
@@ -1151,6 +1236,7 @@ class WhdbxApp:
         self.debuglog('ajax: ajax_esi_call_location_location: success')
         return ret
 
+    @request_deadline('esi_call')
     def ajax_esi_call_ui_open_window_information(self, target_id: int) -> dict:
         self.debuglog('ajax: ajax_esi_call_ui_open_window_information: {} start'.format(target_id))
         ret = {
@@ -1172,32 +1258,88 @@ class WhdbxApp:
             self.debuglog('ajax: ajax_esi_call_ui_open_window_information: error: {}'.format(ret['error']))
         return ret
 
-    def ajax_zkb_block(self, **params) -> str:
-        # return ready-to-render HTML block
-        ssid = str(params['ssid'])
-        # common init
-        self.init_session()
-        self.setup_template_vars('zkb_block')
-        # ZKB
+    def load_zkb_kills(self, ssid: str, refresh: bool = False) -> tuple:
+        """
+        Get kills for kills block from zkillboard and fill in their details;
+        result does not depend on language, so it can be rendered for every locale
+        :param ssid: solarsystem ID, or 'w-space'
+        :param refresh: do not use ZKB reply from cache
+        :return: tuple (kills list, is_fresh); is_fresh is False if kills come from
+                 expired ZKB reply or partial data, and block should not be cached
+        """
         zkb = ZKB(self.zkb_options)
         if ssid == 'w-space':
             zkb.add_wspace()
-            self.tmpl.assign('zkb_block_title', 'W-Space kills')
-            self.tmpl.assign('zkb_ssid', 0)
         else:
             zkb.add_solarSystem(int(ssid))
-            self.tmpl.assign('zkb_block_title', '')
-            self.tmpl.assign('zkb_ssid', int(ssid))
         # zkb.add_limit(30) # Zkillboard has disabled 'limit' parameter for all users:
         # '{"error":"Due to abuse of the limit parameter to avoid caches
         #  the ability to modify limit has been revoked for all users"}'
-        # FIXME: temporarily disabled ZKB block because ZKB API is now broken
-        #zkb_kills = []
-        zkb_kills = zkb.go()
+        zkb_kills = zkb.go(refresh)
+        num_kills = len(zkb_kills)
         zkb_kills = self.postprocess_zkb_kills(zkb_kills)
-        self.tmpl.assign('zkb_kills', zkb_kills)
-        #
-        return self.tmpl.render('zkb_block.html')
+        is_fresh = not zkb.is_stale and not deadline.expired()
+        # while ESI is down, only kills with cached killmails are left;
+        # do not keep such block, show all kills as soon as ESI is back
+        if (len(zkb_kills) < num_kills) and not http_client.is_available('esi'):
+            is_fresh = False
+        return zkb_kills, is_fresh
+
+    def render_zkb_block(self, ssid: str, locale: str, refresh: bool = False, loaded: tuple = None) -> tuple:
+        """
+        Render kills block; does not use session, so can be called from background thread
+        :param ssid: solarsystem ID, or 'w-space'
+        :param locale: language to render in
+        :param refresh: do not use ZKB reply from cache
+        :param loaded: result of load_zkb_kills() for this ssid, if it was already called
+        :return: tuple (html, number of kills, is_fresh); is_fresh is False if block was
+                 rendered from expired ZKB reply or partial data, and should not be cached
+        """
+        if loaded is None:
+            loaded = self.load_zkb_kills(ssid, refresh)
+        zkb_kills, is_fresh = loaded
+        ctx = TemplateContext()
+        ctx.assign('sitecfg', self.cfg)
+        ctx.assign('LOCALE', locale)
+        ctx.assign('tr', self.tr.get_translator(locale))
+        if ssid == 'w-space':
+            ctx.assign('zkb_block_title', 'W-Space kills')
+            ctx.assign('zkb_ssid', 0)
+        else:
+            ctx.assign('zkb_block_title', '')
+            ctx.assign('zkb_ssid', int(ssid))
+        ctx.assign('zkb_kills', zkb_kills)
+        return self.tmpl.render('zkb_block.html', ctx), len(zkb_kills), is_fresh
+
+    @request_deadline('zkb_block')
+    def ajax_zkb_block(self, **params) -> str:
+        # return ready-to-render HTML block
+        ssid = str(params['ssid'])
+        if ssid != 'w-space':
+            ssid = str(int(ssid))
+        # common init
+        self.init_session()
+        # the same block is shown to everyone, only language differs
+        cache_key = (ssid, self.get_selected_locale_code())
+        if self.zkb_refresher is not None:
+            self.zkb_refresher.record_view(cache_key)
+        html, expired = self.zkb_block_cache.get_stale(cache_key)
+        if html is not None:
+            if not expired:
+                return html
+            # zkillboard is down, do not even try; old kills are better than none
+            if not http_client.is_available('zkb'):
+                return html
+            # stale-while-revalidate: hot blocks are re-rendered by background refresher
+            if (self.zkb_refresher is not None) and self.zkb_refresher.is_hot(cache_key):
+                self.zkb_refresher.wakeup()
+                return html
+        html, num_kills, is_fresh = self.render_zkb_block(cache_key[0], cache_key[1])
+        # do not keep "ZKB API is broken" message, or block rendered
+        # in a hurry from partial or old data, for the whole cache time
+        if (num_kills > 0) and is_fresh:
+            self.zkb_block_cache.put(cache_key, html)
+        return html
 
 
 if __name__ == '__main__':
@@ -1217,6 +1359,7 @@ if __name__ == '__main__':
         'server.socket_host': args.host,
         'server.socket_port': args.port,
         'engine.autoreload.on': args.autoreload,
+        'server.thread_pool': SiteConfig().SERVER_THREAD_POOL,
         'log.screen': False
     })
 
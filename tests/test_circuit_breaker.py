@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import mock
+
+import requests.exceptions
+
+from classes.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class _Clock:
+    """
+    Replaces time module in tested module, only monotonic() is used
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        patcher = mock.patch('classes.circuit_breaker.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=30)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()  # resets counter
+        self.open_breaker()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(self.breaker.is_open())
+        self.assertFalse(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        info = self.breaker.info()
+        self.assertEqual(info['state'], CircuitBreaker.OPEN)
+        self.assertEqual(info['consecutive_failures'], 3)
+        self.assertEqual(info['times_opened'], 1)
+        self.assertEqual(info['rejected'], 2)
+
+    def test_half_open_probe_success(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.is_open())
+        # only one probe request is let through
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_probe_failure(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        # a single failed probe opens circuit again, for full reset_timeout
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.clock.now += 1
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.info()['times_opened'], 2)
+
+    def test_release_probe(self):
+        self.open_breaker()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        # probe result says nothing about upstream, next request may probe again
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_disabled(self):
+        breaker = CircuitBreaker('test', failure_threshold=0)
+        for _ in range(100):
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_error_type(self):
+        # handled by all code that handles network errors
+        self.assertTrue(issubclass(CircuitOpenError, requests.exceptions.ConnectionError))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from classes.database import SiteDbConnectionPool
+
+
+def make_db(filename: str, value: int) -> None:
+    conn = sqlite3.connect(filename)
+    conn.execute('CREATE TABLE t (v INTEGER)')
+    conn.execute('INSERT INTO t VALUES (?)', (value, ))
+    conn.commit()
+    conn.close()
+
+
+def read_value(pool: SiteDbConnectionPool) -> int:
+    return pool.reader().execute('SELECT v FROM t').fetchone()[0]
+
+
+class TestSiteDbConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_filename = os.path.join(self.tmpdir.name, 'eve.db')
+        make_db(self.db_filename, 1)
+        self.pool = SiteDbConnectionPool(self.db_filename)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_reader_per_thread(self):
+        conns = []
+        t = threading.Thread(target=lambda: conns.append(self.pool.reader()))
+        t.start()
+        t.join()
+        self.assertIs(self.pool.reader(), self.pool.reader())
+        self.assertIsNot(self.pool.reader(), conns[0])
+
+    def test_own_write_reopens_readers(self):
+        version = self.pool.db_version()
+        self.assertEqual(read_value(self.pool), 1)
+        self.pool.execute_write('UPDATE t SET v = ?', (2, ))
+        self.assertNotEqual(self.pool.db_version(), version)
+        self.assertEqual(read_value(self.pool), 2)
+
+    def test_replaced_file_reopens_readers(self):
+        version = self.pool.db_version()
+        self.assertEqual(read_value(self.pool), 1)
+        new_filename = os.path.join(self.tmpdir.name, 'eve_new.db')
+        make_db(new_filename, 3)
+        os.replace(new_filename, self.db_filename)
+        self.assertNotEqual(self.pool.db_version(), version)
+        self.assertEqual(read_value(self.pool), 3)
+
+    def test_version_is_stable(self):
+        self.assertEqual(self.pool.db_version(), self.pool.db_version())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+import requests.exceptions
+
+from classes import deadline
+from classes.single_flight import SingleFlight
+
+
+class TestDeadline(unittest.TestCase):
+    def test_no_deadline(self):
+        self.assertIsNone(deadline.current())
+        self.assertIsNone(deadline.remaining())
+        self.assertFalse(deadline.expired())
+        self.assertEqual(deadline.cap_timeout(10), 10)
+        self.assertIsNone(deadline.cap_timeout(None))
+        with deadline.Deadline(0) as dl:
+            self.assertIs(deadline.current(), dl)
+            self.assertIsNone(deadline.remaining())
+            self.assertEqual(deadline.cap_timeout(10), 10)
+
+    def test_cap_timeout(self):
+        with deadline.Deadline(5) as dl:
+            self.assertIs(deadline.current(), dl)
+            self.assertLessEqual(deadline.remaining(), 5)
+            self.assertGreater(deadline.remaining(), 4)
+            self.assertEqual(deadline.cap_timeout(1), 1)
+            self.assertLessEqual(deadline.cap_timeout(60), 5)
+            self.assertLessEqual(deadline.cap_timeout(None), 5)
+        self.assertIsNone(deadline.current())
+
+    def test_expired(self):
+        with deadline.Deadline(0.01) as dl:
+            time.sleep(0.05)
+            self.assertTrue(dl.expired())
+            self.assertTrue(deadline.expired())
+            self.assertEqual(deadline.remaining(), 0)
+            with self.assertRaises(deadline.DeadlineExceeded):
+                deadline.cap_timeout(10)
+        # handled as any other network timeout
+        self.assertTrue(issubclass(deadline.DeadlineExceeded, requests.exceptions.Timeout))
+
+    def test_nested(self):
+        with deadline.Deadline(60) as outer:
+            with deadline.Deadline(5) as inner:
+                self.assertIs(deadline.current(), inner)
+            self.assertIs(deadline.current(), outer)
+            with self.assertRaises(KeyError):
+                with deadline.Deadline(1):
+                    raise KeyError('x')
+            self.assertIs(deadline.current(), outer)
+
+    def test_thread_local(self):
+        seen = []
+        with deadline.Deadline(5):
+            t = threading.Thread(target=lambda: seen.append(deadline.current()))
+            t.start()
+            t.join()
+        self.assertEqual(seen, [None])
+
+    def test_bind(self):
+        seen = []
+
+        def func(x):
+            seen.append((x, deadline.current()))
+            return x * 2
+
+        self.assertIs(deadline.bind(func), func)
+        with deadline.Deadline(5) as dl:
+            bound = deadline.bind(func)
+        # bound function runs under deadline of the thread that bound it
+        t = threading.Thread(target=bound, args=(21,))
+        t.start()
+        t.join()
+        self.assertEqual(seen, [(21, dl)])
+        self.assertEqual(bound(1), 2)
+        self.assertIsNone(deadline.current())
+
+class TestCoalescedCallDeadline(unittest.TestCase):
+    def test_follower_returns_within_budget(self):
+        sf = SingleFlight()
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow_refresh():
+            started.set()
+            release.wait(10)
+            return 'kills'
+
+        # background refresher: no deadline, long upstream timeout
+        leader = threading.Thread(target=sf.do, args=('key', slow_refresh))
+        leader.start()
+        self.assertTrue(started.wait(5))
+        try:
+            start_time = time.monotonic()
+            with deadline.Deadline(0.2):
+                with self.assertRaises(deadline.DeadlineExceeded):
+                    sf.do('key', slow_refresh)
+            self.assertLess(time.monotonic() - start_time, 1)
+        finally:
+            release.set()
+            leader.join(5)
+        # refresher itself is not affected
+        self.assertEqual(sf.in_flight(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import email.utils
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from classes import esi_cache
+from classes.esi_cache import EsiCacheEntry
+
+
+class TestParseExpires(unittest.TestCase):
+    def test_counted_from_date(self):
+        # server clock is one hour behind, response is fresh for 60 seconds
+        server_now = time.time() - 3600
+        headers = {
+            'date': email.utils.formatdate(server_now, usegmt=True),
+            'expires': email.utils.formatdate(server_now + 60, usegmt=True)
+        }
+        self.assertAlmostEqual(esi_cache.parse_expires(headers), time.time() + 60, delta=2)
+
+    def test_without_date(self):
+        expires = time.time() + 300
+        headers = {'expires': email.utils.formatdate(expires, usegmt=True)}
+        self.assertAlmostEqual(esi_cache.parse_expires(headers), expires, delta=1)
+        headers['date'] = 'garbage'
+        self.assertAlmostEqual(esi_cache.parse_expires(headers), expires, delta=1)
+
+    def test_invalid(self):
+        for value in (None, '', '0', '-1', 'Thu, 99 Foo 2020 nonsense'):
+            with self.subTest(value=value):
+                self.assertEqual(esi_cache.parse_expires({'expires': value}), 0)
+        self.assertEqual(esi_cache.parse_expires({}), 0)
+
+
+class _CacheTests:
+    """
+    The same tests for every cache storage; create_cache() is defined in subclasses
+    """
+
+    def create_cache(self) -> esi_cache.EsiCacheBase:
+        raise NotImplementedError()
+
+    def test_set_get(self):
+        cache = self.create_cache()
+        self.assertIsNone(cache.get('/universe/systems/1/'))
+        entry = EsiCacheEntry('{"name": "Jita"}', '"v1"', time.time() + 60)
+        cache.set('/universe/systems/1/', entry)
+        self.assertEqual(cache.get('/universe/systems/1/'), entry)
+        entry2 = EsiCacheEntry('{"name": "Amarr"}', '', time.time() + 60)
+        cache.set('/universe/systems/1/', entry2)
+        self.assertEqual(cache.get('/universe/systems/1/'), entry2)
+
+    def test_expired_entry_kept(self):
+        cache = self.create_cache()
+        # expired entry is still returned, to be revalidated with its ETag
+        entry = EsiCacheEntry('[]', '"v2"', time.time() - 60)
+        cache.set('key', entry)
+        self.assertEqual(cache.get('key'), entry)
+
+    def test_stale_entry_dropped(self):
+        cache = self.create_cache()
+        cache.KEEP_STALE = 0.05
+        cache.set('key', EsiCacheEntry('[]', '"v3"', time.time() - 60))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('key'))
+
+
+class TestEsiCacheMemory(_CacheTests, unittest.TestCase):
+    def create_cache(self) -> esi_cache.EsiCacheBase:
+        return esi_cache.EsiCacheMemory(10)
+
+
+class TestEsiCacheSqlite(_CacheTests, unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'cache', 'esi_cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def create_cache(self) -> esi_cache.EsiCacheBase:
+        return esi_cache.EsiCacheSqlite(self.filename)
+
+    def test_persistent(self):
+        entry = EsiCacheEntry('{"name": "Jita"}', '"v1"', time.time() + 60)
+        self.create_cache().set('key', entry)
+        self.assertEqual(self.create_cache().get('key'), entry)
+
+
+if __name__ == '__main__':
+    unittest.main()
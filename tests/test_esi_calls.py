@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import email.utils
+import http.server
+import threading
+import time
+import unittest
+
+from classes import esi_cache
+from classes import esi_calls
+from classes import http_client
+from classes.esi_throttle import EsiErrorBudget, PRIORITY_BACKGROUND, PRIORITY_ESSENTIAL, PRIORITY_NORMAL
+
+
+class _EsiHandler(http.server.BaseHTTPRequestHandler):
+    # reply status for next requests, and requests log: (path, If-None-Match)
+    status = 200
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('If-None-Match')))
+        body = b'{"name": "Jita"}' if self.status == 200 else b''
+        self.send_response(self.status)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Date', email.utils.formatdate(usegmt=True))
+        self.send_header('Expires', email.utils.formatdate(time.time() + 60, usegmt=True))
+        self.send_header('X-ESI-Error-Limit-Remain', '100')
+        self.send_header('X-ESI-Error-Limit-Reset', '60')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _FakeConfig:
+    SSO_USER_AGENT = 'whdbx tests'
+    ESI_CACHE_TYPE = 'memory'
+    ESI_CACHE_SIZE = 100
+
+
+class TestEsiCachedGet(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _EsiHandler)
+        cls.server.daemon_threads = True
+        cls.url = 'http://127.0.0.1:{}/latest/universe/systems/30000142/'.format(cls.server.server_address[1])
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _EsiHandler.status = 200
+        _EsiHandler.requests = []
+        esi_cache._esi_cache = None
+        esi_calls.esi_budget = EsiErrorBudget()
+        http_client._clients.pop('esi', None)
+        self.cfg = _FakeConfig()
+
+    def get(self, priority: int = PRIORITY_NORMAL):
+        return esi_calls.esi_cached_get(self.cfg, self.url, priority=priority)
+
+    def expire_entry(self):
+        cache = esi_cache.get_esi_cache(self.cfg)
+        entry = cache.get(self.url)
+        cache.set(self.url, entry._replace(expires=time.time() - 1))
+
+    def test_fresh_entry_is_served_from_cache(self):
+        self.assertEqual(self.get().text, '{"name": "Jita"}')
+        self.assertEqual(self.get().text, '{"name": "Jita"}')
+        self.assertEqual(len(_EsiHandler.requests), 1)
+
+    def test_expired_entry_is_revalidated(self):
+        self.get()
+        self.expire_entry()
+        _EsiHandler.status = 304
+        r = self.get()
+        self.assertEqual((r.status_code, r.text), (200, '{"name": "Jita"}'))
+        self.assertEqual(_EsiHandler.requests[-1][1], '"v1"')
+
+    def test_stale_entry_on_server_error(self):
+        self.get()
+        self.expire_entry()
+        _EsiHandler.status = 502
+        r = self.get()
+        self.assertEqual((r.status_code, r.text), (200, '{"name": "Jita"}'))
+
+    def test_stale_entry_when_throttled(self):
+        self.get()
+        self.expire_entry()
+        esi_calls.esi_budget.update(200, {'x-esi-error-limit-remain': '10', 'x-esi-error-limit-reset': '60'})
+        r = self.get()
+        self.assertEqual((r.status_code, r.text), (200, '{"name": "Jita"}'))
+        self.assertEqual(len(_EsiHandler.requests), 1)
+
+    def test_throttled_without_entry(self):
+        esi_calls.esi_budget.update(200, {'x-esi-error-limit-remain': '10', 'x-esi-error-limit-reset': '60'})
+        self.assertEqual(self.get().status_code, 420)
+        self.assertEqual(self.get(PRIORITY_ESSENTIAL).status_code, 200)
+        self.assertEqual(len(_EsiHandler.requests), 1)
+
+
+class TestEsiErrorBudget(unittest.TestCase):
+    def test_unknown_budget_allows_everything(self):
+        budget = EsiErrorBudget()
+        self.assertTrue(budget.allow(PRIORITY_BACKGROUND))
+
+    def test_shed_levels(self):
+        budget = EsiErrorBudget()
+        budget.update(200, {'x-esi-error-limit-remain': '30', 'x-esi-error-limit-reset': '60'})
+        self.assertFalse(budget.allow(PRIORITY_BACKGROUND))
+        self.assertTrue(budget.allow(PRIORITY_NORMAL))
+        budget.update(400, {'x-esi-error-limit-remain': '3', 'x-esi-error-limit-reset': '60'})
+        self.assertFalse(budget.allow(PRIORITY_NORMAL))
+        self.assertFalse(budget.allow(PRIORITY_ESSENTIAL))
+        self.assertEqual(budget.state()['shed'], {'essential': 1, 'normal': 1, 'background': 1})
+
+    def test_error_limited_reply(self):
+        budget = EsiErrorBudget()
+        budget.update(420, {'x-esi-error-limit-reset': '60'})
+        self.assertFalse(budget.allow(PRIORITY_ESSENTIAL))
+
+    def test_budget_restored_after_reset(self):
+        budget = EsiErrorBudget()
+        budget.update(200, {'x-esi-error-limit-remain': '0', 'x-esi-error-limit-reset': '0'})
+        self.assertTrue(budget.allow(PRIORITY_BACKGROUND))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import http.server
+import threading
+import time
+import unittest
+
+from classes.circuit_breaker import CircuitBreaker, CircuitOpenError
+from classes.http_client import HttpClient
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'[1, 2, 3]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.path == '/stall':
+            # headers are sent, body is not
+            self.wfile.write(body[:3])
+            self.wfile.flush()
+            time.sleep(1)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpClientStream(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        cls.server.daemon_threads = True
+        cls.url = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def make_client(self) -> HttpClient:
+        return HttpClient('test', timeout=0.3, breaker=CircuitBreaker('test', 2, 60))
+
+    def test_stalled_body_opens_breaker(self):
+        client = self.make_client()
+        for i in range(2):
+            r = client.get(self.url + '/stall', stream=True)
+            with self.assertRaises(Exception):
+                b''.join(client.iter_content(r))
+            client.finish_stream(r)
+        self.assertTrue(client.breaker.is_open())
+        with self.assertRaises(CircuitOpenError):
+            client.get(self.url + '/ok', stream=True)
+
+    def test_body_read_or_stopped_early_is_success(self):
+        client = self.make_client()
+        client.breaker.record_failure()
+        r = client.get(self.url + '/ok', stream=True)
+        self.assertEqual(b''.join(client.iter_content(r)), b'[1, 2, 3]')
+        self.assertEqual(client.breaker.info()['consecutive_failures'], 0)
+        client.breaker.record_failure()
+        r = client.get(self.url + '/ok', stream=True)
+        chunks = client.iter_content(r, chunk_size=1)
+        next(chunks)
+        chunks.close()
+        client.finish_stream(r)
+        self.assertEqual(client.breaker.info()['consecutive_failures'], 0)
+
+    def test_unread_body_is_reported_on_finish(self):
+        client = self.make_client()
+        client.breaker.record_failure()
+        r = client.get(self.url + '/ok', stream=True)
+        self.assertEqual(client.breaker.info()['consecutive_failures'], 1)
+        client.finish_stream(r)
+        client.finish_stream(r)
+        self.assertEqual(client.breaker.info()['consecutive_failures'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
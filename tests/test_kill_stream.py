@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import http.server
+import json
+import sqlite3
+import threading
+import time
+import unittest
+from unittest import mock
+
+from classes import esi_calls
+from classes.kill_stream import KillStreamWorker
+
+
+WSPACE_SSID = 31000005
+KSPACE_SSID = 30000142
+
+
+class _FakeBus:
+    def __init__(self):
+        self.messages = []
+
+    def log(self, msg, level=None, traceback=False):
+        self.messages.append(msg)
+
+
+class _SlowStreamHandler(http.server.BaseHTTPRequestHandler):
+    # long poll, that ends with one kill
+    delay = 1.5
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = json.dumps({'package': package(1, ssid=WSPACE_SSID)}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _FakeDb:
+    # celestial ID => solar system ID
+    celestials = {40000001: WSPACE_SSID, 40000002: KSPACE_SSID, WSPACE_SSID: WSPACE_SSID}
+
+    def query_wormholesystems_new(self, ssids) -> dict:
+        return {ssid: (3, ) for ssid in ssids if ssid == WSPACE_SSID}
+
+    def map_denormalize(self, itemid: int) -> dict:
+        ssid = self.celestials.get(itemid)
+        return {'itemid': itemid, 'solarsystemid': ssid} if ssid else None
+
+
+class _FakeKillmailsCache:
+    def __init__(self):
+        self.saved = dict()
+
+    def get_killmails(self, keys) -> dict:
+        return {key: self.saved[key] for key in keys if key in self.saved}
+
+    def save_killmail(self, kill_id, kill_hash, killmail):
+        self.saved[(kill_id, kill_hash)] = killmail
+
+
+class _FakeApp:
+    def __init__(self):
+        self.cfg = None
+        self.db = _FakeDb()
+        self.killmails_cache = _FakeKillmailsCache()
+
+
+def package(kill_id: int, location_id: int = None, ssid: int = None) -> dict:
+    ret = {'killID': kill_id, 'zkb': {'hash': 'h{}'.format(kill_id)}}
+    if location_id is not None:
+        ret['zkb']['locationID'] = location_id
+    if ssid is not None:
+        ret['killmail'] = {'killmail_id': kill_id, 'solar_system_id': ssid}
+    return ret
+
+
+class TestKillStreamWorker(unittest.TestCase):
+    def setUp(self):
+        self.app = _FakeApp()
+        self.worker = KillStreamWorker(_FakeBus(), self.app, 'http://127.0.0.1:1/listen.php', 'test')
+        patcher = mock.patch.object(esi_calls, 'get_killmail_by_id_hash',
+                                    side_effect=lambda cfg, kill_id, kill_hash: {'killmail_id': int(kill_id),
+                                                                                 'solar_system_id': WSPACE_SSID})
+        self.get_killmail = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_inline_killmail(self):
+        self.assertTrue(self.worker.process(package(1, ssid=WSPACE_SSID)))
+        self.assertFalse(self.worker.process(package(2, ssid=KSPACE_SSID)))
+        self.assertFalse(self.worker.process(package(1, ssid=WSPACE_SSID)))  # already saved
+        self.get_killmail.assert_not_called()
+
+    def test_esi_asked_only_for_wspace_kills(self):
+        self.assertTrue(self.worker.process(package(1, location_id=40000001)))
+        self.assertTrue(self.worker.process(package(2, location_id=WSPACE_SSID)))
+        self.assertFalse(self.worker.process(package(3, location_id=40000002)))
+        self.assertEqual(self.get_killmail.call_count, 2)
+        self.assertEqual(self.worker.num_fetched, 2)
+        self.assertIn(('1', 'h1'), self.app.killmails_cache.saved)
+
+    def test_unknown_location_is_skipped(self):
+        self.assertFalse(self.worker.process(package(1)))
+        self.assertFalse(self.worker.process(package(2, location_id=49999999)))
+        self.get_killmail.assert_not_called()
+        self.assertEqual(self.worker.num_unknown, 2)
+
+
+
+class TestKillStreamWorkerThread(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _SlowStreamHandler)
+        cls.server.daemon_threads = True
+        cls.url = 'http://127.0.0.1:{}/listen.php'.format(cls.server.server_address[1])
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.bus = _FakeBus()
+        self.worker = KillStreamWorker(self.bus, _FakeApp(), self.url, 'test', ttw=1)
+        self.worker.RETRY_INTERVAL = 0.05
+        self.worker.resolve_names = lambda: None
+        self.addCleanup(self.wait_stopped)
+
+    def wait_stopped(self):
+        self.worker.stop()
+        for i in range(50):
+            if self.worker._thread is None:
+                return
+            time.sleep(0.1)
+        self.fail('worker thread has not exited')
+
+    @staticmethod
+    def num_threads() -> int:
+        return len([t for t in threading.enumerate() if t.name == 'KillStreamWorker'])
+
+    def test_restart_during_long_poll(self):
+        self.worker.start()
+        time.sleep(0.1)
+        self.worker.stop()
+        self.worker.start()
+        time.sleep(0.1)
+        self.assertEqual(self.num_threads(), 1)
+        self.wait_stopped()
+        self.assertEqual(self.num_threads(), 0)
+        self.worker.start()
+        self.assertEqual(self.num_threads(), 1)
+
+    def test_survives_unexpected_errors(self):
+        errors = [sqlite3.OperationalError('database is locked')]
+
+        def process(pkg):
+            if len(errors) > 0:
+                raise errors.pop()
+            return True
+
+        self.worker.process = process
+        self.worker.start()
+        for i in range(50):
+            if self.worker.num_saved > 0:
+                break
+            time.sleep(0.1)
+        self.assertGreater(self.worker.num_saved, 0)
+        self.assertTrue(any('database is locked' in msg for msg in self.bus.messages))
+
+
+if __name__ == '__main__':
+    unittest.main()
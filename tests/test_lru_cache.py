@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from classes import page_cache
+from classes.lru_cache import LRUCache
+
+
+class _Clock:
+    """
+    Replaces time module in tested module, only monotonic() is used
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class TestLRUCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        patcher = mock.patch('classes.lru_cache.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_eviction_order(self):
+        cache = LRUCache(3)
+        for key in 'abc':
+            cache.put(key, key.upper())
+        self.assertEqual(cache.get('a'), 'A')  # 'b' is now least recently used
+        cache.put('d', 'D')
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual([cache.get(key) for key in 'acd'], ['A', 'C', 'D'])
+        # overwrite does not grow cache and refreshes entry
+        cache.put('a', 'A2')
+        cache.put('e', 'E')
+        self.assertEqual(cache.get('a'), 'A2')
+        self.assertIsNone(cache.get('c'))
+
+    def test_disabled(self):
+        cache = LRUCache(0)
+        cache.put('a', 1)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get('a', 'default'), 'default')
+
+    def test_ttl(self):
+        cache = LRUCache(10, ttl=5)
+        cache.put('a', 1)
+        cache.put('b', 2, ttl=20)
+        cache.put('c', 3, ttl=0)
+        self.assertEqual(cache.ttl_left('a'), 5)
+        self.assertEqual(cache.ttl_left('c'), float('inf'))
+        self.assertIsNone(cache.ttl_left('x'))
+        self.clock.now += 5
+        self.assertEqual(cache.ttl_left('a'), 0)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 2)  # expired entry is removed on get()
+        self.assertEqual(cache.get('b'), 2)
+        self.clock.now += 1000
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_get_stale(self):
+        cache = LRUCache(10, ttl=5)
+        cache.put('a', 1)
+        self.assertEqual(cache.get_stale('a'), (1, False))
+        self.clock.now += 6
+        self.assertEqual(cache.ttl_left('a'), -1)
+        self.assertEqual(cache.get_stale('a'), (1, True))
+        self.assertEqual(cache.get_stale('a'), (1, True))  # not removed
+        self.assertEqual(cache.get_stale('x'), (None, False))
+
+    def test_remove_clear(self):
+        cache = LRUCache(10)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.remove('a')
+        cache.remove('x')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        with open(os.path.join(self.tmpdir, 'index.html'), 'w') as f:
+            f.write('<html/>')
+        self.cache = page_cache.PageCache(10, self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sso_state_substituted(self):
+        html = '<a href="https://login/?state=abc123">Login</a> Ж'
+        page = self.cache.put(('index', 'en'), html, 'abc123')
+        self.assertNotIn(b'abc123', page.body)
+        self.assertIn(page_cache.SSO_STATE_PLACEHOLDER, page.body)
+        self.assertIs(self.cache.get(('index', 'en')), page)
+        self.assertIsNone(self.cache.get(('index', 'ru')))
+        own = page_cache.page_for_session(page, 'abc123')
+        self.assertEqual(own.body, html.encode('utf-8'))
+        other = page_cache.page_for_session(page, 'def456')
+        self.assertEqual(other.body, html.replace('abc123', 'def456').encode('utf-8'))
+        # strong ETag is different for every session
+        self.assertNotEqual(own.etag, other.etag)
+        self.assertTrue(own.etag.startswith('"') and own.etag.endswith('"'))
+        self.assertEqual(page_cache.page_for_session(page, 'abc123').etag, own.etag)
+
+    def test_without_sso_state(self):
+        page = self.cache.put(('about',), 'text', '')
+        self.assertEqual(page.body, b'text')
+        # ETag depends on key and body
+        self.assertNotEqual(self.cache.put(('about', 'ru'), 'text', '').etag, page.etag)
+        self.assertNotEqual(self.cache.put(('about',), 'text2', '').etag, page.etag)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(('about',)))
+
+    def test_versioned_key(self):
+        key = self.cache.versioned_key(('index', 'en'), (1, 2))
+        self.assertEqual(key[:3], ('index', 'en', (1, 2)))
+        self.assertNotEqual(self.cache.versioned_key(('index', 'en'), (1, 3)), key)
+
+    def test_templates_version(self):
+        version = self.cache.templates_version()
+        self.assertEqual(version[1], 1)
+        with open(os.path.join(self.tmpdir, 'new.html'), 'w') as f:
+            f.write('<html/>')
+        # template directory is checked not more often than TEMPLATES_CHECK_INTERVAL
+        self.assertEqual(self.cache.templates_version(), version)
+        self.cache.TEMPLATES_CHECK_INTERVAL = 0
+        self.assertEqual(self.cache.templates_version()[1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
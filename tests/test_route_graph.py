@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from classes import hub_routes
+from classes.database import ROUTE_TOO_LONG, SiteDb
+from classes.route_graph import load_jump_graph
+
+
+JITA = 30000142
+
+# solarSystemID, solarSystemName, security
+SYSTEMS = [
+    (1, 'Start', 0.9),
+    (2, 'Lowsec', 0.3),
+    (3, 'High A', 0.8),
+    (4, 'High B', 0.7),
+    (5, 'Island', 0.9),
+    (JITA, 'Jita', 0.9),
+]
+
+# two-way gates: Start - Lowsec - Jita is short, Start - High A - High B - Jita is safe
+GATES = [(1, 2), (2, JITA), (1, 3), (3, 4), (4, JITA)]
+
+
+def _create_map_db() -> sqlite3.Connection:
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE mapSolarSystems (solarSystemID INTEGER, solarSystemName TEXT, security REAL)')
+    conn.execute('CREATE TABLE mapSolarSystemJumps (fromSolarSystemID INTEGER, toSolarSystemID INTEGER)')
+    conn.executemany('INSERT INTO mapSolarSystems VALUES (?, ?, ?)', SYSTEMS)
+    for a, b in GATES:
+        conn.execute('INSERT INTO mapSolarSystemJumps VALUES (?, ?)', (a, b))
+        conn.execute('INSERT INTO mapSolarSystemJumps VALUES (?, ?)', (b, a))
+    # jump to a system that is not in mapSolarSystems is ignored
+    conn.execute('INSERT INTO mapSolarSystemJumps VALUES (?, ?)', (1, 999))
+    return conn
+
+
+class TestJumpGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = load_jump_graph(_create_map_db())
+
+    def ssids(self, path: list) -> list:
+        return [self.graph.ssids[idx] for idx in path]
+
+    def test_load(self):
+        self.assertEqual(len(self.graph), len(SYSTEMS))
+        self.assertEqual(list(self.graph.ssids), sorted(row[0] for row in SYSTEMS))
+        self.assertEqual(self.graph.index_of(999), -1)
+        start = self.graph.index_of(1)
+        self.assertEqual(sorted(self.ssids(self.graph.neighbours(start))), [2, 3])
+        self.assertEqual(len(self.graph.neighbours(self.graph.index_of(5))), 0)
+
+    def test_shortest_path(self):
+        path = self.graph.shortest_path(1, JITA, hub_routes.POLICY_SHORTEST, 50)
+        self.assertEqual(self.ssids(path), [1, 2, JITA])
+
+    def test_highsec_path(self):
+        path = self.graph.shortest_path(1, JITA, hub_routes.POLICY_HIGHSEC, 50)
+        self.assertEqual(self.ssids(path), [1, 3, 4, JITA])
+        self.assertIsNone(self.graph.shortest_path(1, JITA, hub_routes.POLICY_HIGHSEC, 2))
+
+    def test_start_and_target_security_not_checked(self):
+        path = self.graph.shortest_path(2, JITA, hub_routes.POLICY_HIGHSEC, 50)
+        self.assertEqual(self.ssids(path), [2, JITA])
+        path = self.graph.shortest_path(1, 2, hub_routes.POLICY_HIGHSEC, 50)
+        self.assertEqual(self.ssids(path), [1, 2])
+
+    def test_no_path(self):
+        self.assertIsNone(self.graph.shortest_path(1, 5, hub_routes.POLICY_SHORTEST, 50))
+        self.assertIsNone(self.graph.shortest_path(1, 999, hub_routes.POLICY_SHORTEST, 50))
+        self.assertEqual(self.ssids(self.graph.shortest_path(1, 1, hub_routes.POLICY_SHORTEST, 50)), [1])
+
+    def test_path_to_route(self):
+        path = self.graph.shortest_path(1, JITA, hub_routes.POLICY_SHORTEST, 50)
+        route = self.graph.path_to_route(path)
+        self.assertEqual(len(route), 2)
+        self.assertEqual(route[0]['from_ssname'], 'Start')
+        self.assertEqual(route[0]['to_ssid'], 2)
+        self.assertAlmostEqual(route[0]['to_sssec'], 0.3)
+        self.assertEqual(route[1]['from_ssid'], 2)
+        self.assertEqual(route[1]['to_ssname'], 'Jita')
+
+
+class TestHubRoutes(unittest.TestCase):
+    def setUp(self):
+        self.graph = load_jump_graph(_create_map_db())
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, hub_routes.HUB_ROUTES_FILENAME)
+        hub_routes.build_hub_routes(self.graph, self.filename, 123, 456)
+        self.table = hub_routes.HubRoutesTable(self.filename)
+
+    def tearDown(self):
+        self.table.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_header(self):
+        self.assertEqual(self.table.n_systems, len(self.graph))
+        self.assertEqual(self.table.db_mtime_ns, 123)
+        self.assertEqual(self.table.db_size, 456)
+        self.assertTrue(self.table.matches_graph(self.graph))
+        other = load_jump_graph(_create_map_db())
+        other.ssids[0] = 7
+        self.assertFalse(self.table.matches_graph(other))
+
+    def test_same_as_bfs(self):
+        for ssid, _, _ in SYSTEMS:
+            for sec_min in hub_routes.POLICIES:
+                with self.subTest(ssid=ssid, sec_min=sec_min):
+                    self.assertTrue(self.table.has_route(JITA, sec_min))
+                    expected = self.graph.shortest_path(ssid, JITA, sec_min, 50)
+                    path = self.table.route_path(self.graph.index_of(ssid), JITA, sec_min, 50)
+                    self.assertEqual(path, expected)
+
+    def test_max_jumps(self):
+        start = self.graph.index_of(1)
+        self.assertIsNone(self.table.route_path(start, JITA, hub_routes.POLICY_HIGHSEC, 2))
+        self.assertEqual(len(self.table.route_path(start, JITA, hub_routes.POLICY_HIGHSEC, 3)), 4)
+
+    def test_hub_not_in_graph(self):
+        # other trade hubs are not in test map, they are unreachable
+        amarr = hub_routes.TRADE_HUBS[1]
+        self.assertTrue(self.table.has_route(amarr, hub_routes.POLICY_SHORTEST))
+        self.assertIsNone(self.table.route_path(self.graph.index_of(1), amarr, hub_routes.POLICY_SHORTEST, 50))
+        self.assertFalse(self.table.has_route(1, hub_routes.POLICY_SHORTEST))
+        self.assertFalse(self.table.has_route(JITA, 0.1))
+
+    def test_invalid_file(self):
+        with open(self.filename, 'r+b') as f:
+            f.write(b'NOTROUTE')
+        with self.assertRaises(ValueError):
+            hub_routes.HubRoutesTable(self.filename)
+        with open(self.filename, 'wb') as f:
+            f.write(b'WHDBXHR1')
+        with self.assertRaises((ValueError, OSError)):
+            hub_routes.HubRoutesTable(self.filename)
+
+class _RouteDb(SiteDb):
+    """
+    SiteDb with only jumps graph and hub routes table, without EVE DB
+    """
+    def __init__(self, graph, table):
+        self._graph = graph
+        self._table = table
+
+    def jump_graph(self):
+        return self._graph
+
+    def hub_routes(self):
+        return self._table
+
+
+class TestFindRouteCache(unittest.TestCase):
+    def setUp(self):
+        self.graph = load_jump_graph(_create_map_db())
+        self.tmpdir = tempfile.mkdtemp()
+        filename = os.path.join(self.tmpdir, hub_routes.HUB_ROUTES_FILENAME)
+        hub_routes.build_hub_routes(self.graph, filename)
+        self.table = hub_routes.HubRoutesTable(filename)
+
+    def tearDown(self):
+        self.table.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_too_long_and_no_route(self):
+        # the same results from precomputed table and from BFS
+        for table in (self.table, None):
+            with self.subTest(table=table):
+                db = _RouteDb(self.graph, table)
+                route = db.find_route_cache(1, JITA, hub_routes.POLICY_HIGHSEC, 3)
+                self.assertEqual([jump['to_ssid'] for jump in route], [3, 4, JITA])
+                self.assertEqual(db.find_route_cache(1, JITA, hub_routes.POLICY_HIGHSEC, 2), ROUTE_TOO_LONG)
+                self.assertEqual(len(db.find_route_cache(1, JITA, hub_routes.POLICY_SHORTEST, 2)), 2)
+                self.assertIsNone(db.find_route_cache(5, JITA, hub_routes.POLICY_HIGHSEC, 2))
+                self.assertIsNone(db.find_route_cache(999, JITA, hub_routes.POLICY_HIGHSEC, 2))
+                self.assertEqual(db.find_route_cache(JITA, JITA), [])
+
+class _HubRoutesDb(SiteDb):
+    """
+    SiteDb with jumps graph, that builds hub routes table in given directory
+    """
+    def __init__(self, graph, routes_cache_dir: str):
+        self._graph = graph
+        self._hub_routes = None
+        self._hub_routes_version = None
+        self._hub_routes_failed_version = None
+        self._hub_routes_lock = threading.Lock()
+        self._routes_cache_dir = routes_cache_dir
+
+    def jump_graph(self):
+        return self._graph
+
+
+class TestHubRoutesBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        patcher = mock.patch('classes.database.cherrypy.log')
+        self.log = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_db(self, routes_cache_dir: str) -> SiteDb:
+        return _HubRoutesDb(load_jump_graph(_create_map_db(), (1, 2)), routes_cache_dir)
+
+    def test_build_error_is_logged_once(self):
+        # cache directory cannot be created, there is a file with the same name
+        not_a_dir = os.path.join(self.tmpdir, 'routes')
+        with open(not_a_dir, 'w') as f:
+            f.write('x')
+        db = self.create_db(not_a_dir)
+        self.assertIsNone(db.hub_routes())
+        num_logged = self.log.call_count
+        self.assertIsNone(db.hub_routes())
+        self.assertEqual(self.log.call_count, num_logged)
+        errors = [c[0][0] for c in self.log.call_args_list if c[0][2] == logging.ERROR]
+        self.assertEqual(len(errors), 1)
+        self.assertIn(not_a_dir, errors[0])
+        # routes are still found, in jumps graph
+        self.assertEqual(len(db.find_route_cache(1, JITA, hub_routes.POLICY_SHORTEST, 10)), 2)
+
+    def test_corrupt_file_is_rebuilt(self):
+        filename = os.path.join(self.tmpdir, hub_routes.HUB_ROUTES_FILENAME)
+        with open(filename, 'wb') as f:
+            f.write(b'garbage')
+        db = self.create_db(self.tmpdir)
+        table = db.hub_routes()
+        self.assertIsNotNone(table)
+        self.addCleanup(table.close)
+        self.assertTrue(table.matches_graph(db.jump_graph()))
+        self.assertEqual(self.log.call_count, 1)
+        self.assertEqual(self.log.call_args[0][2], logging.WARNING)
+
+    def test_missing_file_is_built_silently(self):
+        db = self.create_db(os.path.join(self.tmpdir, 'new'))
+        table = db.hub_routes()
+        self.assertIsNotNone(table)
+        self.addCleanup(table.close)
+        self.assertIs(db.hub_routes(), table)
+        self.log.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
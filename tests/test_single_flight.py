@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+from classes import deadline
+from classes.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    NUM_THREADS = 8
+
+    def setUp(self):
+        self.sf = SingleFlight()
+        self.release = threading.Event()
+        self.num_calls = 0
+
+    def slow_call(self, value):
+        self.num_calls += 1
+        self.release.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def run_threads(self, key, value) -> list:
+        """
+        Start callers, let the first call finish when all of them are waiting
+        :return: list of results or exceptions of all callers
+        """
+        results = [None] * self.NUM_THREADS
+
+        def caller(i):
+            try:
+                results[i] = self.sf.do(key, self.slow_call, value)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(self.NUM_THREADS)]
+        for t in threads:
+            t.start()
+        # followers wait for the leader, which is blocked in slow_call()
+        for _ in range(100):
+            if self.num_calls > 0:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.sf.in_flight(), 1)
+        time.sleep(0.1)
+        self.release.set()
+        for t in threads:
+            t.join(5)
+        return results
+
+    def test_coalesced(self):
+        result = {'kills': []}
+        results = self.run_threads('key', result)
+        self.assertEqual(self.num_calls, 1)
+        for r in results:
+            self.assertIs(r, result)
+        self.assertEqual(self.sf.in_flight(), 0)
+
+    def test_exception_shared(self):
+        error = ValueError('upstream failed')
+        results = self.run_threads('key', error)
+        self.assertEqual(self.num_calls, 1)
+        for r in results:
+            self.assertIs(r, error)
+        self.assertEqual(self.sf.in_flight(), 0)
+
+    def test_not_cached(self):
+        self.release.set()
+        self.assertEqual(self.sf.do('key', self.slow_call, 1), 1)
+        self.assertEqual(self.sf.do('key', self.slow_call, 2), 2)
+        self.assertEqual(self.num_calls, 2)
+        with self.assertRaises(KeyError):
+            self.sf.do('key', self.slow_call, KeyError('x'))
+        # failed call is not remembered either
+        self.assertEqual(self.sf.do('key', self.slow_call, 3), 3)
+
+    def test_different_keys(self):
+        # call with another key is not blocked by a call in progress
+        result = self.sf.do('a', lambda: (self.sf.in_flight(), self.sf.do('b', lambda: 'b')))
+        self.assertEqual(result, (1, 'b'))
+    def start_leader(self, func, seconds: float = 0) -> threading.Thread:
+        """
+        Start a call in another thread under its own deadline, and wait until it is in progress
+        """
+        started = threading.Event()
+
+        def leader_func():
+            started.set()
+            return func()
+
+        t = threading.Thread(target=self.call_ignore_errors, args=(leader_func, seconds))
+        t.start()
+        self.assertTrue(started.wait(5))
+        return t
+
+    def call_ignore_errors(self, func, seconds: float):
+        try:
+            with deadline.Deadline(seconds):
+                self.sf.do('key', func)
+        except Exception:
+            pass
+
+    def test_leader_deadline_exceeded_not_shared(self):
+        def leader_func():
+            self.release.wait(5)
+            raise deadline.DeadlineExceeded('leader has no time left')
+
+        t = self.start_leader(leader_func)
+        threading.Timer(0.1, self.release.set).start()
+        # follower has no deadline, it calls function itself
+        self.assertEqual(self.sf.do('key', lambda: 'fresh'), 'fresh')
+        t.join(5)
+
+    def test_leader_out_of_time_result_not_shared(self):
+        def leader_func():
+            self.release.wait(5)
+            # like a request wrapper, that returns None on timeout
+            return None
+
+        t = self.start_leader(leader_func, 0.01)
+        threading.Timer(0.1, self.release.set).start()
+        self.assertEqual(self.sf.do('key', lambda: 'fresh'), 'fresh')
+        t.join(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import unittest
+
+from classes.type_index import load_type_index
+
+
+def _create_types_db() -> sqlite3.Connection:
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE invGroups (groupID INTEGER, groupName TEXT)')
+    conn.execute('CREATE TABLE invTypes (typeID INTEGER, typeName TEXT, groupID INTEGER, capacity REAL)')
+    conn.executemany('INSERT INTO invGroups VALUES (?, ?)', [(25, 'Frigate'), (26, 'Cruiser')])
+    # not sorted by typeID on purpose; type 999 has unknown group and is not loaded
+    conn.executemany('INSERT INTO invTypes VALUES (?, ?, ?, ?)', [
+        (621, 'Caracal', 26, 450.0),
+        (587, 'Rifter', 25, 140.0),
+        (603, 'Merlin', 25, None),
+        (999, 'Orphan', 12345, 1.0),
+    ])
+    return conn
+
+
+class TestTypeIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = load_type_index(_create_types_db(), ('v', 1))
+
+    def test_load(self):
+        self.assertEqual(self.index.version, ('v', 1))
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(list(self.index.typeids), [587, 603, 621])
+        # group names are stored once per group
+        self.assertEqual(sorted(self.index.group_names), ['Cruiser', 'Frigate'])
+
+    def test_find(self):
+        self.assertEqual(self.index.find(621), {
+            'typeid': 621, 'name': 'Caracal', 'groupid': 26, 'groupname': 'Cruiser', 'capacity': 450.0})
+        rifter = self.index.find(587)
+        self.assertEqual(rifter['name'], 'Rifter')
+        self.assertEqual(rifter['groupname'], 'Frigate')
+        self.assertEqual(self.index.find(603)['capacity'], 0.0)
+
+    def test_not_found(self):
+        for typeid in (0, 586, 588, 620, 622, 999, 100000):
+            with self.subTest(typeid=typeid):
+                self.assertIsNone(self.index.find(typeid))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import unittest
+
+from classes.database import SiteDb
+from classes.db_snapshot import StaticDataSnapshot
+from classes.whdb_filter import WHDBFilter
+
+
+# solarsystemid => (class, star, planets, moons, effect, statics)
+SYSTEMS = {
+    31000005: (15, 'B0', 2, 3, 'Wolf-Rayet Star', 'H121'),
+    31000001: (1, 'G5', 5, 20, None, 'H121'),
+    31000002: (3, 'K3', 7, 40, 'Black Hole', 'C247,H121'),
+    31000003: (-2, 'M0', 3, 10, 'Magnetar', 'K162'),
+    31000004: (13, 'F0', 1, 0, None, ''),
+}
+
+# hole name => (id, hole, in_class, ...)
+HOLES = {
+    'H121': (1, 'H121', 1),
+    'C247': (2, 'C247', 3),
+    'K162': (3, 'K162', None),
+}
+
+# solarsystemid => ((hole name, in_class), ...), as in system_statics table
+SYSTEM_STATICS = {
+    31000005: (('H121', 1),),
+    31000001: (('H121', 1),),
+    31000002: (('C247', 3), ('H121', 1)),
+    31000003: (('K162', None),),
+}
+
+
+def _snapshot() -> StaticDataSnapshot:
+    snap = StaticDataSnapshot(('test', 1))
+    snap.wormholesystems = SYSTEMS
+    snap.wormholesystems_names = {ssid: 'J{}'.format(ssid) for ssid in SYSTEMS}
+    snap.holes = HOLES
+    snap.system_statics = SYSTEM_STATICS
+    return snap
+
+
+def _brute_force(selected: dict) -> list:
+    """
+    :return: sorted IDs of systems matching selection, checked one by one
+    """
+    effects = {'bh': 'Black Hole', 'mag': 'Magnetar', 'wr': 'Wolf-Rayet Star', 'noeffect': None}
+    result = []
+    for ssid, row in SYSTEMS.items():
+        classes = {str(row[0])}
+        if -6 <= row[0] <= -1:
+            classes.add('shattered')
+        if row[0] == 13:
+            classes.add('frigwr')
+        if 14 <= row[0] <= 18:
+            classes.add('drifters')
+        in_classes = {str(HOLES[name.strip()][2]) for name in row[5].split(',')
+                      if (name.strip() in HOLES) and (HOLES[name.strip()][2] is not None)}
+        if selected.get('class') and not classes.intersection(selected['class']):
+            continue
+        if selected.get('effect') and (row[4] not in [effects[e] for e in selected['effect']]):
+            continue
+        if selected.get('in_class') and not in_classes.intersection(selected['in_class']):
+            continue
+        result.append(ssid)
+    return sorted(result)
+
+
+class TestWHDBFilter(unittest.TestCase):
+    def setUp(self):
+        self.filter = WHDBFilter(_snapshot())
+
+    def ids(self, selected: dict) -> list:
+        return [jsys['id'] for jsys in self.filter.query(selected)['systems']]
+
+    def test_all_systems(self):
+        self.assertEqual(len(self.filter), len(SYSTEMS))
+        self.assertEqual(self.filter.version, ('test', 1))
+        self.assertEqual(self.ids({}), sorted(SYSTEMS.keys()))
+
+    def test_system_dict(self):
+        jsys = self.filter.query({'class': ['3']})['systems'][0]
+        self.assertEqual(jsys['id'], 31000002)
+        self.assertEqual(jsys['name'], 'J31000002')
+        self.assertEqual(jsys['class'], 3)
+        self.assertEqual(jsys['effect'], 'Black Hole')
+        self.assertEqual(jsys['statics'], ['C247 c3', 'H121 c1'])
+        # results are copies
+        jsys['statics'].append('X')
+        self.assertEqual(len(self.filter.query({'class': ['3']})['systems'][0]['statics']), 2)
+
+    def test_facets(self):
+        selections = [
+            {'class': ['1']},
+            {'class': ['1', '3']},
+            {'class': ['shattered']},
+            {'class': ['frigwr', 'drifters']},
+            {'effect': ['noeffect']},
+            {'effect': ['bh', 'mag']},
+            {'in_class': ['1']},
+            {'in_class': ['3']},
+            {'class': ['3', '15'], 'in_class': ['1']},
+            {'class': ['1', '3'], 'effect': ['bh']},
+            {'class': ['1'], 'effect': ['wr']},
+        ]
+        for selected in selections:
+            with self.subTest(selected=selected):
+                self.assertEqual(self.ids(selected), _brute_force(selected))
+
+    def test_invalid_values_ignored(self):
+        self.assertEqual(self.ids({'class': ['abc']}), sorted(SYSTEMS.keys()))
+        self.assertEqual(self.ids({'effect': ['xx', 'bh']}), [31000002])
+        self.assertEqual(self.ids({'class': '3'}), [31000002])
+        # valid, but unknown value matches nothing
+        self.assertEqual(self.ids({'class': ['6']}), [])
+
+    def test_facet_counts(self):
+        facets = self.filter.query({'class': ['1', '3']})['facets']
+        # class counts do not depend on selected classes
+        self.assertEqual(facets['class']['1'], 1)
+        self.assertEqual(facets['class']['shattered'], 1)
+        self.assertEqual(facets['class']['drifters'], 1)
+        # other facets are counted among selected classes only
+        self.assertEqual(facets['effect']['noeffect'], 1)
+        self.assertEqual(facets['effect']['bh'], 1)
+        self.assertEqual(facets['effect'].get('wr', 0), 0)
+        self.assertEqual(facets['in_class']['1'], 2)
+        self.assertEqual(facets['in_class']['3'], 1)
+
+class TestSystemStatics(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE wormholesystems_new (solarsystemid int, system text, class int, '
+                          ' star text, planets int, moons int, effect text, statics text)')
+        self.conn.execute('CREATE TABLE wormholeclassifications (id int, hole text, in_class int, '
+                          ' maxStableTime int, maxStableMass int, massRegeneration int, maxJumpMass int)')
+        for ssid, row in SYSTEMS.items():
+            self.conn.execute('INSERT INTO wormholesystems_new VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                              (ssid, 'J{}'.format(ssid)) + row)
+        self.conn.execute('INSERT INTO wormholesystems_new VALUES (31000006, \'J31000006\', 2, \'G0\', 1, 1, NULL, NULL)')
+        for hole, row in HOLES.items():
+            self.conn.execute('INSERT INTO wormholeclassifications VALUES (?, ?, ?, 0, 0, 0, 0)', row)
+        # duplicate hole row: the first one wins
+        self.conn.execute('INSERT INTO wormholeclassifications VALUES (4, \'C247\', 5, 0, 0, 0, 0)')
+
+    def load(self) -> StaticDataSnapshot:
+        snap = StaticDataSnapshot(('test', 1))
+        cur = self.conn.cursor()
+        snap._load_wormholesystems(cur)
+        snap._load_holes(cur)
+        snap._load_system_statics(cur)
+        return snap
+
+    def test_patch_script(self):
+        with open(SiteDb.SYSTEM_STATICS_SQL, 'rt', encoding='utf-8') as f:
+            self.conn.executescript(f.read())
+        self.assertEqual(dict(self.load().system_statics), SYSTEM_STATICS)
+
+    def test_without_table(self):
+        # DB is not patched, snapshot splits statics strings itself
+        self.assertEqual(dict(self.load().system_statics), SYSTEM_STATICS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from classes.lru_cache import LRUCache
+from classes.zkb_refresher import ZKBBlockRefresher
+
+
+class _FakeBus:
+    def log(self, msg, level=None, traceback=False):
+        pass
+
+
+class _FakeTr:
+    supported_locales = ['en', 'ru']
+
+
+class _FakeApp:
+    def __init__(self):
+        self.tr = _FakeTr()
+        self.zkb_block_cache = LRUCache(100, 600)
+        self.loads = []
+        self.renders = []
+        self.kills = [{'killmail_id': 1}]
+
+    def load_zkb_kills(self, ssid: str, refresh: bool = False) -> tuple:
+        self.loads.append((ssid, refresh))
+        return self.kills, True
+
+    def render_zkb_block(self, ssid: str, locale: str, refresh: bool = False, loaded: tuple = None) -> tuple:
+        self.renders.append((ssid, locale, loaded is not None))
+        return '{}/{}'.format(ssid, locale), len(loaded[0]), loaded[1]
+
+
+class TestZKBBlockRefresher(unittest.TestCase):
+    def setUp(self):
+        self.app = _FakeApp()
+        self.refresher = ZKBBlockRefresher(_FakeBus(), self.app, top_systems=2)
+
+    def test_kills_loaded_once_per_system(self):
+        for i in range(3):
+            self.refresher.record_view(('31000707', 'en'))
+            self.refresher.record_view(('31000707', 'ru'))
+        self.refresher.refresh()
+        self.assertEqual(self.app.loads, [('w-space', True), ('31000707', True)])
+        self.assertEqual(len(self.app.renders), 4)
+        self.assertTrue(all(r[2] for r in self.app.renders))
+        self.assertEqual(self.app.zkb_block_cache.get(('w-space', 'ru')), 'w-space/ru')
+        self.assertEqual(self.app.zkb_block_cache.get(('31000707', 'en')), '31000707/en')
+
+    def test_fresh_blocks_are_not_refreshed(self):
+        self.refresher.refresh()
+        self.app.loads.clear()
+        self.refresher.refresh()
+        self.assertEqual(self.app.loads, [])
+
+    def test_retry_after_empty_reply(self):
+        self.app.kills = []
+        self.refresher.refresh()
+        self.refresher.refresh()
+        self.assertEqual(self.app.loads, [('w-space', True)])
+        self.assertIsNone(self.app.zkb_block_cache.get(('w-space', 'en')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+import http.server
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from classes import http_client
+from classes import zkillboard
+from classes.zkillboard import ZKB, iter_json_array
+
+
+# the same as zkillboard reply for one system, with floats, bools and nested objects
+ZKB_REPLY = '''[{"killmail_id":72725284,"zkb":{"locationID":40387568,"hash":"56a83bf9445ad4ed88426b19e600e801e6ab57f4",
+"fittedValue":1320489.39,"totalValue":48235664.21,"points":1,"npc":false,"solo":true,"awox":false}},
+{"killmail_id":72725001,"zkb":{"locationID":40387569,"hash":"0123456789abcdef0123456789abcdef01234567",
+"fittedValue":-3.5e10,"totalValue":1E-2,"points":12,"npc":true,"solo":false,"awox":null,"labels":["pvp","loc:w-space"]}}]'''
+
+# top-level numbers are yielded one by one, so they must not be cut at chunk boundary
+NUMBERS_REPLY = '[1.5, -3.5e10,1E-2,0 ,12, 48235664.21]'
+
+
+def split_at(text: str, *positions) -> list:
+    chunks = []
+    start = 0
+    for pos in positions:
+        chunks.append(text[start:pos])
+        start = pos
+    chunks.append(text[start:])
+    return chunks
+
+
+class TestIterJsonArray(unittest.TestCase):
+    def test_whole_text(self):
+        self.assertEqual(list(iter_json_array([ZKB_REPLY])), json.loads(ZKB_REPLY))
+
+    def test_every_split_position(self):
+        for text in (ZKB_REPLY, NUMBERS_REPLY):
+            expected = json.loads(text)
+            for pos in range(len(text) + 1):
+                with self.subTest(text=text[:10], pos=pos):
+                    self.assertEqual(list(iter_json_array(split_at(text, pos))), expected)
+
+    def test_one_char_chunks(self):
+        self.assertEqual(list(iter_json_array(list(ZKB_REPLY))), json.loads(ZKB_REPLY))
+
+    def test_numbers_split_after_dot_or_exponent(self):
+        self.assertEqual(list(iter_json_array(['[1.', '5]'])), [1.5])
+        self.assertEqual(list(iter_json_array(['[-3.5e', '10]'])), [-3.5e10])
+        self.assertEqual(list(iter_json_array(['[-3.5e+', '1', '0, 2]'])), [-3.5e10, 2])
+        self.assertEqual(list(iter_json_array(['[1', '2', ',3]'])), [12, 3])
+
+    def test_literals_and_empty_chunks(self):
+        self.assertEqual(list(iter_json_array(['', ' [tr', 'ue,', '', 'nu', 'll ] '])), [True, None])
+        self.assertEqual(list(iter_json_array(['[', ' ]'])), [])
+
+    def test_stops_reading_early(self):
+        read = []
+
+        def chunks():
+            for ch in ['[{"a":1},', '{"b":2},', '{"c":3}]']:
+                read.append(ch)
+                yield ch
+
+        it = iter_json_array(chunks())
+        self.assertEqual(next(it), {'a': 1})
+        self.assertEqual(next(it), {'b': 2})
+        self.assertEqual(len(read), 2)  # the rest of the reply is never read
+
+    def test_invalid_replies(self):
+        for chunks in (['{"error": "x"}'], ['[1 2]'], ['[1,'], ['[1.', '.5]'], ['[{"a":', '}]'], ['']):
+            with self.subTest(chunks=chunks):
+                with self.assertRaises(ValueError):
+                    list(iter_json_array(chunks))
+
+
+
+class _FeedHandler(http.server.BaseHTTPRequestHandler):
+    # how to reply to afterKillID requests: 'ok', 'rejected', 'bad_request', 'down' or 'reset'
+    mode = 'ok'
+    paths = []
+    newest_id = 100
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        status = 200
+        m = re.search(r'afterKillID/(\d+)/', self.path)
+        if m and (self.mode == 'rejected'):
+            status, reply = 400, {'error': 'Invalid modifier: afterKillID'}
+        elif m and (self.mode == 'bad_request'):
+            status, reply = 400, {'error': 'Too many modifiers'}
+        elif m and (self.mode == 'down'):
+            status, reply = 502, {'error': 'Bad gateway'}
+        elif m and (self.mode == 'reset'):
+            # connection is closed without reply
+            self.close_connection = True
+            return
+        else:
+            after_id = int(m.group(1)) if m else 0
+            reply = [{'killmail_id': i, 'zkb': {'hash': 'h{}'.format(i), 'totalValue': i * 1000000.5}}
+                     for i in range(self.newest_id, after_id, -1)]
+        body = json.dumps(reply).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestZKBIncremental(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _FeedHandler)
+        cls.server.daemon_threads = True
+        cls.base_url = 'http://127.0.0.1:{}/api/'.format(cls.server.server_address[1])
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        _FeedHandler.mode = 'ok'
+        _FeedHandler.paths = []
+        _FeedHandler.newest_id = 100
+        zkillboard.zkb_memory_cache.clear()
+        zkillboard.zkb_after_kill_id_retry_time = 0.0
+        http_client._clients.pop('zkb', None)
+
+    def go(self) -> list:
+        zkb = ZKB({'cache_type': 'file', 'cache_dir': self.cache_dir, 'cache_time': 600,
+                   'kills_on_page': 10, 'incremental': True, 'use_evekill': False})
+        zkb._BASE_URL_ZKB = self.base_url
+        zkb.clear_url()
+        zkb.add_wspace()
+        return [a_kill['killmail_id'] for a_kill in zkb.go(refresh=True)]
+
+    def test_only_new_kills_are_requested(self):
+        self.assertEqual(self.go(), list(range(100, 90, -1)))
+        _FeedHandler.newest_id = 103
+        self.assertEqual(self.go(), list(range(103, 93, -1)))
+        self.assertEqual(_FeedHandler.paths[-1], '/api/w-space/afterKillID/100/')
+
+    def test_no_full_request_when_zkillboard_fails(self):
+        for mode in ('down', 'reset', 'bad_request'):
+            with self.subTest(mode=mode):
+                zkillboard.zkb_memory_cache.clear()
+                _FeedHandler.paths = []
+                _FeedHandler.mode = 'ok'
+                self.go()
+                _FeedHandler.mode = mode
+                self.go()
+                self.assertEqual(len(_FeedHandler.paths), 2)
+                self.assertIn('afterKillID', _FeedHandler.paths[-1])
+                self.assertEqual(zkillboard.zkb_after_kill_id_retry_time, 0.0)
+
+    def test_rejected_modifier_is_not_used_for_a_while(self):
+        self.go()
+        _FeedHandler.mode = 'rejected'
+        self.assertEqual(self.go(), list(range(100, 90, -1)))
+        self.assertEqual(_FeedHandler.paths[1:], ['/api/w-space/afterKillID/100/', '/api/w-space/'])
+        self.go()
+        self.assertEqual(_FeedHandler.paths[3:], ['/api/w-space/'])
+        # after retry interval, afterKillID is tried again
+        zkillboard.zkb_after_kill_id_retry_time = time.monotonic() - 1
+        _FeedHandler.mode = 'ok'
+        _FeedHandler.newest_id = 101
+        self.assertEqual(self.go(), list(range(101, 91, -1)))
+        self.assertEqual(_FeedHandler.paths[4:], ['/api/w-space/afterKillID/100/'])
+
+class TestMergeKills(unittest.TestCase):
+    def test_merge(self):
+        zkb = ZKB({'kills_on_page': 4})
+        prev_kills = [{'killmail_id': i, 'old': True} for i in (10, 8, 7, 5)]
+        new_kills = [{'killmail_id': i} for i in (12, 11, 10)]
+        merged = zkb._merge_kills(new_kills, prev_kills)
+        self.assertEqual([k['killmail_id'] for k in merged], [12, 11, 10, 8])
+        self.assertNotIn('old', merged[2])  # newer copy of the same kill wins
+
+    def test_default_max_kills(self):
+        zkb = ZKB()
+        kills = [{'killmail_id': i} for i in range(ZKB.FEED_MAX_KILLS + 10)]
+        self.assertEqual(len(zkb._merge_kills(kills, [])), ZKB.FEED_MAX_KILLS)
+
+
+if __name__ == '__main__':
+    unittest.main()
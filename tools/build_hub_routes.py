@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Precompute routes from all k-space systems to trade hubs, run from site root:
+#   python3 tools/build_hub_routes.py
+# Site does the same at startup if the table is missing or EVE DB has changed.
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classes.sitecfg import SiteConfig
+from classes.database import SiteDbConnectionPool
+from classes.route_graph import load_jump_graph
+from classes.hub_routes import HUB_ROUTES_FILENAME, build_hub_routes
+
+
+def main():
+    cfg = SiteConfig()
+    pool = SiteDbConnectionPool(cfg.EVEDB)
+    version = pool.db_version()
+    tm_start = time.time()
+    graph = load_jump_graph(pool.reader(), version)
+    filename = os.path.join(cfg.ROUTES_CACHE_DIR, HUB_ROUTES_FILENAME)
+    build_hub_routes(graph, filename, version[0], version[1])
+    print('{0}: {1} systems, {2} bytes, built in {3:.2f} s'.format(
+        filename, len(graph), os.path.getsize(filename), time.time() - tm_start))
+
+
+if __name__ == '__main__':
+    main()